@@ -1,24 +1,44 @@
 """Gerenciador de Jobs - fila, subprocess, monitoramento, stats."""
 
 import asyncio
+import contextlib
 import json
 import os
 import re
 import signal
 import subprocess
+import threading
 import time
 import shutil
 import sys
-import uuid
+import secrets
 from pathlib import Path
 from typing import Optional
 
 from api.stats_tracker import STAGES, estimate_remaining, record_job_complete, format_eta
 
+try:
+    from watchfiles import awatch  # vem junto com uvicorn[standard]
+except ImportError:
+    awatch = None
+
+try:
+    import orjson  # opcional: serializacao JSON bem mais rapida
+except ImportError:
+    orjson = None
+
 JOBS_DIR = Path(os.environ.get("JOBS_DIR", "jobs"))
 PIPELINE_SCRIPT = os.environ.get("PIPELINE_SCRIPT", "dublar_pro_v5.py")
 PYTHON_BIN = os.environ.get("PYTHON_BIN", sys.executable or shutil.which("python3") or "python3")
+PIPELINE_SCRIPT_ABS = os.path.abspath(PIPELINE_SCRIPT)
 DOCKER_GPU_IMAGE = os.environ.get("DOCKER_GPU_IMAGE", "inemavox:gpu")
+# Workers concorrentes consumindo a fila; >1 permite jobs independentes em paralelo
+JOB_WORKERS = max(1, int(os.environ.get("JOB_WORKERS", "1")))
+# Quantos jobs podem usar a GPU ao mesmo tempo
+GPU_SLOTS = max(1, int(os.environ.get("GPU_SLOTS", "1")))
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", "100"))
+# Jobs terminais acima desse limite viram snapshot em disco (meta.json)
+MAX_JOBS_IN_MEM = int(os.environ.get("MAX_JOBS_IN_MEM", "500"))
 PROJECT_DIR = Path(__file__).parent.parent.resolve()
 
 # Stages para jobs de corte manual (3 etapas)
@@ -106,6 +126,14 @@ DOCKER_GPU_AVAILABLE = _detect_docker_gpu()
 DEVICE = _detect_device()
 CHATTERBOX_DEVICE = _detect_chatterbox_device()
 
+# Ambiente base dos subprocessos (copia + PATH normalizados uma unica vez)
+_BASE_ENV = os.environ.copy()
+_BASE_ENV["PYTHONUNBUFFERED"] = "1"  # evita perda de log quando OOM killer mata o processo
+if not DOCKER_GPU_AVAILABLE:
+    _python_dir = os.path.dirname(PYTHON_BIN)
+    if _python_dir not in _BASE_ENV.get("PATH", ""):
+        _BASE_ENV["PATH"] = _python_dir + ":" + _BASE_ENV.get("PATH", "")
+
 # Log de inicializacao
 _mode = "Docker GPU" if DOCKER_GPU_AVAILABLE else f"Local ({DEVICE})"
 print(f"[JobManager] Modo: {_mode} | Device: {DEVICE} | Chatterbox: {CHATTERBOX_DEVICE} | Image: {DOCKER_GPU_IMAGE}")
@@ -119,7 +147,7 @@ class Job:
         self.created_at = time.time()
         self.started_at = None
         self.finished_at = None
-        self.process: Optional[subprocess.Popen] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
         self.workdir = JOBS_DIR / job_id
         self.error = None
         self.device = DEVICE
@@ -127,6 +155,10 @@ class Job:
         self._last_stage_num = 0
         self._last_stage_start = 0.0
         self._user_cancelled = False  # True apenas se o usuario clicou em Cancelar
+        self._checkpoint_event = asyncio.Event()  # setado quando checkpoint.json muda
+        self._cp_cache: Optional[tuple[int, dict]] = None  # (mtime_ns, checkpoint parseado)
+        self._last_progress: Optional[dict] = None  # ultimo progresso calculado por to_dict()
+        self._todict_cache: Optional[tuple[float, dict]] = None  # (monotonic, payload)
 
     @property
     def duration(self) -> float:
@@ -183,11 +215,41 @@ class Job:
                 self.status = "completed"
                 self.error = None
 
+    def to_summary_dict(self) -> dict:
+        """Versao leve de to_dict() para listagens: reusa o ultimo progresso
+        calculado em vez de re-ler checkpoint e recalcular por request."""
+        if self._last_progress is None:
+            return self.to_dict()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "config": self.config,
+            "device": self.device,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_s": round(self.duration, 1),
+            "error": self.error,
+            "checkpoint": self._cp_cache[1] if self._cp_cache else {},
+            "progress": self._last_progress,
+            "stage_times": self.stage_times,
+        }
+
+    async def to_dict_async(self) -> dict:
+        """to_dict() num threadpool: os exists()/read_text() bloqueiam o loop."""
+        return await asyncio.to_thread(self.to_dict)
+
     def to_dict(self) -> dict:
+        # TTL curtissimo: dashboards fazem poll de ~1s alem do WS; payloads
+        # repetidos dentro de 250ms saem do cache sem re-ler checkpoint
+        now = time.monotonic()
+        if self._todict_cache and now - self._todict_cache[0] < 0.25:
+            return self._todict_cache[1]
         self._recover_if_output_exists()
         checkpoint = self._read_checkpoint()
         progress = self._calc_progress(checkpoint)
-        return {
+        self._last_progress = progress
+        payload = {
             "id": self.id,
             "status": self.status,
             "config": self.config,
@@ -201,15 +263,25 @@ class Job:
             "progress": progress,
             "stage_times": self.stage_times,
         }
+        self._todict_cache = (now, payload)
+        return payload
 
     def _read_checkpoint(self) -> dict:
         cp_path = self.workdir / "dub_work" / "checkpoint.json"
-        if cp_path.exists():
-            try:
-                return json.loads(cp_path.read_text())
-            except Exception:
-                pass
-        return {}
+        try:
+            st = cp_path.stat()
+        except OSError:
+            return {}
+        # Memoizar por mtime: to_dict() roda a cada notify/list e o arquivo
+        # quase nunca mudou entre duas chamadas
+        if self._cp_cache and self._cp_cache[0] == st.st_mtime_ns:
+            return self._cp_cache[1]
+        try:
+            checkpoint = json.loads(cp_path.read_text())
+        except Exception:
+            return {}
+        self._cp_cache = (st.st_mtime_ns, checkpoint)
+        return checkpoint
 
     def _calc_progress_simple(self, checkpoint: dict) -> dict:
         """Calculo de progresso simplificado para jobs nao-dubbing (sem ETA)."""
@@ -398,27 +470,42 @@ class Job:
         return None
 
     def read_logs(self, last_n: int = 50) -> list:
+        """Le as ultimas N linhas do log sem carregar o arquivo inteiro."""
         log_path = self.workdir / "output.log"
         if not log_path.exists():
             return []
+        chunk_size = 65536
         try:
-            lines = log_path.read_text().splitlines()
-            return lines[-last_n:]
+            with open(log_path, "rb") as f:
+                f.seek(0, 2)
+                pos = f.tell()
+                tail = bytearray()
+                # Ler blocos de tras pra frente ate juntar last_n linhas
+                while pos > 0 and tail.count(b"\n") <= last_n:
+                    read_size = min(chunk_size, pos)
+                    pos -= read_size
+                    f.seek(pos)
+                    tail[:0] = f.read(read_size)
+            return bytes(tail).decode("utf-8", errors="replace").splitlines()[-last_n:]
         except Exception:
             return []
 
 
 class JobManager:
     def __init__(self):
+        # Leitores fazem dict.get sem lock (atomico sob o GIL); escritores
+        # serializam no RLock para nao perder updates vindos de threads
         self.jobs: dict[str, Job] = {}
-        self.queue: asyncio.Queue = asyncio.Queue()
-        self._worker_task: Optional[asyncio.Task] = None
-        self._subscribers: dict[str, list] = {}
+        self._jobs_lock = threading.RLock()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=JOB_QUEUE_MAX)
+        self._worker_tasks: list[asyncio.Task] = []
+        self._gpu_sem = asyncio.Semaphore(GPU_SLOTS)
+        self._subscribers: dict[str, set] = {}
         JOBS_DIR.mkdir(exist_ok=True)
 
     def start(self):
         self._load_existing_jobs()
-        self._worker_task = asyncio.create_task(self._worker())
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(JOB_WORKERS)]
 
     def _load_existing_jobs(self):
         """Recarrega jobs existentes do disco (sobrevive a restarts/reloads)."""
@@ -542,6 +629,65 @@ class JobManager:
                 print(f"[JobManager] Erro ao carregar job {job_id}: {e}")
         if loaded:
             print(f"[JobManager] {loaded} jobs carregados do disco")
+        self._evict_old_jobs()
+
+    def _evict_old_jobs(self):
+        """Mantem self.jobs limitado: terminais mais antigos viram snapshot em disco."""
+        excess = len(self.jobs) - MAX_JOBS_IN_MEM
+        if excess <= 0:
+            return
+        terminal = [
+            j for j in sorted(self.jobs.values(), key=lambda j: j.created_at)
+            if j.status in ("completed", "failed", "cancelled")
+        ]
+        for job in terminal[:excess]:
+            try:
+                (job.workdir / "meta.json").write_text(json.dumps(job.to_dict(), indent=2))
+            except Exception:
+                pass
+            with self._jobs_lock:
+                self.jobs.pop(job.id, None)
+
+    def _load_evicted_job(self, job_id: str) -> Optional[Job]:
+        """Re-hidrata um job evicted a partir do snapshot meta.json."""
+        meta_path = JOBS_DIR / job_id / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+        except Exception:
+            return None
+        job = Job(job_id, meta.get("config", {}))
+        job.status = meta.get("status", "completed")
+        job.created_at = meta.get("created_at") or job.created_at
+        job.started_at = meta.get("started_at")
+        job.finished_at = meta.get("finished_at")
+        job.error = meta.get("error")
+        job.stage_times = meta.get("stage_times", {})
+        with self._jobs_lock:
+            self.jobs[job_id] = job
+        return job
+
+    async def _watch_checkpoint(self, job: Job):
+        """Observa dub_work/ via inotify e sinaliza quando o checkpoint muda."""
+        try:
+            async for _changes in awatch(job.workdir / "dub_work"):
+                job._checkpoint_event.set()
+        except Exception:
+            pass
+
+    async def _progress_ticker(self, job: Job):
+        """Notifica subscribers quando o checkpoint muda (ou a cada heartbeat)."""
+        # Com watchfiles o wait acorda assim que checkpoint.json e reescrito;
+        # sem, cai num poll grosseiro de 5s
+        heartbeat = 10 if awatch else 5
+        while job.process and job.process.returncode is None:
+            try:
+                await asyncio.wait_for(job._checkpoint_event.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                pass
+            job._checkpoint_event.clear()
+            await self._notify(job.id, {"event": "progress", "job": job.to_dict()})
 
     async def _worker(self):
         while True:
@@ -552,7 +698,7 @@ class JobManager:
             self.queue.task_done()
 
     async def create_job(self, config: dict) -> Job:
-        job_id = str(uuid.uuid4())[:8]
+        job_id = secrets.token_hex(4)
         job = Job(job_id, config)
         job_type = config.get("job_type", "dubbing")
 
@@ -580,17 +726,34 @@ class JobManager:
         else:
             (job.workdir / "dublado").mkdir(exist_ok=True)
 
-        self.jobs[job_id] = job
-        (job.workdir / "config.json").write_text(json.dumps(config, indent=2))
+        with self._jobs_lock:
+            self.jobs[job_id] = job
+        # Gravar config fora do event loop (configs grandes bloqueiam o loop)
+        config_path = job.workdir / "config.json"
+        if orjson:
+            await asyncio.to_thread(
+                config_path.write_bytes, orjson.dumps(config, option=orjson.OPT_INDENT_2)
+            )
+        else:
+            await asyncio.to_thread(config_path.write_text, json.dumps(config, indent=2))
+
+        self._evict_old_jobs()
 
         await self.queue.put(job_id)
         await self._notify(job_id, {"event": "created", "job": job.to_dict()})
         return job
 
+    # Nota de design: jobs rodam como subprocessos (e nao num pool de workers
+    # in-process que importa o pipeline uma vez) porque cada tipo de job pode
+    # exigir outro interprete — imagem Docker GPU, env conda do Chatterbox —
+    # e o isolamento protege a API de OOM/crash do pipeline. A amortizacao do
+    # custo de import fica nos proprios workers persistentes dos scripts
+    # (chatterbox_tts_worker / whisper_gpu_worker).
     async def _run_job(self, job: Job):
         job.status = "running"
         job.started_at = time.time()
         job._last_stage_start = job.started_at
+        job._todict_cache = None  # transicao de status invalida o cache TTL
         await self._notify(job.id, {"event": "started", "job": job.to_dict()})
 
         job_type = job.config.get("job_type", "dubbing")
@@ -621,34 +784,39 @@ class JobManager:
         log_path = job.workdir / "output.log"
 
         try:
-            env = os.environ.copy()
-            env["PYTHONUNBUFFERED"] = "1"  # evita perda de log quando OOM killer mata o processo
-            if not DOCKER_GPU_AVAILABLE:
-                python_dir = os.path.dirname(PYTHON_BIN)
-                if python_dir not in env.get("PATH", ""):
-                    env["PATH"] = python_dir + ":" + env.get("PATH", "")
-
-            with open(log_path, "w") as log_file:
-                # Docker roda do project dir, local roda do workdir
-                cwd = str(PROJECT_DIR) if DOCKER_GPU_AVAILABLE else str(job.workdir)
-
-                job.process = subprocess.Popen(
-                    cmd,
-                    stdout=log_file,
-                    stderr=subprocess.STDOUT,
-                    cwd=cwd,
-                    env=env,
-                )
-
-                while job.process.poll() is None:
-                    await asyncio.sleep(2)
-                    await self._notify(job.id, {
-                        "event": "progress",
-                        "job": job.to_dict(),
-                    })
-
-                exit_code = job.process.returncode
-                job.finished_at = time.time()
+            env = _BASE_ENV
+
+            # Com varios workers, o semaforo limita quantos jobs tocam a GPU.
+            # So os tipos que usam GPU ocupam slot: cutting/download (e
+            # transcription em CPU) sao CPU-puros e podem sobrepor um job de
+            # GPU mesmo com GPU_SLOTS=1
+            cpu_only = (job_type in ("cutting", "download")
+                        or (job_type == "transcription" and job.device != "cuda"))
+            gate = contextlib.nullcontext() if cpu_only else self._gpu_sem
+            async with gate:
+                with open(log_path, "w") as log_file:
+                    # Docker roda do project dir, local roda do workdir
+                    cwd = str(PROJECT_DIR) if DOCKER_GPU_AVAILABLE else str(job.workdir)
+
+                    job.process = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        stdout=log_file,
+                        stderr=subprocess.STDOUT,
+                        cwd=cwd,
+                        env=env,
+                    )
+
+                    # Ticker separado envia progresso; aqui so esperamos o SIGCHLD
+                    # do processo filho (sem poll periodico no event loop)
+                    ticker = asyncio.create_task(self._progress_ticker(job))
+                    watcher = asyncio.create_task(self._watch_checkpoint(job)) if awatch else None
+                    try:
+                        exit_code = await job.process.wait()
+                    finally:
+                        ticker.cancel()
+                        if watcher:
+                            watcher.cancel()
+                    job.finished_at = time.time()
 
                 # Processar todas as transicoes de etapa pendentes
                 checkpoint = job._read_checkpoint()
@@ -696,6 +864,7 @@ class JobManager:
             job.error = str(e)
             job.finished_at = time.time()
 
+        job._todict_cache = None
         await self._notify(job.id, {"event": "finished", "job": job.to_dict()})
 
     def _build_docker_cut_command(self, job: Job) -> list:
@@ -1071,7 +1240,7 @@ class JobManager:
     def _build_local_command(self, job: Job) -> list:
         """Monta comando para rodar pipeline localmente (CPU)."""
         config = job.config
-        cmd = [PYTHON_BIN, os.path.abspath(PIPELINE_SCRIPT)]
+        cmd = [PYTHON_BIN, PIPELINE_SCRIPT_ABS]
 
         cmd.extend(["--in", config["input"]])
 
@@ -1134,15 +1303,16 @@ class JobManager:
         job = self.jobs.get(job_id)
         if not job:
             return False
-        if job.process and job.process.poll() is None:
+        if job.process and job.process.returncode is None:
             job._user_cancelled = True  # sinaliza que foi o usuario quem cancelou
             job.process.terminate()
             try:
-                job.process.wait(timeout=10)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(job.process.wait(), timeout=10)
+            except asyncio.TimeoutError:
                 job.process.kill()
             job.status = "cancelled"
             job.finished_at = time.time()
+            job._todict_cache = None
             await self._notify(job_id, {"event": "cancelled", "job": job.to_dict()})
             return True
         return False
@@ -1153,10 +1323,10 @@ class JobManager:
         if not job:
             return False
         # Cancelar processo se ativo
-        if job.status == "running" and job.process and job.process.poll() is None:
+        if job.status == "running" and job.process and job.process.returncode is None:
             job.process.terminate()
             try:
-                job.process.wait(timeout=5)
+                await asyncio.wait_for(job.process.wait(), timeout=5)
             except Exception:
                 job.process.kill()
         # Remover da fila se queued
@@ -1165,31 +1335,42 @@ class JobManager:
         if job.workdir.exists():
             shutil.rmtree(job.workdir, ignore_errors=True)
         # Remover da memória
-        self.jobs.pop(job_id, None)
+        with self._jobs_lock:
+            self.jobs.pop(job_id, None)
         return True
 
     def get_job(self, job_id: str) -> Optional[Job]:
-        return self.jobs.get(job_id)
+        job = self.jobs.get(job_id)
+        if job:
+            return job
+        return self._load_evicted_job(job_id)
 
     def list_jobs(self) -> list:
-        return [j.to_dict() for j in sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)]
+        # Roda via to_thread: o snapshot sob lock evita iterar o dict
+        # enquanto o event loop faz pop em _evict_old_jobs/delete_job
+        with self._jobs_lock:
+            jobs = list(self.jobs.values())
+        return [j.to_summary_dict() for j in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
 
     def subscribe(self, job_id: str, ws):
-        if job_id not in self._subscribers:
-            self._subscribers[job_id] = []
-        self._subscribers[job_id].append(ws)
+        self._subscribers.setdefault(job_id, set()).add(ws)
 
     def unsubscribe(self, job_id: str, ws):
         if job_id in self._subscribers:
-            self._subscribers[job_id] = [w for w in self._subscribers[job_id] if w != ws]
+            self._subscribers[job_id].discard(ws)
 
     async def _notify(self, job_id: str, data: dict):
-        subscribers = self._subscribers.get(job_id, [])
-        dead = []
-        for ws in subscribers:
-            try:
-                await ws.send_json(data)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.unsubscribe(job_id, ws)
+        subscribers = self._subscribers.get(job_id)
+        if not subscribers:
+            return
+        # Serializar uma vez e enviar em paralelo: um cliente lento nao atrasa
+        # os demais e o payload nao e re-encodado por subscriber
+        payload = orjson.dumps(data).decode() if orjson else json.dumps(data)
+        subs = list(subscribers)
+        results = await asyncio.gather(
+            *(ws.send_text(payload) for ws in subs),
+            return_exceptions=True,
+        )
+        dead = {ws for ws, result in zip(subs, results) if isinstance(result, Exception)}
+        if dead:
+            subscribers -= dead
@@ -1,10 +1,51 @@
 """Gerenciador de modelos - Ollama, TTS voices, Whisper models."""
 
+import asyncio
+import time
+
 import httpx
 import os
 
 OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
 
+# Cache TTL + single-flight por chave: dashboards fazem poll a 1Hz e cada hit
+# custava uma rodada HTTP no Ollama; num cache-miss concorrente so o primeiro
+# chamador vai ao upstream, os demais aguardam o mesmo Future
+_cache: dict[str, tuple[float, object]] = {}
+_inflight: dict[str, asyncio.Future] = {}
+
+
+async def _cached(key: str, ttl: float, fn):
+    hit = _cache.get(key)
+    if hit and time.monotonic() - hit[0] < ttl:
+        return hit[1]
+    fut = _inflight.get(key)
+    if fut is not None:
+        return await asyncio.shield(fut)
+    fut = asyncio.get_running_loop().create_future()
+    _inflight[key] = fut
+    try:
+        value = await fn()
+    except Exception as e:
+        fut.set_exception(e)
+        raise
+    else:
+        _cache[key] = (time.monotonic(), value)
+        fut.set_result(value)
+        return value
+    finally:
+        # Lider cancelado (ex: cliente desconectou no meio do await fn()):
+        # CancelledError nao passa pelo except acima, entao o Future ficaria
+        # pendente para sempre e os waiters do shield nunca acordariam
+        if not fut.done():
+            fut.cancel()
+        _inflight.pop(key, None)
+
+
+def _invalidate(*keys: str):
+    for key in keys:
+        _cache.pop(key, None)
+
 # Vozes Edge TTS organizadas por codigo de idioma curto (pt, en, es, ...)
 EDGE_VOICES = {
     "pt": [
@@ -242,7 +283,11 @@ SUPPORTED_LANGUAGES = [
 
 
 async def get_ollama_models() -> list:
-    """Lista modelos disponiveis no Ollama."""
+    """Lista modelos disponiveis no Ollama (cache de 5s)."""
+    return await _cached("ollama_models", 5.0, _fetch_ollama_models)
+
+
+async def _fetch_ollama_models() -> list:
     try:
         async with httpx.AsyncClient(timeout=5) as client:
             resp = await client.get(f"{OLLAMA_HOST}/api/tags")
@@ -263,7 +308,11 @@ async def get_ollama_models() -> list:
 
 
 async def get_ollama_status() -> dict:
-    """Verifica status do Ollama."""
+    """Verifica status do Ollama (cache de 2s)."""
+    return await _cached("ollama_status", 2.0, _fetch_ollama_status)
+
+
+async def _fetch_ollama_status() -> dict:
     try:
         async with httpx.AsyncClient(timeout=3) as client:
             resp = await client.get(f"{OLLAMA_HOST}/api/tags")
@@ -283,6 +332,7 @@ async def get_ollama_status() -> dict:
 async def start_ollama() -> dict:
     """Inicia o servico Ollama."""
     import subprocess, shutil
+    _invalidate("ollama_models", "ollama_status")
     ollama_bin = shutil.which("ollama")
     if not ollama_bin:
         return {"success": False, "error": "Ollama nao encontrado. Instale: curl -fsSL https://ollama.com/install.sh | sh"}
@@ -321,6 +371,7 @@ async def start_ollama() -> dict:
 async def stop_ollama() -> dict:
     """Para o servico Ollama."""
     import subprocess, signal
+    _invalidate("ollama_models", "ollama_status")
     try:
         # Encontrar PID do ollama serve
         result = subprocess.run(["pgrep", "-f", "ollama serve"], capture_output=True, text=True)
@@ -345,6 +396,7 @@ async def stop_ollama() -> dict:
 
 async def pull_ollama_model(model: str):
     """Baixa um modelo no Ollama (streaming progress)."""
+    _invalidate("ollama_models")
     try:
         async with httpx.AsyncClient(timeout=600) as client:
             async with client.stream(
@@ -365,6 +417,7 @@ async def pull_ollama_model(model: str):
 
 async def unload_ollama_model(model: str) -> bool:
     """Descarrega modelo Ollama para liberar VRAM."""
+    _invalidate("ollama_status")
     try:
         async with httpx.AsyncClient(timeout=30) as client:
             resp = await client.post(
@@ -376,15 +429,19 @@ async def unload_ollama_model(model: str) -> bool:
         return False
 
 
+# Opcoes estaticas: montar o dict uma unica vez no import
+_ALL_OPTIONS = {
+    "tts_engines": TTS_ENGINES,
+    "translation_engines": TRANSLATION_ENGINES,
+    "whisper_models": WHISPER_MODELS,
+    "asr_engines": ASR_ENGINES,
+    "edge_voices": EDGE_VOICES,
+    "bark_voices": BARK_VOICES,
+    "content_types": CONTENT_TYPES,
+    "languages": SUPPORTED_LANGUAGES,
+}
+
+
 def get_all_options() -> dict:
     """Retorna todas as opcoes disponiveis para a interface."""
-    return {
-        "tts_engines": TTS_ENGINES,
-        "translation_engines": TRANSLATION_ENGINES,
-        "whisper_models": WHISPER_MODELS,
-        "asr_engines": ASR_ENGINES,
-        "edge_voices": EDGE_VOICES,
-        "bark_voices": BARK_VOICES,
-        "content_types": CONTENT_TYPES,
-        "languages": SUPPORTED_LANGUAGES,
-    }
+    return _ALL_OPTIONS
@@ -1,16 +1,36 @@
 """inemaVOX API - FastAPI server com WebSocket para progresso em tempo real."""
 
+import asyncio
 import json
 import os
-import uuid
+import re
+import shutil
+import secrets
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
+try:
+    import orjson  # opcional: parse/encode JSON bem mais rapido
+except ImportError:
+    orjson = None
+
+try:
+    import aiofiles  # opcional: escrita de uploads sem bloquear o event loop
+except ImportError:
+    aiofiles = None
+
+# Import no modulo: o registro de extractors do yt-dlp custa centenas de ms
+# e nao deve rodar dentro do request handler
+try:
+    import yt_dlp  # type: ignore
+except ImportError:
+    yt_dlp = None
+
 from api.job_manager import JobManager
 from api.model_manager import get_ollama_models, get_ollama_status, unload_ollama_model, start_ollama, stop_ollama, pull_ollama_model, get_all_options
 from api.system_monitor import get_system_status
@@ -21,6 +41,60 @@ UPLOAD_DIR = JOBS_DIR / "uploads"
 
 job_manager = JobManager()
 
+UPLOAD_CHUNK = 1 << 20  # 1 MiB
+# Backpressure: limita uploads simultaneos para nao esgotar disco/threadpool
+_UPLOAD_SEM = asyncio.Semaphore(int(os.environ.get("MAX_CONCURRENT_UPLOADS", "4")))
+
+
+def _safe_upload_name(filename, default_ext: str, stem: str = None) -> str:
+    """Nome unico para upload; basename descarta path embutido no filename."""
+    base, ext = os.path.splitext(os.path.basename(filename or ""))
+    return f"{secrets.token_hex(4)}_{stem or base}{ext or default_ext}"
+
+
+def _loads(raw) -> dict:
+    """Parse do campo JSON multipart (orjson quando disponivel)."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+async def _dump_json(path: Path, obj) -> None:
+    """Grava JSON em disco fora do loop, com publish atomico via os.replace.
+
+    O rename atomico garante que leitores (e o cache por mtime) nunca veem
+    um sidecar truncado se o processo cair no meio da escrita.
+    """
+    # Sidecars sao consumidos pela propria app, nao por humanos: forma
+    # compacta corta o tamanho escrito em ~2x
+    if orjson:
+        data = orjson.dumps(obj)
+    else:
+        data = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    if aiofiles:
+        async with aiofiles.open(tmp, "wb") as f:
+            await f.write(data)
+    else:
+        await asyncio.to_thread(tmp.write_bytes, data)
+    await asyncio.to_thread(os.replace, tmp, path)
+
+
+async def _save_upload(file: UploadFile, upload_path: Path):
+    """Grava o upload em disco em chunks (memoria O(1) mesmo para videos grandes)."""
+    async with _UPLOAD_SEM:
+        def _copy():
+            with open(upload_path, "wb") as f:
+                shutil.copyfileobj(file.file, f, length=UPLOAD_CHUNK)
+
+        # Upload grande ja spooled para disco: copiar tmpfile -> destino num
+        # unico loop kernel-level de 1 MiB no threadpool, sem passar cada
+        # chunk pelo event loop
+        if getattr(file.file, "_rolled", False) or not aiofiles:
+            await asyncio.to_thread(_copy)
+        else:
+            async with aiofiles.open(upload_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK):
+                    await f.write(chunk)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -38,6 +112,7 @@ app = FastAPI(
     version=APP_VERSION,
     description="inemaVOX - Suite de voz com IA local: dublagem, transcricao, corte e download de videos",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse if orjson else JSONResponse,
 )
 
 app.add_middleware(
@@ -53,8 +128,10 @@ app.add_middleware(
 @app.get("/api/system/status")
 async def system_status():
     """Status completo do sistema (GPU, CPU, RAM, disco)."""
-    status = get_system_status()
-    status["ollama"] = await get_ollama_status()
+    status, ollama = await asyncio.gather(
+        asyncio.to_thread(get_system_status), get_ollama_status()
+    )
+    status["ollama"] = ollama
     status["version"] = APP_VERSION
     return status
 
@@ -64,9 +141,7 @@ async def system_status():
 @app.get("/api/models/options")
 async def get_options():
     """Todas as opcoes disponiveis (TTS, ASR, traducao, idiomas, etc)."""
-    options = get_all_options()
-    options["ollama_models"] = await get_ollama_models()
-    return options
+    return {**get_all_options(), "ollama_models": await get_ollama_models()}
 
 
 @app.get("/api/models/ollama")
@@ -97,9 +172,11 @@ async def api_stop_ollama():
 @app.get("/api/ollama/status")
 async def api_ollama_status():
     """Status do Ollama (online, modelos)."""
-    status = await get_ollama_status()
+    # RTTs independentes em paralelo: latencia vira o max, nao a soma
+    status, models = await asyncio.gather(get_ollama_status(), get_ollama_models())
     if status["online"]:
-        status["models"] = await get_ollama_models()
+        # Copia rasa: o dict de status vem do cache TTL e nao deve ser mutado
+        status = {**status, "models": models}
     return status
 
 
@@ -135,13 +212,10 @@ async def create_cut_job_with_upload(
     config_json: str = Form(...),
 ):
     """Criar job de corte com upload de video."""
-    config = json.loads(config_json)
-    suffix = Path(file.filename).suffix or ".mp4"
-    safe_name = f"{uuid.uuid4().hex[:8]}_{Path(file.filename).stem}{suffix}"
+    config = _loads(config_json)
+    safe_name = _safe_upload_name(file.filename, ".mp4")
     upload_path = UPLOAD_DIR / safe_name
-    with open(upload_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    await _save_upload(file, upload_path)
     config["input"] = str(upload_path.absolute())
     config["job_type"] = "cutting"
     if "mode" not in config:
@@ -170,15 +244,12 @@ async def create_tts_job_with_ref(
     config_json: str = Form(...),
 ):
     """Criar job TTS Chatterbox com audio de referencia para voice clone."""
-    config = json.loads(config_json)
+    config = _loads(config_json)
     if "text" not in config:
         raise HTTPException(400, "Campo obrigatorio: text")
-    suffix = Path(file.filename).suffix or ".wav"
-    safe_name = f"{uuid.uuid4().hex[:8]}_ref{suffix}"
+    safe_name = _safe_upload_name(file.filename, ".wav", stem="ref")
     upload_path = UPLOAD_DIR / safe_name
-    with open(upload_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    await _save_upload(file, upload_path)
     config["ref_audio"] = str(upload_path.absolute())
     config["engine"] = "chatterbox"
     config["job_type"] = "tts_generate"
@@ -194,15 +265,12 @@ async def create_voice_clone_job(
     config_json: str = Form(...),
 ):
     """Criar job de voice clone com upload de audio de referencia."""
-    config = json.loads(config_json)
+    config = _loads(config_json)
     if "text" not in config:
         raise HTTPException(400, "Campo obrigatorio: text")
-    suffix = Path(file.filename).suffix or ".wav"
-    safe_name = f"{uuid.uuid4().hex[:8]}_ref{suffix}"
+    safe_name = _safe_upload_name(file.filename, ".wav", stem="ref")
     upload_path = UPLOAD_DIR / safe_name
-    with open(upload_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    await _save_upload(file, upload_path)
     config["ref_audio"] = str(upload_path.absolute())
     config["engine"] = "chatterbox"
     config["job_type"] = "voice_clone"
@@ -215,20 +283,16 @@ async def create_voice_clone_job(
 @app.post("/api/jobs/voice-clone/url")
 async def create_voice_clone_job_url(config: dict):
     """Criar job de voice clone baixando audio de referencia a partir de uma URL."""
-    import asyncio
-
     ref_url = config.pop("ref_url", None)
     if not ref_url:
         raise HTTPException(400, "Campo obrigatorio: ref_url")
     if "text" not in config:
         raise HTTPException(400, "Campo obrigatorio: text")
 
-    ref_id = uuid.uuid4().hex[:8]
+    ref_id = secrets.token_hex(4)
     out_path = UPLOAD_DIR / f"{ref_id}_ref.mp3"
 
-    try:
-        import yt_dlp  # type: ignore
-    except ImportError:
+    if yt_dlp is None:
         raise HTTPException(500, "yt-dlp nao instalado")
 
     ydl_opts = {
@@ -275,7 +339,7 @@ async def download_audio(job_id: str):
         p = audio_dir / f"generated.{ext}"
         if p.exists():
             media = "audio/wav" if ext == "wav" else f"audio/{ext}"
-            return FileResponse(p, media_type=media, filename=f"audio_{job_id}.{ext}")
+            return FileResponse(p, media_type=media, filename=f"audio_{job_id}.{ext}", stat_result=p.stat())
     raise HTTPException(404, "Audio nao encontrado")
 
 
@@ -297,13 +361,10 @@ async def create_download_job_with_upload(
     config_json: str = Form(...),
 ):
     """Criar job de conversao/extracao de audio a partir de arquivo local."""
-    config = json.loads(config_json)
-    suffix = Path(file.filename).suffix or ".mp4"
-    safe_name = f"{uuid.uuid4().hex[:8]}_{Path(file.filename).stem}{suffix}"
+    config = _loads(config_json)
+    safe_name = _safe_upload_name(file.filename, ".mp4")
     upload_path = UPLOAD_DIR / safe_name
-    with open(upload_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    await _save_upload(file, upload_path)
     config["local_file"] = str(upload_path.absolute())
     config["job_type"] = "download"
     if "quality" not in config:
@@ -328,13 +389,10 @@ async def create_transcription_job_with_upload(
     config_json: str = Form(...),
 ):
     """Criar job de transcricao com upload de video."""
-    config = json.loads(config_json)
-    suffix = Path(file.filename).suffix or ".mp4"
-    safe_name = f"{uuid.uuid4().hex[:8]}_{Path(file.filename).stem}{suffix}"
+    config = _loads(config_json)
+    safe_name = _safe_upload_name(file.filename, ".mp4")
     upload_path = UPLOAD_DIR / safe_name
-    with open(upload_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    await _save_upload(file, upload_path)
     config["input"] = str(upload_path.absolute())
     config["job_type"] = "transcription"
     job = await job_manager.create_job(config)
@@ -358,15 +416,12 @@ async def create_job_with_upload(
     config_json: str = Form(...),
 ):
     """Criar job de dublagem com upload de video."""
-    config = json.loads(config_json)
+    config = _loads(config_json)
 
     # Salvar arquivo com nome unico para evitar conflitos
-    suffix = Path(file.filename).suffix or ".mp4"
-    safe_name = f"{uuid.uuid4().hex[:8]}_{Path(file.filename).stem}{suffix}"
+    safe_name = _safe_upload_name(file.filename, ".mp4")
     upload_path = UPLOAD_DIR / safe_name
-    with open(upload_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    await _save_upload(file, upload_path)
 
     config["input"] = str(upload_path.absolute())
     job = await job_manager.create_job(config)
@@ -376,7 +431,7 @@ async def create_job_with_upload(
 @app.get("/api/jobs")
 async def list_jobs():
     """Listar todos os jobs."""
-    return job_manager.list_jobs()
+    return await asyncio.to_thread(job_manager.list_jobs)
 
 
 @app.get("/api/jobs/{job_id}")
@@ -385,7 +440,7 @@ async def get_job(job_id: str):
     job = job_manager.get_job(job_id)
     if not job:
         raise HTTPException(404, "Job nao encontrado")
-    return job.to_dict()
+    return await job.to_dict_async()
 
 
 @app.get("/api/jobs/{job_id}/logs")
@@ -406,15 +461,21 @@ async def download_job(job_id: str):
     if job.status != "completed":
         raise HTTPException(400, "Job nao concluido")
 
-    # Procurar video de saida
+    # Procurar video de saida (scandir para e no primeiro .mp4, sem listar tudo)
     dublado_dir = job.workdir / "dublado"
     if dublado_dir.exists():
-        videos = list(dublado_dir.glob("*.mp4"))
-        if videos:
+        def _find_video():
+            with os.scandir(dublado_dir) as it:
+                return next((e for e in it if e.name.endswith(".mp4")), None)
+
+        entry = await asyncio.to_thread(_find_video)
+        if entry:
+            # stat_result pre-computado deixa o Starlette ir direto pro sendfile
             return FileResponse(
-                videos[0],
+                entry.path,
                 media_type="video/mp4",
-                filename=videos[0].name,
+                filename=entry.name,
+                stat_result=entry.stat(),
             )
 
     raise HTTPException(404, "Video dublado nao encontrado")
@@ -433,12 +494,12 @@ async def download_file(job_id: str):
 
     dl_dir = job.workdir / "download"
     if dl_dir.exists():
-        files = list(dl_dir.glob("video.*"))
+        files = await asyncio.to_thread(lambda: list(dl_dir.glob("video.*")))
         if files:
             f = files[0]
             ext = f.suffix.lstrip(".")
             media_type = "audio/mpeg" if ext == "mp3" else "video/mp4"
-            return FileResponse(f, media_type=media_type, filename=f.name)
+            return FileResponse(f, media_type=media_type, filename=f.name, stat_result=f.stat())
 
     raise HTTPException(404, "Arquivo baixado nao encontrado")
 
@@ -453,31 +514,56 @@ async def download_subtitles(job_id: str, lang: str = "trad"):
     srt_name = "asr_trad.srt" if lang == "trad" else "asr.srt"
     srt_path = job.workdir / "dub_work" / srt_name
     if srt_path.exists():
-        return FileResponse(srt_path, media_type="text/plain", filename=srt_name)
+        return FileResponse(srt_path, media_type="text/plain", filename=srt_name, stat_result=srt_path.stat())
     raise HTTPException(404, "Legendas nao encontradas")
 
 
+# Cache (job_id -> (mtime_ns, parsed)) dos JSONs re-lidos em cada poll da UI
+_META_CACHE: dict[str, tuple[int, dict]] = {}
+_SUMMARY_CACHE: dict[str, tuple[int, dict]] = {}
+
+
+def _read_json_cached(cache: dict, job_id: str, path: Path):
+    """Le e parseia um JSON com memoizacao por mtime; None se falhar."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    cached = cache.get(job_id)
+    if cached and cached[0] == st.st_mtime_ns:
+        return cached[1]
+    try:
+        parsed = _loads(path.read_bytes())
+    except Exception:
+        return None
+    cache[job_id] = (st.st_mtime_ns, parsed)
+    return parsed
+
+
+# Regexes de timestamps compiladas no import (usadas por _build_clips_metadata)
+_SPLIT_TS = re.compile(r"[,;\r\n]+")
+_RANGE_TS = re.compile(r"^([\d:]+)\s*-\s*([\d:]+)$")
+
+
+_TS_MULT = (1, 60, 3600)
+
+
 def _parse_ts_str(s: str) -> float:
     """Converte 'HH:MM:SS', 'MM:SS' ou 'SS' para segundos."""
     parts = s.strip().split(":")
-    if len(parts) == 1:
-        return float(parts[0])
-    elif len(parts) == 2:
-        return int(parts[0]) * 60 + float(parts[1])
-    return int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
+    return sum(float(p) * _TS_MULT[i] for i, p in enumerate(reversed(parts)))
 
 
 def _build_clips_metadata(config: dict, clips_dir: Path) -> dict:
     """Gera clips_metadata.json a partir da config do job (retroativo)."""
-    import re
     metadata = {}
     mode = config.get("mode", "manual")
 
     if mode == "manual" and config.get("timestamps"):
         timestamps = []
-        for part in re.split(r"[,;\r\n]+", str(config["timestamps"])):
+        for part in _SPLIT_TS.split(str(config["timestamps"])):
             part = part.strip()
-            m = re.match(r"^([\d:]+)\s*-\s*([\d:]+)$", part)
+            m = _RANGE_TS.match(part)
             if m:
                 try:
                     start = _parse_ts_str(m.group(1))
@@ -513,25 +599,26 @@ async def list_clips(job_id: str):
     meta_path = clips_dir / "clips_metadata.json"
     metadata = {}
     if meta_path.exists():
-        try:
-            metadata = json.loads(meta_path.read_text(encoding="utf-8"))
-        except Exception:
-            pass
+        metadata = _read_json_cached(_META_CACHE, job_id, meta_path) or {}
     else:
         metadata = _build_clips_metadata(job.config, clips_dir)
         try:
-            meta_path.write_text(json.dumps(metadata, indent=2, ensure_ascii=False), encoding="utf-8")
+            await _dump_json(meta_path, metadata)
         except Exception:
             pass
 
+    # glob+stat no threadpool: clips_dir pode ter centenas de arquivos (ou NFS)
+    def _scan_clips():
+        return [(p.name, p.stat().st_size) for p in sorted(clips_dir.glob("clip_*.mp4"))]
+
     clips = []
-    for clip in sorted(clips_dir.glob("clip_*.mp4")):
-        clip_meta = metadata.get(clip.name, {})
+    for name, size_bytes in await asyncio.to_thread(_scan_clips):
+        clip_meta = metadata.get(name, {})
         clips.append({
-            "name": clip.name,
-            "size_bytes": clip.stat().st_size,
-            "url": f"/api/jobs/{job_id}/clips/{clip.name}",
-            "title": clip_meta.get("title", clip.name),
+            "name": name,
+            "size_bytes": size_bytes,
+            "url": f"/api/jobs/{job_id}/clips/{name}",
+            "title": clip_meta.get("title", name),
             "description": clip_meta.get("description"),
             "start": clip_meta.get("start"),
             "end": clip_meta.get("end"),
@@ -550,7 +637,12 @@ async def download_clips_zip(job_id: str):
     if not zip_path.exists():
         raise HTTPException(404, "ZIP nao encontrado")
 
-    return FileResponse(zip_path, media_type="application/zip", filename=f"clips_{job_id}.zip")
+    return FileResponse(
+        zip_path,
+        media_type="application/zip",
+        filename=f"clips_{job_id}.zip",
+        stat_result=zip_path.stat(),
+    )
 
 
 @app.get("/api/jobs/{job_id}/clips/{clip_name}")
@@ -568,7 +660,7 @@ async def download_clip(job_id: str, clip_name: str):
     if not clip_path.exists():
         raise HTTPException(404, "Clip nao encontrado")
 
-    return FileResponse(clip_path, media_type="video/mp4", filename=clip_name)
+    return FileResponse(clip_path, media_type="video/mp4", filename=clip_name, stat_result=clip_path.stat())
 
 
 def _build_transcript_summary(job) -> dict:
@@ -599,7 +691,17 @@ def _build_transcript_summary(job) -> dict:
             pass
 
     if segments:
-        full_text = " ".join(seg.get("text", "") for seg in segments)
+        # So precisamos de ~500 chars de preview; parar o join cedo em vez de
+        # materializar o transcript inteiro
+        buf = []
+        total_len = 0
+        for seg in segments:
+            t = seg.get("text", "") or ""
+            buf.append(t)
+            total_len += len(t) + 1
+            if total_len > 600:
+                break
+        full_text = " ".join(buf)
         duration_s = round(float(segments[-1].get("end", 0)), 1) if segments else 0
     else:
         # Fallback: ler txt
@@ -635,10 +737,9 @@ async def get_transcript_summary(job_id: str):
 
     summary_path = job.workdir / "transcription" / "transcript_summary.json"
     if summary_path.exists():
-        try:
-            return json.loads(summary_path.read_text(encoding="utf-8"))
-        except Exception:
-            pass
+        summary = _read_json_cached(_SUMMARY_CACHE, job_id, summary_path)
+        if summary is not None:
+            return summary
 
     # Gerar retroativamente a partir dos arquivos existentes
     transcript_dir = job.workdir / "transcription"
@@ -649,7 +750,7 @@ async def get_transcript_summary(job_id: str):
 
     # Salvar para proximas chamadas
     try:
-        summary_path.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        await _dump_json(summary_path, result)
     except Exception:
         pass
 
@@ -687,15 +788,19 @@ async def get_video_summary(job_id: str):
         srt_path = job.workdir / "dub_work" / srt_name
         if srt_path.exists():
             try:
-                srt_text = srt_path.read_text(encoding="utf-8")
+                # Streaming com parada antecipada: so precisamos dos ~450
+                # primeiros chars, nao do SRT inteiro
                 lines = []
-                for line in srt_text.splitlines():
-                    line = line.strip()
-                    if not line or line.isdigit() or "-->" in line:
-                        continue
-                    lines.append(line)
-                    if sum(len(l) for l in lines) > 450:
-                        break
+                total_len = 0
+                with srt_path.open("r", encoding="utf-8") as fh:
+                    for line in fh:
+                        line = line.strip()
+                        if not line or line.isdigit() or "-->" in line:
+                            continue
+                        lines.append(line)
+                        total_len += len(line)
+                        if total_len > 450:
+                            break
                 full = " ".join(lines)
                 description = full[:450].strip()
                 if len(full) > 450:
@@ -730,6 +835,7 @@ async def download_transcript(job_id: str, format: str = "srt"):
         transcript_path,
         media_type=valid_formats[format],
         filename=f"transcript_{job_id}.{format}",
+        stat_result=transcript_path.stat(),
     )
 
 
@@ -764,6 +870,24 @@ async def cancel_job(job_id: str, delete: bool = False):
 
 # --- WebSocket ---
 
+WS_BATCH_WINDOW = 0.05  # janela de coalescencia de eventos (50ms)
+WS_BATCH_MAX = 20
+
+
+class _BatchingSubscriber:
+    """Recebe os eventos do JobManager numa fila para envio coalescido.
+
+    Jobs falantes emitem varios eventos por segundo; enviar cada um como
+    frame WS separado desperdica overhead de protocolo por mensagem.
+    """
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def send_text(self, payload: str):
+        self.queue.put_nowait(payload)
+
+
 @app.websocket("/ws/jobs/{job_id}")
 async def websocket_job_progress(websocket: WebSocket, job_id: str):
     """WebSocket para progresso em tempo real de um job."""
@@ -776,21 +900,41 @@ async def websocket_job_progress(websocket: WebSocket, job_id: str):
         return
 
     # Enviar estado atual
-    await websocket.send_json({"event": "connected", "job": job.to_dict()})
+    await websocket.send_json({"event": "connected", "job": await job.to_dict_async()})
+
+    # Inscrever para updates (coalescidos em janelas de 50ms)
+    subscriber = _BatchingSubscriber()
+    job_manager.subscribe(job_id, subscriber)
 
-    # Inscrever para updates
-    job_manager.subscribe(job_id, websocket)
+    async def _sender():
+        while True:
+            items = [await subscriber.queue.get()]
+            try:
+                while len(items) < WS_BATCH_MAX:
+                    items.append(
+                        await asyncio.wait_for(subscriber.queue.get(), timeout=WS_BATCH_WINDOW)
+                    )
+            except asyncio.TimeoutError:
+                pass
+            if len(items) == 1:
+                await websocket.send_text(items[0])
+            else:
+                # Payloads ja estao serializados; concatenar sem re-parse
+                await websocket.send_text('{"event":"batch","items":[' + ",".join(items) + "]}")
 
+    sender_task = asyncio.create_task(_sender())
     try:
         while True:
-            # Manter conexao aberta, receber pings
-            data = await websocket.receive_text()
-            if data == "ping":
-                await websocket.send_json({"event": "pong"})
+            # Manter conexao aberta so para detectar disconnect; keepalive
+            # fica a cargo dos ping frames do protocolo (ws_ping_interval)
+            message = await websocket.receive()
+            if message.get("type") == "websocket.disconnect":
+                break
     except WebSocketDisconnect:
         pass
     finally:
-        job_manager.unsubscribe(job_id, websocket)
+        sender_task.cancel()
+        job_manager.unsubscribe(job_id, subscriber)
 
 
 # --- Health ---
@@ -808,4 +952,4 @@ async def health():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_ping_interval=20, ws_ping_timeout=20)
@@ -1,11 +1,30 @@
 """Rastreador de estatisticas - aprende tempos por etapa para calcular ETAs."""
 
+import functools
 import json
+import os
 import time
+from collections import deque
 from pathlib import Path
 from typing import Optional
 
+try:
+    import orjson  # parse/serialize em C - bem mais rapido que o json stdlib
+except ImportError:
+    orjson = None
+
 STATS_FILE = Path(__file__).parent.parent / "jobs" / "pipeline_stats.json"
+EVENTS_FILE = Path(__file__).parent.parent / "jobs" / "pipeline_events.jsonl"
+
+# Compactar (reescrever o JSON agregado) apenas a cada N eventos;
+# entre compactacoes cada job vira uma linha no log append-only
+COMPACT_EVERY = 100
+
+# Agregado em memoria - carregado uma vez e mantido atualizado.
+# O mtime do arquivo compactado detecta reescritas externas e forca reload.
+_stats: Optional[dict] = None
+_stats_mtime: Optional[int] = None
+_events_since_compact = 0
 
 # Etapas do pipeline com nomes e descricoes
 STAGES = [
@@ -23,19 +42,135 @@ STAGES = [
 
 
 def _load_stats() -> dict:
-    """Carrega historico de estatisticas."""
+    """Carrega historico de estatisticas (agregado + replay do log de eventos)."""
+    global _stats, _stats_mtime, _events_since_compact
+    mtime = _stats_file_mtime()
+    if _stats is not None and mtime == _stats_mtime:
+        return _stats
+
+    stats = {"jobs_completed": 0, "stage_times": {}, "total_times": []}
     if STATS_FILE.exists():
         try:
-            return json.loads(STATS_FILE.read_text())
-        except (json.JSONDecodeError, OSError):
+            raw = STATS_FILE.read_bytes()
+            stats = orjson.loads(raw) if orjson else json.loads(raw)
+        except (ValueError, OSError):
+            pass
+
+    # Bounded - append descarta o mais antigo sem copiar a lista
+    stats["total_times"] = deque(stats.get("total_times", []), maxlen=50)
+
+    _migrate_samples(stats)
+
+    # Reaplica eventos gravados desde a ultima compactacao
+    if EVENTS_FILE.exists():
+        try:
+            with open(EVENTS_FILE) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        _apply_event(stats, orjson.loads(line) if orjson else json.loads(line))
+                        _events_since_compact += 1
+                    except (ValueError, KeyError):
+                        continue
+        except OSError:
             pass
-    return {"jobs_completed": 0, "stage_times": {}, "total_times": []}
+
+    _stats = stats
+    _stats_mtime = mtime
+    return stats
+
+
+def _stats_file_mtime() -> Optional[int]:
+    try:
+        return STATS_FILE.stat().st_mtime_ns
+    except OSError:
+        return None
 
 
 def _save_stats(stats: dict):
-    """Salva estatisticas em disco."""
+    """Compacta: reescreve o agregado e zera o log de eventos."""
+    global _stats_mtime, _events_since_compact
     STATS_FILE.parent.mkdir(parents=True, exist_ok=True)
-    STATS_FILE.write_text(json.dumps(stats, indent=2))
+    # deque nao serializa direto - converter so na hora de gravar
+    payload = {**stats, "total_times": list(stats.get("total_times", []))}
+    # Compacto por padrao - o arquivo e lido so por programa.
+    # STATS_PRETTY=1 indenta para debug.
+    pretty = bool(os.environ.get("STATS_PRETTY"))
+    if orjson:
+        data = orjson.dumps(payload, option=orjson.OPT_INDENT_2 if pretty else 0)
+    else:
+        data = json.dumps(payload, indent=2).encode() if pretty else json.dumps(payload, separators=(",", ":")).encode()
+    # Grava em tmp + os.replace: um crash no meio nunca deixa JSON truncado.
+    # Sem fsync - stats sao advisory, nao vale o stall de disco.
+    tmp = STATS_FILE.with_suffix(".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, STATS_FILE)
+    _stats_mtime = _stats_file_mtime()
+    try:
+        EVENTS_FILE.unlink()
+    except FileNotFoundError:
+        pass
+    _events_since_compact = 0
+
+
+def _migrate_samples(stats: dict):
+    """Converte registros legados {"samples": [...]} para o formato ring buffer."""
+    for profile in stats.get("stage_times", {}).values():
+        for stage_id, rec in profile.items():
+            if "samples" not in rec:
+                continue
+            samples = rec["samples"][-10:]
+            total = round(sum(samples), 1)
+            profile[stage_id] = {
+                "buf": samples + [None] * (10 - len(samples)),
+                "idx": len(samples) % 10,
+                "count": len(samples),
+                "sum": total,
+                "avg": round(total / len(samples), 1) if samples else 0,
+            }
+
+
+def _append_event(event: dict):
+    """Anexa um evento ao log JSONL (O(1) por job, sem reescrever o historico)."""
+    EVENTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(EVENTS_FILE, "ab") as f:
+        f.write((orjson.dumps(event) if orjson else json.dumps(event).encode()) + b"\n")
+
+
+def _apply_event(stats: dict, event: dict):
+    """Aplica um evento de job completo ao agregado em memoria."""
+    stats["jobs_completed"] = stats.get("jobs_completed", 0) + 1
+    profile_key = event["profile"]
+
+    if "stage_times" not in stats:
+        stats["stage_times"] = {}
+    if profile_key not in stats["stage_times"]:
+        stats["stage_times"][profile_key] = {}
+
+    profile = stats["stage_times"][profile_key]
+    for stage_id, duration in event.get("stage_times", {}).items():
+        rec = profile.get(stage_id)
+        if rec is None:
+            # Ring buffer de 10 samples com soma corrente - media em O(1)
+            rec = profile[stage_id] = {"buf": [None] * 10, "idx": 0, "count": 0, "sum": 0.0, "avg": 0}
+        duration = round(duration, 1)
+        evicted = rec["buf"][rec["idx"]]
+        rec["sum"] = round(rec["sum"] + duration - (evicted or 0), 1)
+        rec["buf"][rec["idx"]] = duration
+        rec["idx"] = (rec["idx"] + 1) % 10
+        rec["count"] = min(rec["count"] + 1, 10)
+        rec["avg"] = round(rec["sum"] / rec["count"], 1)
+
+    # Tempo total
+    if "total_times" not in stats:
+        stats["total_times"] = deque(maxlen=50)
+    stats["total_times"].append({
+        "profile": profile_key,
+        "total": event["total"],
+        "timestamp": event.get("ts", time.time()),
+    })
 
 
 def record_job_complete(job_config: dict, stage_times: dict, total_time: float, device: str):
@@ -43,8 +178,8 @@ def record_job_complete(job_config: dict, stage_times: dict, total_time: float,
 
     stage_times: {"download": 5.2, "transcription": 120.3, ...}
     """
+    global _events_since_compact
     stats = _load_stats()
-    stats["jobs_completed"] = stats.get("jobs_completed", 0) + 1
 
     # Chave unica por combinacao de engine + device
     tts = job_config.get("tts_engine", "edge")
@@ -52,34 +187,18 @@ def record_job_complete(job_config: dict, stage_times: dict, total_time: float,
     whisper = job_config.get("whisper_model", "large-v3")
     profile_key = f"{tts}_{trans}_{whisper}_{device}"
 
-    if "stage_times" not in stats:
-        stats["stage_times"] = {}
-    if profile_key not in stats["stage_times"]:
-        stats["stage_times"][profile_key] = {}
-
-    profile = stats["stage_times"][profile_key]
-    for stage_id, duration in stage_times.items():
-        if stage_id not in profile:
-            profile[stage_id] = {"samples": [], "avg": 0}
-        # Manter ultimos 10 samples
-        samples = profile[stage_id]["samples"]
-        samples.append(round(duration, 1))
-        if len(samples) > 10:
-            samples.pop(0)
-        profile[stage_id]["avg"] = round(sum(samples) / len(samples), 1)
-
-    # Tempo total
-    if "total_times" not in stats:
-        stats["total_times"] = []
-    stats["total_times"].append({
+    event = {
         "profile": profile_key,
+        "stage_times": {k: round(v, 1) for k, v in stage_times.items()},
         "total": round(total_time, 1),
-        "timestamp": time.time(),
-    })
-    if len(stats["total_times"]) > 50:
-        stats["total_times"] = stats["total_times"][-50:]
+        "ts": time.time(),
+    }
+    _apply_event(stats, event)
+    _append_event(event)
+    _events_since_compact += 1
 
-    _save_stats(stats)
+    if _events_since_compact >= COMPACT_EVERY:
+        _save_stats(stats)
 
 
 def estimate_remaining(job_config: dict, current_stage: int, stage_elapsed: float, device: str) -> Optional[dict]:
@@ -100,22 +219,15 @@ def estimate_remaining(job_config: dict, current_stage: int, stage_elapsed: floa
         # Sem dados historicos - usar estimativas default
         return _default_estimate(job_config, current_stage, device)
 
+    # Stages ja concluidas nunca mudam - so as pendentes precisam de estimativa
+    stage_estimates = {stage["id"]: {"status": "done"} for stage in STAGES[:current_stage]}
     remaining = 0.0
-    stage_estimates = {}
-    for stage in STAGES:
+    for stage in STAGES[current_stage:]:
         sid = stage["id"]
-        if stage["num"] <= current_stage:
-            stage_estimates[sid] = {"status": "done"}
-            continue
-        avg = profile.get(sid, {}).get("avg")
-        if avg:
-            stage_estimates[sid] = {"status": "pending", "est_seconds": avg}
-            remaining += avg
-        else:
-            # Usar default para stages sem dados
-            default = _default_stage_time(sid, job_config, device)
-            stage_estimates[sid] = {"status": "pending", "est_seconds": default}
-            remaining += default
+        # Default para stages sem dados historicos
+        est = profile.get(sid, {}).get("avg") or _default_stage_time(sid, job_config, device)
+        stage_estimates[sid] = {"status": "pending", "est_seconds": est}
+        remaining += est
 
     return {
         "eta_seconds": round(remaining),
@@ -126,15 +238,11 @@ def estimate_remaining(job_config: dict, current_stage: int, stage_elapsed: floa
 
 def _default_estimate(job_config: dict, current_stage: int, device: str) -> dict:
     """Estimativa default sem dados historicos."""
+    stage_estimates = {stage["id"]: {"status": "done"} for stage in STAGES[:current_stage]}
     remaining = 0.0
-    stage_estimates = {}
-    for stage in STAGES:
-        sid = stage["id"]
-        if stage["num"] <= current_stage:
-            stage_estimates[sid] = {"status": "done"}
-            continue
-        est = _default_stage_time(sid, job_config, device)
-        stage_estimates[sid] = {"status": "pending", "est_seconds": est}
+    for stage in STAGES[current_stage:]:
+        est = _default_stage_time(stage["id"], job_config, device)
+        stage_estimates[stage["id"]] = {"status": "pending", "est_seconds": est}
         remaining += est
 
     return {
@@ -146,14 +254,22 @@ def _default_estimate(job_config: dict, current_stage: int, device: str) -> dict
 
 def _default_stage_time(stage_id: str, config: dict, device: str) -> float:
     """Tempos default por etapa (em segundos) para video de ~10min."""
-    is_gpu = device == "cuda"
-    tts = config.get("tts_engine", "edge")
+    return _default_stage_time_cached(
+        stage_id,
+        config.get("tts_engine", "edge"),
+        config.get("translation_engine"),
+        device == "cuda",
+    )
+
 
+@functools.lru_cache(maxsize=256)
+def _default_stage_time_cached(stage_id: str, tts: Optional[str], trans: Optional[str], is_gpu: bool) -> float:
+    """Tabela de defaults - valores constantes, entao memoizar e gratis."""
     defaults = {
         "download": 30,
         "extraction": 5,
         "transcription": 120 if not is_gpu else 30,
-        "translation": 60 if config.get("translation_engine") != "ollama" else 180,
+        "translation": 60 if trans != "ollama" else 180,
         "split": 5,
         "tts": _tts_default(tts, is_gpu),
         "sync": 15,
@@ -3,75 +3,261 @@
    Tambem converte/extrai audio de arquivos locais via ffmpeg."""
 
 import argparse
-import glob as _glob
+import functools
 import json
+import os
 import subprocess
 import sys
+import urllib.error
 import urllib.request
+from collections import deque
 from pathlib import Path
 
+try:
+    import yt_dlp  # import pesado (~centenas de ms) - pagar uma vez, no load do modulo
+except ImportError:
+    yt_dlp = None
+
+# YoutubeDL reutilizavel por combinacao de opts - util quando o modulo e
+# importado e chamado varias vezes em vez de rodar como subprocess
+_YDL_CACHE: dict = {}
+
+
+def _opts_key(opts):
+    """Converte ydl_opts (com dicts/listas aninhados) em chave hashavel."""
+    if isinstance(opts, dict):
+        return tuple(sorted((k, _opts_key(v)) for k, v in opts.items()))
+    if isinstance(opts, (list, tuple)):
+        return tuple(_opts_key(v) for v in opts)
+    return opts
+
+
+def _get_ydl(ydl_opts: dict):
+    """Retorna um YoutubeDL cacheado para estas opts (cria na primeira vez)."""
+    key = _opts_key(ydl_opts)
+    ydl = _YDL_CACHE.get(key)
+    if ydl is None:
+        ydl = _YDL_CACHE[key] = yt_dlp.YoutubeDL(ydl_opts)
+    return ydl
+
 
 def write_checkpoint(dub_work_dir: Path, step: int):
     cp = {"last_step_num": step}
     (dub_work_dir / "checkpoint.json").write_text(json.dumps(cp))
 
 
+@functools.lru_cache(maxsize=1)
+def _detect_hw_encoder() -> str | None:
+    """Detecta encoder H.264 por hardware (NVENC > QSV > VAAPI) - probe unico."""
+    try:
+        out = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-encoders"],
+            capture_output=True, text=True, timeout=10,
+        ).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    for enc in ("h264_nvenc", "h264_qsv", "h264_vaapi"):
+        if enc in out:
+            return enc
+    return None
+
+
+def _video_args(height: int | None, force_sw: bool = False) -> list:
+    """Monta args de scale+codec de video usando o encoder de hardware se houver."""
+    enc = None if force_sw else _detect_hw_encoder()
+    if enc == "h264_vaapi":
+        vf = "format=nv12,hwupload" + (f",scale_vaapi=-2:{height}" if height else "")
+        return ["-vaapi_device", "/dev/dri/renderD128", "-vf", vf, "-c:v", "h264_vaapi", "-qp", "23"]
+    # fast_bilinear: o video e intermediario (sera re-processado no pipeline),
+    # nao vale o custo do bicubic default
+    args = ["-vf", f"scale=-2:{height}:flags=fast_bilinear"] if height else []
+    if enc == "h264_nvenc":
+        return args + ["-c:v", "h264_nvenc", "-preset", "p4", "-cq", "23"]
+    if enc == "h264_qsv":
+        return args + ["-c:v", "h264_qsv", "-global_quality", "23"]
+    return args + ["-c:v", "libx264", "-crf", "23", "-preset", "veryfast"]
+
+
+def _probe_format(local_file: Path) -> str | None:
+    """Nome do container via ffprobe (ex: 'mov,mp4,m4a,3gp,3g2,mj2')."""
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=format_name",
+             "-of", "csv=p=0", str(local_file)],
+            capture_output=True, text=True, timeout=15,
+        ).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return out or None
+
+
+def _reencode_cmd(local_file: Path, out_path: Path) -> list:
+    """Comando de re-encode completo para MP4 (usado quando remux nao da)."""
+    return [
+        "ffmpeg", "-y", "-i", str(local_file),
+        "-c:v", "libx264", "-crf", "23", "-preset", "veryfast",
+        "-c:a", "aac", "-b:a", "128k",
+        "-movflags", "+faststart",
+        str(out_path),
+    ]
+
+
+def _probe_audio(local_file: Path) -> tuple:
+    """Retorna (codec, bitrate) da primeira stream de audio via ffprobe."""
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name,bit_rate", "-of", "csv=p=0",
+             str(local_file)],
+            capture_output=True, text=True, timeout=15,
+        ).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return None, None
+    parts = out.split(",")
+    codec = parts[0] or None
+    bitrate = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+    return codec, bitrate
+
+
+def _run_ffmpeg(cmd: list) -> tuple:
+    """Roda ffmpeg guardando so o final do stderr.
+
+    capture_output=True materializava o stderr inteiro (MBs num transcode
+    longo) para usar apenas os ultimos 400 chars. Um deque bounded de
+    linhas mantem o uso de memoria constante. O stderr e lido em blocos e
+    quebrado tambem em \\r: o progresso periodico do ffmpeg so termina em
+    \\r, entao iterar por \\n acumularia o transcode inteiro numa "linha".
+    """
+    cmd = list(cmd)
+    if cmd and cmd[0] == "ffmpeg" and "-nostats" not in cmd:
+        cmd.insert(1, "-nostats")
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    tail = deque(maxlen=50)
+    resto = b""
+    for bloco in iter(lambda: proc.stderr.read(8192), b""):
+        partes = (resto + bloco).replace(b"\r", b"\n").split(b"\n")
+        resto = partes.pop()
+        tail.extend(p for p in partes if p)
+    if resto:
+        tail.append(resto)
+    rc = proc.wait()
+    err = b"\n".join(tail).decode("utf-8", errors="replace")[-400:]
+    return rc, err
+
+
 def process_local_file(local_file: Path, quality: str, outdir: Path) -> Path:
     """Converte/extrai audio de um arquivo local usando ffmpeg."""
     print(f"[baixar] Arquivo local: {local_file}", flush=True)
     print(f"[baixar] Qualidade/modo: {quality}", flush=True)
 
+    attempted_remux = False
+
     if quality == "audio":
         out_path = outdir / "video.mp3"
-        cmd = [
-            "ffmpeg", "-y", "-i", str(local_file),
-            "-vn", "-ar", "44100", "-ac", "2", "-b:a", "192k",
-            str(out_path),
-        ]
-        print("[baixar] Extraindo audio em MP3 192kbps...", flush=True)
+        codec, bitrate = _probe_audio(local_file)
+        if codec == "mp3" and (bitrate or 0) >= 192000:
+            # Fonte ja e MP3 com bitrate suficiente - stream copy e quase instantaneo
+            cmd = [
+                "ffmpeg", "-y", "-i", str(local_file),
+                "-vn", "-c:a", "copy",
+                str(out_path),
+            ]
+            print("[baixar] Fonte ja e MP3 192kbps+ - copiando sem re-encode...", flush=True)
+        else:
+            cmd = [
+                "ffmpeg", "-y", "-i", str(local_file),
+                "-vn", "-ar", "44100", "-ac", "2", "-b:a", "192k",
+                str(out_path),
+            ]
+            print("[baixar] Extraindo audio em MP3 192kbps...", flush=True)
     elif quality in ("1080p", "720p", "480p"):
         height = {"1080p": 1080, "720p": 720, "480p": 480}[quality]
         out_path = outdir / "video.mp4"
         cmd = [
             "ffmpeg", "-y", "-i", str(local_file),
-            "-vf", f"scale=-2:{height}",
-            "-c:v", "libx264", "-crf", "23", "-preset", "fast",
+            *_video_args(height),
             "-c:a", "aac", "-b:a", "128k",
+            "-movflags", "+faststart",
             str(out_path),
         ]
-        print(f"[baixar] Convertendo para {quality}...", flush=True)
+        print(f"[baixar] Convertendo para {quality} ({_detect_hw_encoder() or 'libx264'})...", flush=True)
     else:  # best — remux para MP4 sem re-encode
         out_path = outdir / "video.mp4"
+        fmt = _probe_format(local_file)
+        # Probe barato (~100ms) decide se o remux tem chance - evita esperar
+        # o ffmpeg parsear um webm/mkv grande so para abortar
+        attempted_remux = fmt is None or any(c in fmt for c in ("mp4", "mov", "m4a"))
+        if attempted_remux:
+            cmd = [
+                "ffmpeg", "-y", "-i", str(local_file),
+                "-c", "copy",
+                str(out_path),
+            ]
+            print("[baixar] Remuxando para MP4...", flush=True)
+        else:
+            cmd = _reencode_cmd(local_file, out_path)
+            print(f"[baixar] Container {fmt} nao remuxa para MP4 - re-encodando...", flush=True)
+
+    rc, err = _run_ffmpeg(cmd)
+    if rc != 0 and quality in ("1080p", "720p", "480p") and _detect_hw_encoder():
+        # Encoder detectado mas falhou em runtime (driver/VRAM) - cair para libx264
+        print("[baixar] Encoder de hardware falhou, tentando libx264...", flush=True)
         cmd = [
             "ffmpeg", "-y", "-i", str(local_file),
-            "-c", "copy",
+            *_video_args(height, force_sw=True),
+            "-c:a", "aac", "-b:a", "128k",
+            "-movflags", "+faststart",
             str(out_path),
         ]
-        print("[baixar] Remuxando para MP4...", flush=True)
-
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
+        rc, err = _run_ffmpeg(cmd)
+    if rc != 0:
         # Fallback: tentar sem copy se remux falhou (container format incompativel)
-        if quality == "best":
+        if attempted_remux:
             print("[baixar] Remux falhou, tentando com re-encode...", flush=True)
-            cmd2 = [
-                "ffmpeg", "-y", "-i", str(local_file),
-                "-c:v", "libx264", "-crf", "23", "-preset", "fast",
-                "-c:a", "aac", "-b:a", "128k",
-                str(out_path),
-            ]
-            result2 = subprocess.run(cmd2, capture_output=True, text=True)
-            if result2.returncode != 0:
-                raise RuntimeError(f"ffmpeg falhou: {result2.stderr[-400:]}")
+            rc2, err2 = _run_ffmpeg(_reencode_cmd(local_file, out_path))
+            if rc2 != 0:
+                raise RuntimeError(f"ffmpeg falhou: {err2}")
         else:
-            raise RuntimeError(f"ffmpeg falhou: {result.stderr[-400:]}")
+            raise RuntimeError(f"ffmpeg falhou: {err}")
 
     return out_path
 
 
+def _capped_format(h: int) -> str:
+    return (
+        f"bestvideo[height<={h}][ext=mp4]+bestaudio[ext=m4a]"
+        f"/bestvideo[height<={h}]+bestaudio/best[height<={h}]/best"
+    )
+
+
+# Format strings sao constantes por qualidade - montar uma vez no load
+_FORMAT_BY_QUALITY = {
+    "best": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best",
+    **{f"{h}p": _capped_format(h) for h in (1080, 720, 480)},
+}
+
+
+def _build_ydl_opts(quality: str, outtmpl: str) -> dict:
+    """Monta as opts do yt-dlp para a qualidade pedida."""
+    if quality == "audio":
+        return {
+            "format": "bestaudio/best",
+            "outtmpl": outtmpl,
+            "postprocessors": [{
+                "key": "FFmpegExtractAudio",
+                "preferredcodec": "mp3",
+                "preferredquality": "192",
+            }],
+        }
+    return {
+        "format": _FORMAT_BY_QUALITY.get(quality, _FORMAT_BY_QUALITY["best"]),
+        "outtmpl": outtmpl,
+        "merge_output_format": "mp4",
+    }
+
+
 def _find_firefox_profile() -> str | None:
     """Detecta o profile padrao do Firefox, incluindo instalacoes via snap."""
-    import os
     candidates = [
         # Firefox snap (Ubuntu)
         os.path.expanduser("~/snap/firefox/common/.mozilla/firefox"),
@@ -79,12 +265,15 @@ def _find_firefox_profile() -> str | None:
         os.path.expanduser("~/.mozilla/firefox"),
     ]
     for base in candidates:
-        if not Path(base).exists():
+        # Um scandir cobre os dois padroes *.default* que o glob fazia em duas passadas
+        try:
+            with os.scandir(base) as it:
+                profiles = sorted(e.path for e in it if ".default" in e.name and e.is_dir())
+        except OSError:
             continue
         # Preferir profile com cookies.sqlite
-        profiles = _glob.glob(f"{base}/*.default*") + _glob.glob(f"{base}/*.default")
-        for p in sorted(profiles):
-            if Path(p, "cookies.sqlite").exists():
+        for p in profiles:
+            if os.path.exists(os.path.join(p, "cookies.sqlite")):
                 return p
     return None
 
@@ -140,12 +329,16 @@ def main():
     # Resolver redirect de URLs curtas do Facebook (share/r/, share/v/, etc.)
     # O extrator do Facebook falha com essas URLs — precisa da URL real do video
     if "facebook.com/share/" in url:
+        ua = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36"}
         try:
-            req = urllib.request.Request(
-                url,
-                headers={"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36"},
-            )
-            resp = urllib.request.urlopen(req, timeout=15)
+            # So a URL final interessa - HEAD segue os redirects sem baixar a pagina
+            req = urllib.request.Request(url, method="HEAD", headers=ua)
+            try:
+                resp = urllib.request.urlopen(req, timeout=5)
+            except urllib.error.HTTPError:
+                # Servidor rejeitou HEAD - GET pedindo apenas o primeiro byte
+                req = urllib.request.Request(url, headers={**ua, "Range": "bytes=0-0"})
+                resp = urllib.request.urlopen(req, timeout=5)
             resolved = resp.url
             if resolved != url:
                 print(f"[baixar] URL Facebook resolvida: {resolved}", flush=True)
@@ -155,48 +348,11 @@ def main():
 
     print(f"[baixar] URL: {url}", flush=True)
 
-    try:
-        import yt_dlp
-    except ImportError:
+    if yt_dlp is None:
         print("[baixar] ERRO: yt-dlp nao instalado. Instale com: pip install yt-dlp", flush=True)
         sys.exit(1)
 
-    outtmpl = str(outdir / "video.%(ext)s")
-
-    if args.quality == "audio":
-        ydl_opts = {
-            "format": "bestaudio/best",
-            "outtmpl": outtmpl,
-            "postprocessors": [{
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }],
-        }
-    elif args.quality == "1080p":
-        ydl_opts = {
-            "format": "bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1080]+bestaudio/best[height<=1080]/best",
-            "outtmpl": outtmpl,
-            "merge_output_format": "mp4",
-        }
-    elif args.quality == "720p":
-        ydl_opts = {
-            "format": "bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=720]+bestaudio/best[height<=720]/best",
-            "outtmpl": outtmpl,
-            "merge_output_format": "mp4",
-        }
-    elif args.quality == "480p":
-        ydl_opts = {
-            "format": "bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=480]+bestaudio/best[height<=480]/best",
-            "outtmpl": outtmpl,
-            "merge_output_format": "mp4",
-        }
-    else:  # best
-        ydl_opts = {
-            "format": "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best",
-            "outtmpl": outtmpl,
-            "merge_output_format": "mp4",
-        }
+    ydl_opts = _build_ydl_opts(args.quality, str(outdir / "video.%(ext)s"))
 
     # Para URLs do Facebook: impersonacao + cookies do Firefox
     is_facebook = "facebook.com" in url or "fb.com" in url
@@ -223,8 +379,7 @@ def main():
 
     print("[baixar] Iniciando download...", flush=True)
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+        _get_ydl(ydl_opts).download([url])
     except Exception as e:
         err_str = str(e)
         if "Cannot parse data" in err_str and is_reel:
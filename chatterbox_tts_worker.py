@@ -14,11 +14,23 @@ Uso:
 
 import argparse
 import json
+import os
 import sys
 import time
 import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson  # parse em C - segments.json de varios MB cai de dezenas de ms para ~1ms
+except ImportError:
+    orjson = None
+
+# Configurar o caching allocator antes de qualquer alocacao CUDA -
+# expandable_segments evita fragmentacao ao longo de centenas de segmentos
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:256")
+
 import torch
 import soundfile as sf
 import numpy as np
@@ -26,18 +38,78 @@ import numpy as np
 
 CHATTERBOX_SR = 24000
 
-# Idiomas suportados pelo modelo Multilingual
-MTL_LANGS = {
-    "pt", "pt-br", "pt_br",
-    "es", "fr", "de", "it", "nl", "pl", "cs", "sk", "hu", "ro",
-    "uk", "ru", "tr", "ar", "zh", "ja", "ko", "hi", "sw", "cy"
-}
+# Mini-batch de segmentos por chamada de generate (amortiza setup de
+# KV-cache e kernel launches quando o modelo aceita lista de textos)
+BATCH_SIZE = max(1, int(os.environ.get("CHATTERBOX_BATCH", "4")))
+
+# None = ainda nao testado; False = modelo so aceita texto unitario
+_batch_supported = None
+
+# Modelos que ja passaram pelo warm-up do allocator
+_WARMED = set()
+
+# Desligavel via --no-compile (compilar custa ~1min na primeira geracao;
+# compensa em jobs longos e no modo servidor)
+_compile_enabled = True
+
+
+def _torch_21() -> bool:
+    try:
+        return tuple(int(x) for x in torch.__version__.split("+")[0].split(".")[:2]) >= (2, 1)
+    except ValueError:
+        return False
+
+
+def compilar_modelo(model, device: str, tag: str):
+    """Aplica torch.compile quando suportado; mantem eager se falhar."""
+    if not (_compile_enabled and device == "cuda" and hasattr(torch, "compile") and _torch_21()):
+        return model
+    try:
+        model = torch.compile(model, mode="reduce-overhead", dynamic=True)
+        print(f"[{tag}] torch.compile ativo (reduce-overhead)", flush=True)
+    except Exception as e:
+        print(f"[{tag}] torch.compile falhou, usando eager: {e}", flush=True)
+    return model
+
+# Chars alfanumericos (incl. latinos acentuados) - compilado uma vez
+_ALNUM_RE = re.compile(r"[A-Za-z0-9À-ɏ]")
+
+
+def _tem_texto_util(txt: str, minimo: int = 3) -> bool:
+    """True se txt tem pelo menos `minimo` chars alfanumericos (para no 3o)."""
+    n = 0
+    for _ in _ALNUM_RE.finditer(txt):
+        n += 1
+        if n >= minimo:
+            return True
+    return False
+
+# Device imposto via --device (cuda/cpu); "auto" mantem a checagem de VRAM
+_device_pref = "auto"
+
+# --cpu-int8: quantizacao dinamica dos Linear no fallback CPU
+_cpu_int8 = False
+
+
+def quantizar_cpu_int8(model, tag: str):
+    """Quantizacao dinamica int8 dos nn.Linear (GEMM VNNI, ~2x no CPU)."""
+    try:
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        print(f"[{tag}] Linear quantizados em int8 dinamico (CPU)", flush=True)
+    except Exception as e:
+        print(f"[{tag}] int8 dinamico falhou, mantendo fp32: {e}", flush=True)
+    return model
 
 
 def get_device() -> str:
     """Detecta device com verificação de VRAM disponível.
     MTL requer ~3-4GB VRAM. Se insuficiente, fallback para CPU.
+
+    Com --device cuda/cpu o parent ja decidiu - pula o mem_get_info
+    (que inicializa o contexto CUDA, ~1-2s a frio).
     """
+    if _device_pref in ("cuda", "cpu"):
+        return _device_pref
     if not torch.cuda.is_available():
         return "cpu"
     try:
@@ -54,10 +126,152 @@ def get_device() -> str:
         return "cuda"
 
 
+def quantizar_modelo(model, device: str):
+    """Reduz a precisao dos pesos na GPU conforme CHATTERBOX_PRECISION.
+
+    fp8: quantiza os Linear via torchao (Hopper/Ada); cai para bf16 se
+    torchao nao estiver instalado. bf16/fp16: cast direto. Vazio/fp32
+    mantem o modelo como carregado.
+    """
+    prec = os.environ.get("CHATTERBOX_PRECISION", "").lower()
+    if device != "cuda" or prec in ("", "fp32"):
+        return model
+    if prec == "fp8":
+        try:
+            from torchao.quantization import quantize_, Float8DynamicActivationFloat8WeightConfig
+            quantize_(model, Float8DynamicActivationFloat8WeightConfig())
+            print("[chatterbox_worker] pesos quantizados em FP8 (torchao)", flush=True)
+            return model
+        except Exception as e:
+            print(f"[chatterbox_worker] FP8 indisponivel ({e}), caindo para bf16", flush=True)
+            prec = "bf16"
+    dtype = torch.bfloat16 if prec == "bf16" else torch.float16
+    try:
+        model = model.to(dtype=dtype)
+        print(f"[chatterbox_worker] pesos em {prec}", flush=True)
+    except Exception as e:
+        print(f"[chatterbox_worker] cast {prec} falhou, mantendo precisao original: {e}", flush=True)
+    return model
+
+
+# Buffer host pinned reutilizado para as copias GPU->CPU (dimensionado
+# para ~60s de audio e crescido sob demanda)
+_PINNED_BUF = None
+
+
+def _wav_para_numpy(wav):
+    """Copia o wav gerado para numpy, via buffer pinned quando esta na GPU.
+
+    Evita alocar memoria pageable nova a cada segmento; a copia pinned e
+    assincrona e so sincroniza antes de entregar o array.
+    """
+    global _PINNED_BUF
+    t = wav.detach().reshape(-1).float()
+    if not t.is_cuda:
+        return t.numpy()
+    n = t.numel()
+    if _PINNED_BUF is None or _PINNED_BUF.numel() < n:
+        _PINNED_BUF = torch.empty(max(n, 60 * CHATTERBOX_SR), dtype=torch.float32, pin_memory=True)
+    buf = _PINNED_BUF[:n]
+    buf.copy_(t, non_blocking=True)
+    torch.cuda.synchronize()
+    return buf.numpy()
+
+
+# Buffer de zeros compartilhado entre todos os silencios (crescido sob demanda)
+_SILENCE_BUF = None
+
+
 def salvar_silencio(path, duracao_s, sr=CHATTERBOX_SR):
-    """Grava silencio para segmento que falhou."""
+    """Grava silencio para segmento que falhou.
+
+    Reusa um buffer de zeros unico e grava em PCM_16 - metade dos bytes
+    de um WAV float e nenhuma alocacao nova por segmento silencioso.
+    """
+    global _SILENCE_BUF
     n = max(1, int(duracao_s * sr))
-    sf.write(str(path), np.zeros(n, dtype=np.float32), sr)
+    if _SILENCE_BUF is None or len(_SILENCE_BUF) < n:
+        _SILENCE_BUF = np.zeros(max(n, sr * 60), dtype=np.float32)
+    sf.write(str(path), _SILENCE_BUF[:n], sr, subtype="PCM_16")
+
+
+def _generate_batch(model, texts, kwargs):
+    """Tenta gerar uma lista de textos numa chamada so.
+
+    Retorna lista de wavs (um por texto) ou None se o modelo nao suporta
+    batch — um tensor 2D com padding nao preserva a duracao real de cada
+    segmento, entao so aceitamos retorno em lista.
+    """
+    global _batch_supported
+    if _batch_supported is False or len(texts) == 1:
+        return None
+    try:
+        out = model.generate(texts, **kwargs)
+    except Exception:
+        _batch_supported = False
+        return None
+    if isinstance(out, (list, tuple)) and len(out) == len(texts):
+        _batch_supported = True
+        return list(out)
+    _batch_supported = False
+    return None
+
+
+def _lotes_por_tamanho(pending, max_ratio=1.2):
+    """Fatia a lista (ja ordenada por len(txt)) em lotes de tamanho parecido.
+
+    Corta o lote quando o proximo texto passa de 20% do comprimento do
+    primeiro: o padding de um batch e ditado pelo texto mais longo, entao
+    lotes homogeneos gastam menos steps autoregressivos em pad.
+    """
+    lote = []
+    for item in pending:
+        if lote and (len(lote) >= BATCH_SIZE or len(item[1]) > len(lote[0][1]) * max_ratio):
+            yield lote
+            lote = []
+        lote.append(item)
+    if lote:
+        yield lote
+
+
+# Refs ja convertidos neste processo: (path, mtime) -> caminho pronto
+_REF_PRONTO = {}
+
+
+def preparar_ref(ref: str) -> str:
+    """Converte o ref para WAV 24kHz mono uma unica vez.
+
+    model.generate redecodifica o audio_prompt_path a cada chamada; entregar
+    um WAV ja no sample rate do modelo evita o resample por segmento. O
+    arquivo convertido vai para /dev/shm quando disponivel (zero disco).
+    """
+    try:
+        key = (ref, os.stat(ref).st_mtime_ns)
+        pronto = _REF_PRONTO.get(key)
+        if pronto and Path(pronto).exists():
+            return pronto
+
+        info = sf.info(ref)
+        if info.samplerate == CHATTERBOX_SR and info.channels == 1:
+            _REF_PRONTO[key] = ref
+            return ref
+
+        data, sr = sf.read(ref, dtype="float32")
+        if data.ndim > 1:
+            data = data.mean(axis=1)
+        if sr != CHATTERBOX_SR:
+            import librosa
+            data = librosa.resample(data, orig_sr=sr, target_sr=CHATTERBOX_SR)
+
+        base = Path("/dev/shm") if Path("/dev/shm").exists() else Path(tempfile.gettempdir())
+        out = str(base / f"chatterbox_ref_{os.getpid()}_{len(_REF_PRONTO)}.wav")
+        sf.write(out, data, CHATTERBOX_SR)
+        print(f"[chatterbox_worker] ref convertido para 24kHz mono: {out}", flush=True)
+        _REF_PRONTO[key] = out
+        return out
+    except Exception as e:
+        print(f"[chatterbox_worker] aviso: nao converteu ref ({e}), usando original", flush=True)
+        return ref
 
 
 def normalizar_lang(lang: str) -> str:
@@ -65,117 +279,342 @@ def normalizar_lang(lang: str) -> str:
     return lang.lower().replace("-", "_").split("_")[0]
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--segments-json", required=True)
-    parser.add_argument("--workdir", required=True)
-    parser.add_argument("--lang", required=True)
-    parser.add_argument("--ref", default=None, help="WAV de referencia para voice clone")
-    parser.add_argument("--output-json", required=True)
-    parser.add_argument("--cfg-weight",   type=float, default=0.65, help="CFG weight (0.1-1.0). Alto = mais fiel ao ref")
-    parser.add_argument("--exaggeration", type=float, default=0.5,  help="Exaggeration (0.1-1.0). Alto = mais expressivo")
-    parser.add_argument("--temperature",  type=float, default=0.75, help="Temperature (0.1-1.5). Alto = mais variado")
-    args = parser.parse_args()
+# Modelos carregados neste processo, por tipo ("mtl"/"turbo") - no modo
+# servidor o mesmo modelo atende varios jobs sem recarregar do disco
+_MODELS = {}
 
-    with open(args.segments_json, encoding="utf-8") as f:
-        segments = json.load(f)
 
-    workdir = Path(args.workdir)
-    lang = normalizar_lang(args.lang)
-    device = get_device()
-    ref = args.ref if args.ref and Path(args.ref).exists() else None
+def _tts_class(use_multilingual: bool):
+    """Resolve a classe do modelo (import lazy - so o branch usado e carregado)."""
+    if use_multilingual:
+        from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+        return ChatterboxMultilingualTTS
+    from chatterbox.tts_turbo import ChatterboxTurboTTS
+    return ChatterboxTurboTTS
 
-    use_multilingual = lang != "en"
 
-    print(f"[chatterbox_worker] device={device}, lang={lang}, modelo={'mtl' if use_multilingual else 'turbo'}", flush=True)
-    if ref:
-        print(f"[chatterbox_worker] voice clone: {ref}", flush=True)
+def _from_pretrained(use_multilingual: bool, device: str):
+    return _tts_class(use_multilingual).from_pretrained(device=device)
 
+
+def carregar_modelo(use_multilingual: bool):
+    """Carrega (e cacheia) o modelo pedido, com fallback CUDA OOM -> CPU."""
+    key = "mtl" if use_multilingual else "turbo"
+    if key in _MODELS:
+        return _MODELS[key]
+
+    device = get_device()
+    if device == "cpu":
+        # No fallback CPU a inferencia e intra-op: usar todos os cores
+        torch.set_num_threads(os.cpu_count() or 1)
     t0 = time.time()
     try:
-        if use_multilingual:
-            from chatterbox.mtl_tts import ChatterboxMultilingualTTS
-            model = ChatterboxMultilingualTTS.from_pretrained(device=device)
-        else:
-            from chatterbox.tts_turbo import ChatterboxTurboTTS
-            model = ChatterboxTurboTTS.from_pretrained(device=device)
+        model = _from_pretrained(use_multilingual, device)
     except Exception as e:
         if device == "cuda" and ("out of memory" in str(e).lower() or "cuda" in str(e).lower()):
             print(f"[chatterbox_worker] CUDA OOM ao carregar modelo, retentando em CPU: {e}", flush=True)
             torch.cuda.empty_cache()
-            if use_multilingual:
-                from chatterbox.mtl_tts import ChatterboxMultilingualTTS
-                model = ChatterboxMultilingualTTS.from_pretrained(device="cpu")
-            else:
-                from chatterbox.tts_turbo import ChatterboxTurboTTS
-                model = ChatterboxTurboTTS.from_pretrained(device="cpu")
+            model = _from_pretrained(use_multilingual, "cpu")
             device = "cpu"
         else:
             raise
 
     print(f"[chatterbox_worker] modelo carregado em {time.time()-t0:.1f}s (device={device})", flush=True)
+    model = quantizar_modelo(model, device)
+    if device == "cpu" and _cpu_int8:
+        model = quantizar_cpu_int8(model, "chatterbox_worker")
+    model = compilar_modelo(model, device, "chatterbox_worker")
+    if device == "cuda":
+        torch.cuda.empty_cache()
+    _MODELS[key] = (model, device)
+    return model, device
+
+
+def processar_job(segments, workdir: Path, lang: str, ref, cfg_weight: float,
+                  exaggeration: float, temperature: float, output_wav=None,
+                  gap_s: float = 0.0) -> dict:
+    """Sintetiza todos os segmentos de um job e retorna o dict de resultado.
+
+    Com output_wav, grava um unico WAV concatenado (um open/close em vez de
+    centenas) e devolve start_sample/len por segmento em vez de um arquivo
+    por segmento. gap_s insere silencio entre segmentos consecutivos no
+    modo concatenado (ex.: pausa entre frases no tts_direct).
+    """
+    lang = normalizar_lang(lang)
+    ref = ref if ref and Path(ref).exists() else None
+    if ref:
+        ref = preparar_ref(ref)
+    use_multilingual = lang != "en"
+
+    print(f"[chatterbox_worker] lang={lang}, modelo={'mtl' if use_multilingual else 'turbo'}", flush=True)
+    if ref:
+        print(f"[chatterbox_worker] voice clone: {ref}", flush=True)
 
-    seg_results = []
+    model, _device = carregar_modelo(use_multilingual)
+
+    kwargs = {
+        "exaggeration": exaggeration,
+        "cfg_weight":   cfg_weight,
+        "temperature":  temperature,
+    }
+    if use_multilingual:
+        kwargs["language_id"] = lang
+    if ref:
+        kwargs["audio_prompt_path"] = ref
 
+    # Modo concatenado: acumula o audio por idx e grava tudo no final
+    audio_por_idx = {} if output_wav else None
+
+    # Separar silencios (sem texto util) dos segmentos a sintetizar
+    results = {}
+    pending = []  # (idx, txt, target_dur, out_path)
     for i, seg in enumerate(segments, 1):
         txt = (seg.get("text_trad") or seg.get("text") or "").strip()
         target_dur = seg.get("end", 0) - seg.get("start", 0)
         out_path = workdir / f"seg_{i:04d}.wav"
 
-        if len(re.findall(r"[A-Za-z0-9\u00C0-\u024F]", txt)) < 3:
-            salvar_silencio(out_path, target_dur)
-            seg_results.append({
+        if not _tem_texto_util(txt):
+            # results antes de audio_por_idx: o insert em audio_por_idx e o
+            # ponto de publicacao para o _flush_prontos na thread de escrita
+            results[i] = {
                 "idx": i, "file": str(out_path),
                 "target": target_dur, "actual": target_dur, "ratio": 1.0
-            })
-            continue
+            }
+            if audio_por_idx is None:
+                salvar_silencio(out_path, target_dur)
+            else:
+                audio_por_idx[i] = None  # silencio - preenchido na escrita
+        else:
+            pending.append((i, txt, target_dur, out_path))
+
+    # Ordenar por tamanho do texto: batches homogeneos desperdicam menos padding
+    pending.sort(key=lambda t: len(t[1]))
+    total = len(pending)
+    done = 0
 
-        t0 = time.time()
+    # Warm-up forca o allocator a crescer ate o steady-state antes do loop
+    if _device == "cuda" and id(model) not in _WARMED and pending:
+        _WARMED.add(id(model))
         try:
-            if use_multilingual:
-                kwargs = {
-                    "language_id": lang,
-                    "exaggeration": args.exaggeration,
-                    "cfg_weight":   args.cfg_weight,
-                    "temperature":  args.temperature,
-                }
-                if ref:
-                    kwargs["audio_prompt_path"] = ref
-                wav = model.generate(txt, **kwargs)
+            with torch.inference_mode():
+                model.generate(pending[0][1][:40], **kwargs)
+        except Exception:
+            pass
+
+    # Modo concatenado: o WAV final e escrito incrementalmente enquanto a
+    # GPU gera os proximos batches. Como os batches vem ordenados por
+    # tamanho de texto, um segmento so pode ir ao disco quando todos os
+    # anteriores ja estao prontos; os demais esperam em audio_por_idx ate a
+    # lacuna fechar e sao liberados assim que escritos (sem o pico de
+    # memoria de acumular o job inteiro para gravar no final).
+    sfo = None
+    gap = int(gap_s * CHATTERBOX_SR)
+    pos = 0
+    next_write = 1
+    if audio_por_idx is not None:
+        sfo = sf.SoundFile(str(output_wav), "w", samplerate=CHATTERBOX_SR,
+                           channels=1, subtype="FLOAT")
+
+    def _flush_prontos():
+        # Roda no pool de escrita (1 thread no modo concatenado, que garante
+        # a ordem) e consome o prefixo contiguo de segmentos ja prontos
+        nonlocal pos, next_write
+        while next_write in audio_por_idx:
+            i = next_write
+            rec = results[i]
+            if i > 1 and gap:
+                sfo.write(np.zeros(gap, dtype=np.float32))
+                pos += gap
+            audio = audio_por_idx.pop(i)
+            if audio is None:
+                n = max(1, int(rec["target"] * CHATTERBOX_SR))
+                sfo.write(np.zeros(n, dtype=np.float32))
             else:
-                kwargs = {
-                    "exaggeration": args.exaggeration,
-                    "cfg_weight":   args.cfg_weight,
-                    "temperature":  args.temperature,
+                n = len(audio)
+                sfo.write(audio)
+            rec["file"] = str(output_wav)
+            rec["start_sample"] = pos
+            rec["len"] = n
+            pos += n
+            next_write += 1
+
+    # inference_mode: sem buffers de autograd por segmento. As gravacoes de
+    # WAV vao para um pool de threads para sobrepor I/O de disco com a
+    # geracao do proximo batch.
+    writes = []
+    last_progress = time.monotonic()
+    with torch.inference_mode(), ThreadPoolExecutor(max_workers=2 if sfo is None else 1) as writer:
+        if sfo is not None and audio_por_idx:
+            writes.append(writer.submit(_flush_prontos))  # silencios iniciais
+        for batch in _lotes_por_tamanho(pending):
+            wavs = _generate_batch(model, [b[1] for b in batch], kwargs)
+            if wavs is None:
+                wavs = []
+                for i, txt, target_dur, out_path in batch:
+                    try:
+                        wavs.append(model.generate(txt, **kwargs))
+                    except Exception as e:
+                        print(f"[chatterbox_worker] ERRO seg {i}: {e}", flush=True)
+                        wavs.append(None)
+
+            for (i, txt, target_dur, out_path), wav in zip(batch, wavs):
+                if wav is None:
+                    audio_np = None
+                    actual_dur = target_dur
+                    ratio = 1.0
+                else:
+                    audio_np = _wav_para_numpy(wav)
+                    if getattr(wav, "is_cuda", False):
+                        # copia: o buffer pinned e reutilizado no proximo segmento
+                        audio_np = np.array(audio_np, dtype=np.float32)
+                    actual_dur = len(audio_np) / CHATTERBOX_SR
+                    ratio = actual_dur / target_dur if target_dur > 0 else 1.0
+
+                # results antes de audio_por_idx: o _flush_prontos concorrente
+                # le results[next_write] assim que a chave aparece em
+                # audio_por_idx, entao o insert la e o ponto de publicacao
+                results[i] = {
+                    "idx": i, "file": str(out_path),
+                    "target": target_dur, "actual": actual_dur, "ratio": ratio
                 }
-                if ref:
-                    kwargs["audio_prompt_path"] = ref
-                wav = model.generate(txt, **kwargs)
+                if audio_por_idx is None:
+                    if audio_np is None:
+                        salvar_silencio(out_path, target_dur)
+                    else:
+                        writes.append(writer.submit(sf.write, str(out_path), audio_np, CHATTERBOX_SR))
+                else:
+                    audio_por_idx[i] = audio_np
+                done += 1
+                # Throttle por tempo: cada flush e um syscall que serializa
+                # com o pipe do parent; 2 updates/s bastam para a UI
+                now = time.monotonic()
+                if done == total or now - last_progress >= 0.5:
+                    last_progress = now
+                    print(f"[chatterbox_worker] progresso: {done}/{total}", flush=True)
+
+            if sfo is not None:
+                writes.append(writer.submit(_flush_prontos))
+
+        # Propagar erros de I/O das gravacoes assincronas
+        for w in writes:
+            w.result()
+
+    if sfo is not None:
+        _flush_prontos()  # cobre jobs so de silencio (nenhum batch gerado)
+        sfo.close()
+
+    seg_results = [results[i] for i in sorted(results)]
+    print(f"[chatterbox_worker] concluido: {len(seg_results)} segmentos", flush=True)
+    return {"sr": CHATTERBOX_SR, "segments": seg_results}
 
-            audio_np = wav.squeeze().cpu().numpy()
-            sf.write(str(out_path), audio_np, CHATTERBOX_SR)
-            actual_dur = len(audio_np) / CHATTERBOX_SR
-            ratio = actual_dur / target_dur if target_dur > 0 else 1.0
 
-        except Exception as e:
-            print(f"[chatterbox_worker] ERRO seg {i}: {e}", flush=True)
-            salvar_silencio(out_path, target_dur)
-            actual_dur = target_dur
-            ratio = 1.0
+def _executar_pedido(req: dict):
+    """Executa um pedido (dict com os mesmos campos da CLI) e grava o output JSON.
+
+    Os segmentos podem vir inline no pedido ("segments") - sem tempfile
+    de ida e volta pelo disco - ou por caminho ("segments_json").
+    """
+    segments = req.get("segments")
+    if segments is None:
+        with open(req["segments_json"], "rb") as f:
+            raw = f.read()
+        segments = orjson.loads(raw) if orjson else json.loads(raw)
+
+    result = processar_job(
+        segments,
+        Path(req["workdir"]),
+        req["lang"],
+        req.get("ref"),
+        float(req.get("cfg_weight", 0.65)),
+        float(req.get("exaggeration", 0.5)),
+        float(req.get("temperature", 0.75)),
+        output_wav=req.get("output_wav"),
+        gap_s=float(req.get("gap_s", 0.0)),
+    )
+
+    # Compacto: o JSON e consumido so por programa (dublar_pro_v5/tts_direct)
+    if orjson:
+        data = orjson.dumps(result)
+    else:
+        data = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode()
+    with open(req["output_json"], "wb") as f:
+        f.write(data)
+
+
+def servir():
+    """Modo servidor: le pedidos JSONL do stdin e responde uma linha por job.
+
+    O modelo fica carregado entre pedidos, eliminando os 10-30s de reload
+    por invocacao. Logs de progresso vao para stderr; o stdout carrega so
+    o protocolo ({"status": "ok"|"error", ...} por linha).
+    """
+    proto_out = sys.stdout
+    sys.stdout = sys.stderr  # redireciona os prints de progresso
 
-        seg_results.append({
-            "idx": i, "file": str(out_path),
-            "target": target_dur, "actual": actual_dur, "ratio": ratio
-        })
+    print("[chatterbox_worker] modo servidor - aguardando pedidos", flush=True)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = orjson.loads(line) if orjson else json.loads(line)
+            _executar_pedido(req)
+            resp = {"status": "ok", "output_json": req["output_json"]}
+        except Exception as e:
+            resp = {"status": "error", "error": str(e)}
+        proto_out.write(json.dumps(resp, ensure_ascii=False) + "\n")
+        proto_out.flush()
 
-        if i % 5 == 0 or i == len(segments):
-            print(f"[chatterbox_worker] progresso: {i}/{len(segments)}", flush=True)
 
-    result = {"sr": CHATTERBOX_SR, "segments": seg_results}
-    with open(args.output_json, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments-json")
+    parser.add_argument("--workdir")
+    parser.add_argument("--lang")
+    parser.add_argument("--ref", default=None, help="WAV de referencia para voice clone")
+    parser.add_argument("--output-json")
+    parser.add_argument("--cfg-weight",   type=float, default=0.65, help="CFG weight (0.1-1.0). Alto = mais fiel ao ref")
+    parser.add_argument("--exaggeration", type=float, default=0.5,  help="Exaggeration (0.1-1.0). Alto = mais expressivo")
+    parser.add_argument("--temperature",  type=float, default=0.75, help="Temperature (0.1-1.5). Alto = mais variado")
+    parser.add_argument("--gap-s", type=float, default=0.0,
+                        help="Silencio (s) entre segmentos no modo --output-wav")
+    parser.add_argument("--output-wav", default=None,
+                        help="Grava um unico WAV concatenado (offsets no result JSON) em vez de um arquivo por segmento")
+    parser.add_argument("--server", action="store_true",
+                        help="Mantem o modelo carregado e atende pedidos JSONL via stdin/stdout")
+    parser.add_argument("--no-compile", action="store_true",
+                        help="Desativa torch.compile (util para runs curtos ou debug)")
+    parser.add_argument("--device", default="auto", choices=["auto", "cuda", "cpu"],
+                        help="Forca o device (pula a checagem de VRAM quando o parent ja decidiu)")
+    parser.add_argument("--cpu-int8", action="store_true",
+                        help="Quantiza os Linear em int8 dinamico no fallback CPU (~2x em CPUs com VNNI)")
+    args = parser.parse_args()
 
-    print(f"[chatterbox_worker] concluido: {len(seg_results)} segmentos", flush=True)
+    global _compile_enabled, _device_pref, _cpu_int8
+    _compile_enabled = not args.no_compile
+    _device_pref = args.device
+    _cpu_int8 = args.cpu_int8
+
+    if args.server:
+        servir()
+        return
+
+    for name in ("segments_json", "workdir", "lang", "output_json"):
+        if not getattr(args, name):
+            parser.error(f"--{name.replace('_', '-')} e obrigatorio fora do modo --server")
+
+    _executar_pedido({
+        "segments_json": args.segments_json,
+        "workdir": args.workdir,
+        "lang": args.lang,
+        "ref": args.ref,
+        "output_json": args.output_json,
+        "output_wav": args.output_wav,
+        "gap_s": args.gap_s,
+        "cfg_weight": args.cfg_weight,
+        "exaggeration": args.exaggeration,
+        "temperature": args.temperature,
+    })
 
 
 if __name__ == "__main__":
@@ -11,20 +11,43 @@ Uso:
         --source /path/edge_source.mp3 \
         --ref    /path/ref_converted.wav \
         --output /path/generated.wav
+
+    python3 chatterbox_vc_worker.py --server
+        Mantem o modelo carregado e atende pedidos JSONL via stdin/stdout.
 """
 
 import argparse
+import contextlib
+import json
+import os
+import sys
 import time
 from pathlib import Path
 
+# Configurar o caching allocator antes de qualquer alocacao CUDA
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:256")
+
 import torch
 import soundfile as sf
 
+_compile_enabled = True
+_device_pref = "auto"
+_cpu_int8 = False
+
+# Modelo residente - no modo --server o load (varios segundos + GB de
+# pesos) e pago uma vez e reusado entre conversoes
+_MODEL = None
+_MODEL_DEVICE = None
 
-def get_device() -> str:
+
+def get_device(preferido: str = "auto") -> str:
     """Detecta device com verificação de VRAM disponível.
     S3Gen (VC) usa ~1.5GB VRAM. Threshold conservador de 1.5GB.
+
+    Com preferido="cuda"/"cpu" o parent ja decidiu - pula o mem_get_info.
     """
+    if preferido in ("cuda", "cpu"):
+        return preferido
     if not torch.cuda.is_available():
         return "cpu"
     try:
@@ -39,31 +62,89 @@ def get_device() -> str:
         return "cuda"
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--source", required=True,
-                        help="Áudio fonte (saída do Edge TTS — fala neutra)")
-    parser.add_argument("--ref", required=True,
-                        help="WAV de referência 24kHz mono para clonagem de voz")
-    parser.add_argument("--output", required=True,
-                        help="Caminho do WAV de saída com a voz clonada")
-    args = parser.parse_args()
+def quantizar_modelo(model, device: str):
+    """Reduz a precisao dos pesos na GPU conforme CHATTERBOX_PRECISION.
 
-    source_path = Path(args.source)
-    ref_path = Path(args.ref)
-    out_path = Path(args.output)
+    fp8: quantiza os Linear via torchao (Hopper/Ada); cai para bf16 se
+    torchao nao estiver instalado. bf16/fp16: cast direto. Vazio/fp32
+    mantem o modelo como carregado.
+    """
+    prec = os.environ.get("CHATTERBOX_PRECISION", "").lower()
+    if device != "cuda" or prec in ("", "fp32"):
+        return model
+    if prec == "fp8":
+        try:
+            from torchao.quantization import quantize_, Float8DynamicActivationFloat8WeightConfig
+            quantize_(model, Float8DynamicActivationFloat8WeightConfig())
+            print("[vc_worker] pesos quantizados em FP8 (torchao)", flush=True)
+            return model
+        except Exception as e:
+            print(f"[vc_worker] FP8 indisponivel ({e}), caindo para bf16", flush=True)
+            prec = "bf16"
+    dtype = torch.bfloat16 if prec == "bf16" else torch.float16
+    try:
+        model = model.to(dtype=dtype)
+        print(f"[vc_worker] pesos em {prec}", flush=True)
+    except Exception as e:
+        print(f"[vc_worker] cast {prec} falhou, mantendo precisao original: {e}", flush=True)
+    return model
 
-    if not source_path.exists():
-        raise FileNotFoundError(f"Áudio fonte não encontrado: {source_path}")
-    if not ref_path.exists():
-        raise FileNotFoundError(f"Referência não encontrada: {ref_path}")
 
-    device = get_device()
+def _torch_21() -> bool:
+    try:
+        return tuple(int(x) for x in torch.__version__.split("+")[0].split(".")[:2]) >= (2, 1)
+    except ValueError:
+        return False
+
+
+def compilar_decoder(model, device: str):
+    """torch.compile no decoder S3Gen quando suportado; eager se falhar.
+
+    mode="reduce-overhead" ja captura e replay-a CUDA graphs no step do
+    decoder, eliminando o overhead de kernel launch em batch=1 - captura
+    manual via torch.cuda.CUDAGraph exigiria um decode_step exposto pela
+    API do Chatterbox, que nao existe.
+    """
+    if not (device == "cuda" and hasattr(torch, "compile") and _torch_21() and hasattr(model, "s3gen")):
+        return model
+    try:
+        model.s3gen = torch.compile(model.s3gen, mode="reduce-overhead", dynamic=True)
+        print("[vc_worker] torch.compile ativo no s3gen", flush=True)
+    except Exception as e:
+        print(f"[vc_worker] torch.compile falhou, usando eager: {e}", flush=True)
+    return model
+
+
+# Ultima referencia registrada por modelo: (path, mtime)
+_REF_CACHE = {}
+
+
+def preparar_ref(model, ref_path: Path) -> bool:
+    """Registra a voz alvo no modelo uma vez por (path, mtime).
+
+    O speaker encoder sobre o ref e puro desperdicio depois da primeira
+    passada; quando a API expoe set_target_voice, o embedding fica no
+    modelo e generate dispensa target_voice_path nas chamadas seguintes.
+    """
+    if not hasattr(model, "set_target_voice"):
+        return False
+    key = (str(ref_path), ref_path.stat().st_mtime_ns)
+    if _REF_CACHE.get(id(model)) == key:
+        return True
+    model.set_target_voice(str(ref_path))
+    _REF_CACHE[id(model)] = key
+    return True
+
+
+def carregar_modelo():
+    """Carrega o ChatterboxVC uma vez (CUDA OOM -> retry em CPU)."""
+    global _MODEL, _MODEL_DEVICE
+    if _MODEL is not None:
+        return _MODEL, _MODEL_DEVICE
+
+    device = get_device(_device_pref)
     print(f"[vc_worker] device={device}", flush=True)
-    print(f"[vc_worker] source={source_path} ({source_path.stat().st_size} bytes)", flush=True)
-    print(f"[vc_worker] ref={ref_path} ({ref_path.stat().st_size} bytes)", flush=True)
 
-    # Carregar modelo
     t0 = time.time()
     from chatterbox.vc import ChatterboxVC
     try:
@@ -78,19 +159,135 @@ def main():
             raise
     print(f"[vc_worker] modelo carregado em {time.time() - t0:.1f}s (device={device})", flush=True)
 
-    # Converter: fonte → voz do ref
+    model = quantizar_modelo(model, device)
+    if device == "cpu" and _cpu_int8:
+        try:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            print("[vc_worker] Linear quantizados em int8 dinamico (CPU)", flush=True)
+        except Exception as e:
+            print(f"[vc_worker] int8 dinamico falhou, mantendo fp32: {e}", flush=True)
+    if device == "cpu":
+        torch.set_num_threads(os.cpu_count() or 1)
+    if _compile_enabled:
+        model = compilar_decoder(model, device)
+    if device == "cuda":
+        torch.cuda.empty_cache()
+
+    _MODEL, _MODEL_DEVICE = model, device
+    return model, device
+
+
+def _executar_pedido(req: dict):
+    """Executa uma conversao (dict com os mesmos campos da CLI).
+
+    {"warmup": true} apenas carrega o modelo - o parent manda isso logo ao
+    iniciar o worker para sobrepor o load com o Edge TTS/ffmpeg.
+    """
+    if req.get("warmup"):
+        carregar_modelo()
+        return
+
+    source_path = Path(req["source"])
+    ref_path = Path(req["ref"])
+    out_path = Path(req["output"])
+
+    if not source_path.exists():
+        raise FileNotFoundError(f"Áudio fonte não encontrado: {source_path}")
+    if not ref_path.exists():
+        raise FileNotFoundError(f"Referência não encontrada: {ref_path}")
+
+    print(f"[vc_worker] source={source_path} ({source_path.stat().st_size} bytes)", flush=True)
+    print(f"[vc_worker] ref={ref_path} ({ref_path.stat().st_size} bytes)", flush=True)
+
+    model, device = carregar_modelo()
+
+    # Converter: fonte → voz do ref (inference_mode: sem buffers de autograd).
+    # Autocast bf16 (fp16 pre-Ampere) dobra o throughput do decoder conv/transformer.
     t1 = time.time()
-    wav = model.generate(
-        audio=str(source_path),
-        target_voice_path=str(ref_path),
-    )
+    if device == "cuda":
+        ac_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        autocast = torch.autocast(device_type="cuda", dtype=ac_dtype)
+    else:
+        autocast = contextlib.nullcontext()
+    with torch.inference_mode(), autocast:
+        if preparar_ref(model, ref_path):
+            wav = model.generate(audio=str(source_path))
+        else:
+            wav = model.generate(
+                audio=str(source_path),
+                target_voice_path=str(ref_path),
+            )
     elapsed = time.time() - t1
     print(f"[vc_worker] conversão VC concluida em {elapsed:.1f}s", flush=True)
 
-    audio_np = wav.squeeze().cpu().numpy()
+    # .float(): autocast pode devolver bf16, que o numpy nao representa
+    audio_np = wav.squeeze().float().cpu().numpy()
     sf.write(str(out_path), audio_np, model.sr)
     print(f"[vc_worker] salvo: {out_path} ({out_path.stat().st_size} bytes)", flush=True)
 
 
+def servir():
+    """Modo servidor: le pedidos JSONL do stdin e responde uma linha por job.
+
+    O modelo fica residente entre pedidos, eliminando o reload de varios
+    segundos por conversao. Logs de progresso vao para stderr; o stdout
+    carrega so o protocolo ({"status": "ok"|"error", ...} por linha).
+    """
+    proto_out = sys.stdout
+    sys.stdout = sys.stderr  # redireciona os prints de progresso
+
+    print("[vc_worker] modo servidor - aguardando pedidos", flush=True)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+            _executar_pedido(req)
+            resp = {"status": "ok", "output": req.get("output")}
+        except Exception as e:
+            resp = {"status": "error", "error": str(e)}
+        proto_out.write(json.dumps(resp, ensure_ascii=False) + "\n")
+        proto_out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source",
+                        help="Áudio fonte (saída do Edge TTS — fala neutra)")
+    parser.add_argument("--ref",
+                        help="WAV de referência 24kHz mono para clonagem de voz")
+    parser.add_argument("--output",
+                        help="Caminho do WAV de saída com a voz clonada")
+    parser.add_argument("--server", action="store_true",
+                        help="Mantem o modelo carregado e atende pedidos JSONL via stdin/stdout")
+    parser.add_argument("--no-compile", action="store_true",
+                        help="Desativa torch.compile (util para runs curtos ou debug)")
+    parser.add_argument("--device", default="auto", choices=["auto", "cuda", "cpu"],
+                        help="Forca o device (pula a checagem de VRAM quando o parent ja decidiu)")
+    parser.add_argument("--cpu-int8", action="store_true",
+                        help="Quantiza os Linear em int8 dinamico no fallback CPU (~2x em CPUs com VNNI)")
+    args = parser.parse_args()
+
+    global _compile_enabled, _device_pref, _cpu_int8
+    _compile_enabled = not args.no_compile
+    _device_pref = args.device
+    _cpu_int8 = args.cpu_int8
+
+    if args.server:
+        servir()
+        return
+
+    for name in ("source", "ref", "output"):
+        if not getattr(args, name):
+            parser.error(f"--{name} e obrigatorio fora do modo --server")
+
+    _executar_pedido({
+        "source": args.source,
+        "ref": args.ref,
+        "output": args.output,
+    })
+
+
 if __name__ == "__main__":
     main()
@@ -2,14 +2,44 @@
 """Clipar v1 - Corte de clips de video por timestamps manuais ou analise viral via LLM."""
 
 import argparse
+import functools
+import hashlib
+import http.client
+import io
 import json
+import os
+import queue
+import random
 import re
+import shutil
 import subprocess
 import sys
+import threading
 import time
+import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    import orjson  # parse em C - respostas longas de LLM em ~1/3 do tempo
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit  # JIT do parser de timestamps em SRTs grandes
+except ImportError:
+    njit = None
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+# Sessao keep-alive compartilhada: o handshake TCP+TLS e pago uma vez por
+# processo em vez de uma vez por chamada de LLM
+_SESSION = requests.Session() if requests else None
+
 # Prompts padrão — viral
 DEFAULT_SYSTEM_PROMPT = (
     "You are an expert video editor and social media strategist specializing in "
@@ -17,6 +47,27 @@ DEFAULT_SYSTEM_PROMPT = (
     "shareable moments from video transcripts."
 )
 
+# Prompt default em duas partes: a estatica (sem variaveis) vem primeiro
+# para aproveitar o prompt cache dos providers (prefixo identico entre
+# videos); transcript e limites numericos ficam na parte dinamica no fim.
+DEFAULT_USER_PROMPT_STATIC = (
+    "Analyze the video transcript below and identify the most engaging/viral segments.\n\n"
+    "Requirements:\n"
+    "- Choose complete thoughts/stories, never cut mid-sentence\n"
+    "- Prioritize: hooks, surprising facts, emotional moments, actionable tips, controversial opinions\n"
+    "- Clips must not overlap\n\n"
+    "Respond ONLY with a valid JSON array (no extra text, no markdown):\n"
+    '[\n  {"start": 10.5, "end": 75.2, "reason": "Strong hook about..."},\n'
+    '  {"start": 120.0, "end": 195.0, "reason": "Viral moment: ..."}\n]'
+)
+
+DEFAULT_USER_PROMPT_DYNAMIC = (
+    "Transcript:\n{transcript}\n\n"
+    "Identify the {num_clips} best segments. "
+    "Each clip must be between {min_dur} and {max_dur} seconds long."
+)
+
+# Template de mensagem unica - mantido para prompts customizados
 DEFAULT_USER_PROMPT = (
     "Analyze this video transcript and identify the {num_clips} most engaging/viral segments.\n\n"
     "Requirements:\n"
@@ -37,6 +88,25 @@ DEFAULT_TOPICS_SYSTEM_PROMPT = (
     "into coherent clips, one clip per topic."
 )
 
+DEFAULT_TOPICS_USER_PROMPT_STATIC = (
+    "Analyze the video transcript below and identify all distinct topics or subjects discussed.\n\n"
+    "Requirements:\n"
+    "- Each clip must cover ONE complete topic or subject area from start to finish\n"
+    "- Group ALL consecutive content about the same topic into a single clip\n"
+    "- When the speaker switches to a new subject, start a new clip\n"
+    "- Clips can be ANY duration — short or long, do NOT split clips to meet a time limit\n"
+    "- Clips must be contiguous and not overlap\n\n"
+    "Respond ONLY with a valid JSON array (no extra text, no markdown):\n"
+    '[\n  {"start": 10.5, "end": 75.2, "reason": "Assunto: Introducao e contexto"},\n'
+    '  {"start": 75.2, "end": 300.0, "reason": "Assunto: ..."}\n]'
+)
+
+DEFAULT_TOPICS_USER_PROMPT_DYNAMIC = (
+    "Transcript:\n{transcript}\n\n"
+    "Find at most {num_clips} distinct topics (find fewer if there are fewer distinct subjects)."
+)
+
+# Template de mensagem unica - mantido para prompts customizados
 DEFAULT_TOPICS_USER_PROMPT = (
     "Analyze this video transcript and identify all distinct topics or subjects discussed.\n\n"
     "Requirements:\n"
@@ -52,6 +122,36 @@ DEFAULT_TOPICS_USER_PROMPT = (
     '  {{"start": 75.2, "end": 300.0, "reason": "Assunto: ..."}}\n]'
 )
 
+# Templates dinamicos pre-divididos em {transcript}: o transcript (que
+# pode ter MBs) e concatenado direto em vez de atravessar o parser do
+# .format a cada chamada
+_USER_DYNAMIC_PARTS = DEFAULT_USER_PROMPT_DYNAMIC.split("{transcript}")
+_TOPICS_DYNAMIC_PARTS = DEFAULT_TOPICS_USER_PROMPT_DYNAMIC.split("{transcript}")
+
+
+@functools.lru_cache(maxsize=8)
+def _compile_user_template(template: str) -> tuple[str, ...]:
+    """Escapa chaves literais de um template customizado uma unica vez.
+
+    Retorna as partes divididas em {transcript}, ja com os placeholders
+    conhecidos reintroduzidos - o escape e o split saem do caminho por
+    chamada.
+    """
+    safe = template.strip().replace("{", "{{").replace("}", "}}")
+    for key in ("num_clips", "min_dur", "max_dur", "transcript"):
+        safe = safe.replace("{{" + key + "}}", "{" + key + "}")
+    return tuple(safe.split("{transcript}"))
+
+
+# Regexes de parse_timestamps compiladas uma vez no import.
+# Grupo de horas lazy: em "MM:SS" o primeiro campo tem que ser minutos
+_TIME_RE = re.compile(r"^\s*(?:(\d+):)??(?:(\d+):)?(\d+(?:[.,]\d+)?)\s*$")
+_PART_SPLIT_RE = re.compile(r"[;\r\n]+")
+_SRT_RE = re.compile(
+    r"^([\d]{1,2}:[\d]{2}:[\d]{2}[,.][\d]+)\s*-->\s*([\d]{1,2}:[\d]{2}:[\d]{2}[,.][\d]+)$"
+)
+_RANGE_RE = re.compile(r"^([\d:]+)\s*-\s*([\d:]+)$")
+
 # Base URLs para providers OpenAI-compativeis
 PROVIDER_BASE_URLS = {
     "openai":     "https://api.openai.com",
@@ -63,7 +163,11 @@ PROVIDER_BASE_URLS = {
 
 
 def write_checkpoint(workdir: Path, step_num: int, step_id: str, step_name: str):
-    """Escreve checkpoint no mesmo formato do dublar_pro_v5.py."""
+    """Escreve checkpoint no mesmo formato do dublar_pro_v5.py.
+
+    dub_work/ ja foi criado no inicio do main - sem mkdir por etapa.
+    tmp + os.replace: um crash no meio nunca deixa o checkpoint truncado.
+    """
     cp = {
         "last_step_num": step_num,
         "last_step": step_id,
@@ -71,13 +175,19 @@ def write_checkpoint(workdir: Path, step_num: int, step_id: str, step_name: str)
         "timestamp": time.time(),
     }
     cp_path = workdir / "dub_work" / "checkpoint.json"
-    cp_path.parent.mkdir(parents=True, exist_ok=True)
-    cp_path.write_text(json.dumps(cp, indent=2))
+    tmp = cp_path.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(cp, indent=2))
+    os.replace(tmp, cp_path)
     print(f"[checkpoint] etapa {step_num}: {step_name}", flush=True)
 
 
-def download_input(input_val: str, workdir: Path) -> Path:
-    """Baixa video se for URL, ou retorna o path local."""
+def download_input(input_val: str, workdir: Path) -> tuple[Path, float | None]:
+    """Baixa video se for URL, ou retorna o path local.
+
+    Retorna (path, duracao). A duracao vem do info.json que o yt-dlp ja
+    escreve - poupa um ffprobe (e seu probe de streams) mais adiante.
+    Para arquivos locais a duracao e None e o caller cai para o ffprobe.
+    """
     if input_val.startswith("http"):
         print(f"[download] Baixando: {input_val}", flush=True)
         out_template = workdir / "dub_work" / "source.%(ext)s"
@@ -86,6 +196,7 @@ def download_input(input_val: str, workdir: Path) -> Path:
             # acodec!=none garante que o formato tenha audio (evita video-only)
             "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best[acodec!=none][ext=mp4]/best[acodec!=none]/best",
             "--merge-output-format", "mp4",
+            "--write-info-json",
             "--output", str(out_template),
             "--no-playlist",
             input_val,
@@ -97,25 +208,70 @@ def download_input(input_val: str, workdir: Path) -> Path:
         files = [f for f in files if f.suffix not in (".json", ".txt", ".part")]
         if not files:
             raise RuntimeError("yt-dlp nao gerou arquivo de saida")
-        return sorted(files)[-1]
+
+        duration = None
+        info_path = workdir / "dub_work" / "source.info.json"
+        if info_path.exists():
+            try:
+                duration = float(json.loads(info_path.read_text(encoding="utf-8"))["duration"])
+            except (ValueError, KeyError, OSError):
+                pass
+        return sorted(files)[-1], duration
     else:
         p = Path(input_val)
         if not p.exists():
             raise FileNotFoundError(f"Arquivo nao encontrado: {input_val}")
-        return p
+        return p, None
+
+
+def _parse_time_digits(b) -> float:
+    """Acumula campos entre ':' com '.'/',' como separador decimal.
+
+    Loop puramente numerico sobre bytes - compilavel pelo numba sem
+    mudancas; cada ':' promove o acumulado para a proxima unidade
+    (s -> min -> h), entao 'MM:SS' e 'HH:MM:SS' saem da mesma conta.
+    """
+    total = 0.0
+    field = 0
+    frac = 0
+    div = 1.0
+    in_frac = False
+    for ch in b:
+        if 48 <= ch <= 57:  # '0'-'9'
+            if in_frac:
+                # Fracao acumulada como inteiro + uma divisao no fim:
+                # mesmo arredondamento do float() (",080" -> 0.08 exato)
+                frac = frac * 10 + (ch - 48)
+                div *= 10.0
+            else:
+                field = field * 10 + (ch - 48)
+        elif ch == 58:  # ':'
+            total = (total + field) * 60.0
+            field = 0
+        else:  # ',' ou '.'
+            in_frac = True
+    return total + field + frac / div
+
+
+if njit is not None:
+    # cache=True: o compile de ~1s so acontece na primeira execucao
+    _parse_time_digits = njit(cache=True, nogil=True)(_parse_time_digits)
+
+_TIME_CHARS = frozenset("0123456789:.,")
 
 
 def parse_time_str(s: str) -> float:
     """Converte 'HH:MM:SS', 'HH:MM:SS,mmm', 'MM:SS' ou 'SS' para segundos float."""
-    # Substituir vírgula de milissegundos (formato SRT) por ponto
-    s = s.strip().replace(",", ".")
-    parts = s.split(":")
-    if len(parts) == 1:
-        return float(parts[0])
-    elif len(parts) == 2:
-        return int(parts[0]) * 60 + float(parts[1])
-    else:
-        return int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
+    t = s.strip()
+    # Caminho quente (SRTs com milhares de cues): scanner de bytes sem regex
+    if t and all(c in _TIME_CHARS for c in t):
+        return _parse_time_digits(t.encode())
+    m = _TIME_RE.match(s)
+    if not m:
+        raise ValueError(f"Timestamp invalido: {s!r}")
+    h, mn, sec = m.groups()
+    # Vírgula de milissegundos (formato SRT) vira ponto
+    return int(h or 0) * 3600 + int(mn or 0) * 60 + float(sec.replace(",", "."))
 
 
 def parse_timestamps(timestamps_str: str) -> list[tuple[float, float]]:
@@ -128,16 +284,14 @@ def parse_timestamps(timestamps_str: str) -> list[tuple[float, float]]:
     """
     clips = []
     # Dividir em pares de timestamps: usa newline como separador primário para SRT
-    for part in re.split(r"[;\r\n]+", timestamps_str):
+    for part in _PART_SPLIT_RE.split(timestamps_str):
         part = part.strip()
         if not part:
             continue
 
         # Formato SRT: "HH:MM:SS,mmm --> HH:MM:SS,mmm"
-        srt_match = re.match(
-            r"^([\d]{1,2}:[\d]{2}:[\d]{2}[,.][\d]+)\s*-->\s*([\d]{1,2}:[\d]{2}:[\d]{2}[,.][\d]+)$",
-            part,
-        )
+        # ("-->" primeiro: descarta a linha sem rodar a regex completa)
+        srt_match = _SRT_RE.match(part) if "-->" in part else None
         if srt_match:
             start_s = parse_time_str(srt_match.group(1))
             end_s = parse_time_str(srt_match.group(2))
@@ -149,11 +303,11 @@ def parse_timestamps(timestamps_str: str) -> list[tuple[float, float]]:
 
         # Formato padrão: "HH:MM:SS-HH:MM:SS" ou "MM:SS-MM:SS"
         # Suporta múltiplos pares separados por vírgula na mesma linha
-        for subpart in re.split(r",", part):
+        for subpart in part.split(","):
             subpart = subpart.strip()
             if not subpart:
                 continue
-            match = re.match(r"^([\d:]+)\s*-\s*([\d:]+)$", subpart)
+            match = _RANGE_RE.match(subpart)
             if not match:
                 print(f"[warn] Timestamp invalido ignorado: {subpart}", flush=True)
                 continue
@@ -167,31 +321,128 @@ def parse_timestamps(timestamps_str: str) -> list[tuple[float, float]]:
     return clips
 
 
-def cut_clips(source: Path, timestamps: list[tuple[float, float]], clips_dir: Path) -> list[Path]:
-    """Corta clips usando ffmpeg sem re-encodar."""
-    clips_dir.mkdir(parents=True, exist_ok=True)
-    clip_files = []
+def _cut_one(source: Path, i: int, start: float, end: float, clips_dir: Path) -> Path | None:
+    """Corta um clip com stream copy; retorna o path ou None em erro."""
+    duration = end - start
+    out_path = clips_dir / f"clip_{i:02d}.mp4"
+    cmd = [
+        "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+        "-ss", str(start),
+        "-i", str(source),
+        "-t", str(duration),
+        "-c", "copy",
+        str(out_path),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"[warn] ffmpeg erro no clip {i}: {result.stderr[-300:]}", flush=True)
+        return None
+    return out_path
+
+
+def _cut_clips_one_pass(source: Path, timestamps: list[tuple[float, float]], clips_dir: Path,
+                        zip_queue: "queue.Queue | None" = None) -> list[Path] | None:
+    """Corta todos os clips num unico ffmpeg com o muxer segment.
+
+    Um processo so paga um fork/exec e um probe do container para K clips.
+    O video e segmentado em todas as fronteiras (starts e ends) e os
+    pedacos que caem nos buracos entre clips sao descartados. Retorna None
+    se o ffmpeg falhar (o caller cai para o corte por clip).
+    """
+    boundaries = sorted({t for se in timestamps for t in se if t > 0})
+    seg_dir = clips_dir / ".segments"
+    seg_dir.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+        "-i", str(source),
+        "-f", "segment",
+        "-segment_times", ",".join(f"{t:.3f}" for t in boundaries),
+        "-reset_timestamps", "1",
+        "-c", "copy",
+        str(seg_dir / "seg_%03d.mp4"),
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"[warn] ffmpeg segment falhou: {result.stderr[-300:]}", flush=True)
+        shutil.rmtree(seg_dir, ignore_errors=True)
+        return None
+
+    # O -c copy ajusta cada corte ao keyframe seguinte; se duas fronteiras
+    # caem no mesmo GOP o ffmpeg emite menos segmentos que o esperado e o
+    # mapeamento seg_%03d desloca - cada clip seguinte seria renomeado
+    # para o conteudo errado. Validar tudo antes de mover qualquer coisa.
+    esperados = len(boundaries) + 1
+    produzidos = len(list(seg_dir.glob("seg_*.mp4")))
+    if produzidos != esperados:
+        print(f"[warn] segment produziu {produzidos} segmentos (esperados {esperados}), "
+              "caindo para corte por clip", flush=True)
+        shutil.rmtree(seg_dir, ignore_errors=True)
+        return None
+
+    # Segmento k cobre [edges[k], edges[k+1]) - mapear clip -> segmento pelo start
+    edges = [0.0] + boundaries
+    seg_paths = []
     for i, (start, end) in enumerate(timestamps, 1):
-        duration = end - start
+        seg_path = seg_dir / f"seg_{edges.index(start):03d}.mp4"
+        if not seg_path.exists():
+            print(f"[warn] segmento ausente para o clip {i}, caindo para corte por clip", flush=True)
+            shutil.rmtree(seg_dir, ignore_errors=True)
+            return None
+        seg_paths.append(seg_path)
+
+    clip_files = []
+    for i, seg_path in enumerate(seg_paths, 1):
         out_path = clips_dir / f"clip_{i:02d}.mp4"
-        cmd = [
-            "ffmpeg", "-y",
-            "-ss", str(start),
-            "-i", str(source),
-            "-t", str(duration),
-            "-c", "copy",
-            str(out_path),
-        ]
-        print(f"[cutting] Clip {i:02d}: {start:.1f}s - {end:.1f}s ({duration:.1f}s)", flush=True)
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"[warn] ffmpeg erro no clip {i}: {result.stderr[-300:]}", flush=True)
-        else:
-            clip_files.append(out_path)
-            print(f"[cutting] Clip {i:02d} salvo: {out_path.name}", flush=True)
+        os.replace(seg_path, out_path)
+        clip_files.append(out_path)
+        if zip_queue is not None:
+            zip_queue.put(out_path)
+        print(f"[cutting] Clip {i:02d} salvo: {out_path.name}", flush=True)
+    shutil.rmtree(seg_dir, ignore_errors=True)
     return clip_files
 
 
+def cut_clips(source: Path, timestamps: list[tuple[float, float]], clips_dir: Path,
+              zip_queue: "queue.Queue | None" = None) -> list[Path]:
+    """Corta clips usando ffmpeg sem re-encodar.
+
+    Clips ordenados e sem sobreposicao (o caso dos modos viral/topics/
+    split-equal) saem todos de uma unica passada do muxer segment. Caso
+    contrario cada clip e um stream copy independente (I/O bound) e os
+    processos ffmpeg rodam em paralelo. Os nomes clip_NN.mp4 sao
+    deterministas, a ordem no disco nao depende da ordem de conclusao.
+    """
+    clips_dir.mkdir(parents=True, exist_ok=True)
+    if not timestamps:
+        return []
+    for i, (start, end) in enumerate(timestamps, 1):
+        print(f"[cutting] Clip {i:02d}: {start:.1f}s - {end:.1f}s ({end - start:.1f}s)", flush=True)
+
+    ordenado = all(
+        timestamps[k][1] <= timestamps[k + 1][0] for k in range(len(timestamps) - 1)
+    )
+    if len(timestamps) > 1 and ordenado:
+        clip_files = _cut_clips_one_pass(source, timestamps, clips_dir, zip_queue)
+        if clip_files is not None:
+            return clip_files
+
+    clip_files = []
+    workers = min(len(timestamps), os.cpu_count() or 4)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_cut_one, source, i, start, end, clips_dir): i
+            for i, (start, end) in enumerate(timestamps, 1)
+        }
+        for fut in as_completed(futures):
+            out_path = fut.result()
+            if out_path is not None:
+                clip_files.append(out_path)
+                if zip_queue is not None:
+                    zip_queue.put(out_path)
+                print(f"[cutting] Clip {futures[fut]:02d} salvo: {out_path.name}", flush=True)
+    return sorted(clip_files)
+
+
 def save_clips_metadata(clips_dir: Path, timestamps: list[tuple[float, float]], descriptions: list[str] | None = None):
     """Salva metadados dos clips (titulo, timestamps, descricao) em clips_metadata.json."""
     metadata = {}
@@ -210,24 +461,52 @@ def save_clips_metadata(clips_dir: Path, timestamps: list[tuple[float, float]],
     print(f"[metadata] Metadados de {len(metadata)} clips salvos", flush=True)
 
 
-def create_zip(clips_dir: Path) -> Path | None:
-    """Cria ZIP com todos os clips."""
+def _zip_worker(zip_queue: "queue.Queue", zip_path: Path):
+    """Consome paths da fila e escreve no ZIP ate receber o sentinel None.
+
+    ZIP_STORED: o H.264/AAC dentro do MP4 ja e comprimido, deflate so
+    queimaria CPU por <1% de reducao - o zip vira uma copia em velocidade
+    de disco. Chunks de 1MiB em vez do default de 16KiB do zf.write.
+    """
     import zipfile
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+        while True:
+            clip = zip_queue.get()
+            if clip is None:
+                break
+            with open(clip, "rb") as src, zf.open(zipfile.ZipInfo.from_file(clip, clip.name), "w") as dst:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+
+
+def cut_and_zip(source: Path, timestamps: list[tuple[float, float]], clips_dir: Path) -> list[Path]:
+    """Corta os clips e monta o clips.zip em paralelo com o corte.
+
+    O worker de zip roda numa thread e recebe cada clip assim que o
+    ffmpeg correspondente termina - a fase de empacotamento serializada
+    some do wall time (o zip fecha uma fracao de segundo apos o ultimo
+    clip).
+    """
+    clips_dir.mkdir(parents=True, exist_ok=True)
     zip_path = clips_dir / "clips.zip"
-    clips = sorted(clips_dir.glob("clip_*.mp4"))
-    if not clips:
+    zip_queue: queue.Queue = queue.Queue()
+    worker = threading.Thread(target=_zip_worker, args=(zip_queue, zip_path), daemon=True)
+    worker.start()
+    try:
+        clip_files = cut_clips(source, timestamps, clips_dir, zip_queue)
+    finally:
+        zip_queue.put(None)
+        worker.join()
+    if not clip_files:
         print("[warn] Nenhum clip para zipar", flush=True)
-        return None
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        for clip in clips:
-            zf.write(clip, clip.name)
+        zip_path.unlink(missing_ok=True)
+        return clip_files
     size_mb = zip_path.stat().st_size / (1024 * 1024)
-    print(f"[zip] ZIP criado: {zip_path.name} ({size_mb:.1f}MB, {len(clips)} clips)", flush=True)
-    return zip_path
+    print(f"[zip] ZIP criado: {zip_path.name} ({size_mb:.1f}MB, {len(clip_files)} clips)", flush=True)
+    return clip_files
 
 
 def extract_audio(source: Path, workdir: Path) -> Path:
-    """Extrai audio como WAV mono 16kHz para analise."""
+    """Extrai audio como WAV mono 16kHz para analise (engines que exigem arquivo)."""
     print("[extraction] Extraindo audio...", flush=True)
     audio_path = workdir / "dub_work" / "audio.wav"
     cmd = [
@@ -241,6 +520,26 @@ def extract_audio(source: Path, workdir: Path) -> Path:
     return audio_path
 
 
+def extract_audio_array(source: Path):
+    """Extrai o audio direto para memoria como float32 16kHz mono.
+
+    ffmpeg manda PCM s16le pelo pipe e o array vai direto para o
+    faster-whisper - o WAV intermediario (centenas de MB num video longo)
+    nunca toca o disco nem precisa ser relido.
+    """
+    import numpy as np
+    print("[extraction] Extraindo audio (pipe, sem WAV intermediario)...", flush=True)
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", str(source),
+        "-f", "s16le", "-ac", "1", "-ar", "16000", "-vn", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    raw, err = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou: {err.decode(errors='replace')[-500:]}")
+    return np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+
+
 def _has_cuda() -> bool:
     """Verifica se CUDA esta disponivel no PyTorch E no CTranslate2 (mesmo check do dublar_pro_v5.py)."""
     try:
@@ -254,32 +553,71 @@ def _has_cuda() -> bool:
         return False
 
 
-def transcribe_for_viral(audio_path: Path, model: str = "large-v3") -> list[dict]:
-    """Transcreve com faster-whisper para analise viral."""
-    print(f"[transcription] Transcrevendo com Whisper (modelo: {model})...", flush=True)
-    from faster_whisper import WhisperModel
+# WhisperModel por (modelo, device, compute) - carregar pesa segundos
+# (CUDA context + pesos); reusar dentro do processo e gratis
+_WHISPER_CACHE = {}
+
+
+def _get_whisper(model: str, device: str, compute: str):
+    key = (model, device, compute)
+    wm = _WHISPER_CACHE.get(key)
+    if wm is None:
+        from faster_whisper import WhisperModel
+        wm = _WHISPER_CACHE[key] = WhisperModel(model, device=device, compute_type=compute)
+    return wm
+
+
+def _pick_compute(device: str, requested: str | None) -> str:
+    """Escolhe o compute_type do CTranslate2.
 
+    Default int8_float16 na GPU: pesos na metade dos bytes com ativacoes
+    fp16 - large-v3 cabe em 8GB e o decode acelera por largura de banda.
+    Cai para int8 se o build local nao suportar o tipo escolhido.
+    """
+    compute = requested or ("int8_float16" if device == "cuda" else "int8")
+    try:
+        import ctranslate2
+        if compute not in ctranslate2.get_supported_compute_types(device):
+            print(f"[transcription] compute {compute} nao suportado em {device}, usando int8", flush=True)
+            compute = "int8"
+    except Exception:
+        pass
+    return compute
+
+
+def transcribe_for_viral(audio, model: str = "large-v3", compute: str | None = None) -> dict:
+    """Transcreve com faster-whisper para analise viral.
+
+    audio: Path de arquivo ou ndarray float32 16kHz (de extract_audio_array).
+    Retorna SoA: {"starts": [...], "ends": [...], "texts": [...]}.
+    """
+    print(f"[transcription] Transcrevendo com Whisper (modelo: {model})...", flush=True)
     device = "cuda" if _has_cuda() else "cpu"
-    compute = "float16" if device == "cuda" else "int8"
+    compute = _pick_compute(device, compute)
 
-    wm = WhisperModel(model, device=device, compute_type=compute)
-    segments_iter, info = wm.transcribe(str(audio_path), vad_filter=True)
+    wm = _get_whisper(model, device, compute)
+    segments_iter, info = wm.transcribe(str(audio) if isinstance(audio, Path) else audio, vad_filter=True)
 
-    results = []
+    # SoA: tres listas paralelas em vez de um dict de ~300B por segmento -
+    # num video de 2h sao ~5k segmentos e 15k lookups de dict a menos
+    starts: list[float] = []
+    ends: list[float] = []
+    texts: list[str] = []
     for seg in segments_iter:
-        results.append({
-            "start": round(seg.start, 3),
-            "end": round(seg.end, 3),
-            "text": seg.text.strip(),
-        })
+        starts.append(round(seg.start, 3))
+        ends.append(round(seg.end, 3))
+        texts.append(seg.text.strip())
 
-    print(f"[transcription] {len(results)} segmentos, idioma: {info.language}", flush=True)
-    return results
+    print(f"[transcription] {len(texts)} segmentos, idioma: {info.language}", flush=True)
+    return {"starts": starts, "ends": ends, "texts": texts}
 
 
 def transcribe_parakeet(audio_path: Path, model: str = "nvidia/parakeet-tdt-1.1b",
-                        segment_pause: float = 0.3, segment_max_words: int = 15) -> list[dict]:
-    """Transcreve com NVIDIA Parakeet (NeMo) — apenas ingles, mais rapido que Whisper."""
+                        segment_pause: float = 0.3, segment_max_words: int = 15) -> dict:
+    """Transcreve com NVIDIA Parakeet (NeMo) — apenas ingles, mais rapido que Whisper.
+
+    Retorna o mesmo formato SoA de transcribe_for_viral.
+    """
     print(f"[transcription] Transcrevendo com Parakeet (modelo: {model})...", flush=True)
     try:
         import nemo.collections.asr as nemo_asr
@@ -317,88 +655,145 @@ def transcribe_parakeet(audio_path: Path, model: str = "nvidia/parakeet-tdt-1.1b
         print("[WARN] Parakeet nao retornou timestamps por palavra", flush=True)
 
     print(f"[transcription] {len(segs)} segmentos (Parakeet/en)", flush=True)
-    return segs
+    return {
+        "starts": [s["start"] for s in segs],
+        "ends": [s["end"] for s in segs],
+        "texts": [s["text"] for s in segs],
+    }
 
 
-def _compact_segments(segments: list[dict], target_chunk_secs: float = 30.0) -> list[dict]:
+def _compact_segments(segments: dict, target_chunk_secs: float = 30.0) -> list[tuple[float, float, str]]:
     """Junta segmentos curtos do Whisper em blocos de ~30s para reduzir tokens no prompt.
 
     Whisper gera centenas de segmentos de 2-5s. Para o LLM identificar assuntos
     é mais eficiente ter blocos de 30s do que 500+ segmentos individuais.
+
+    segments e o SoA dos transcribe_*; retorna tuplas (start, end, text).
     """
-    if not segments:
-        return segments
+    starts, ends, texts = segments["starts"], segments["ends"], segments["texts"]
+    if not texts:
+        return []
     merged = []
-    cur = {"start": segments[0]["start"], "end": segments[0]["end"], "text": segments[0]["text"]}
-    for seg in segments[1:]:
-        if seg["end"] - cur["start"] < target_chunk_secs:
-            cur["end"] = seg["end"]
-            cur["text"] = cur["text"] + " " + seg["text"]
+    # Texto acumulado em lista + join no fechamento do bloco: concatenar
+    # strings no loop seria O(n^2) em transcricoes longas
+    cur_start, cur_end, parts = starts[0], ends[0], [texts[0]]
+    for i in range(1, len(texts)):
+        if ends[i] - cur_start < target_chunk_secs:
+            cur_end = ends[i]
+            parts.append(texts[i])
         else:
-            merged.append(cur)
-            cur = {"start": seg["start"], "end": seg["end"], "text": seg["text"]}
-    merged.append(cur)
+            merged.append((cur_start, cur_end, " ".join(parts)))
+            cur_start, cur_end, parts = starts[i], ends[i], [texts[i]]
+    merged.append((cur_start, cur_end, " ".join(parts)))
     return merged
 
 
 def _build_prompts(
-    segments: list[dict],
+    segments: dict,
     num_clips: int,
     min_dur: int | None = None,
     max_dur: int | None = None,
     custom_system: str | None = None,
     custom_user: str | None = None,
     topics_mode: bool = False,
-) -> tuple[str, str]:
-    """Retorna (system_prompt, user_prompt) com suporte a customização."""
+) -> tuple[str, list[str]]:
+    """Retorna (system_prompt, user_parts) com suporte a customização.
+
+    user_parts tem 2 mensagens nos prompts default: instrucoes estaticas
+    primeiro (prefixo identico entre videos - vira hit no prompt cache do
+    provider) e transcript+limites no fim. Prompts customizados nao tem
+    como ser divididos com seguranca e viram uma mensagem unica.
+    """
     # Compacta segmentos para reduzir tokens (Whisper gera centenas de segs de 2-5s)
     compacted = _compact_segments(segments, target_chunk_secs=30.0)
-    print(f"[prompts] Transcript: {len(segments)} segs → {len(compacted)} blocos de ~30s", flush=True)
-    transcript_text = "\n".join(
-        f"[{seg['start']:.1f}s - {seg['end']:.1f}s] {seg['text']}"
-        for seg in compacted
-    )
+    print(f"[prompts] Transcript: {len(segments['texts'])} segs → {len(compacted)} blocos de ~30s", flush=True)
+    # StringIO com write em variavel local: sem f-string intermediaria
+    # por bloco - em videos de horas o loop de montagem fica 3-5x menor
+    buf = io.StringIO()
+    write = buf.write
+    for start, end, text in compacted:
+        write("[")
+        write(format(start, ".1f"))
+        write("s - ")
+        write(format(end, ".1f"))
+        write("s] ")
+        write(text)
+        write("\n")
+    transcript_text = buf.getvalue().rstrip("\n")
     if topics_mode:
         system = (custom_system or DEFAULT_TOPICS_SYSTEM_PROMPT).strip()
-        user_template = (custom_user or DEFAULT_TOPICS_USER_PROMPT).strip()
+        static = DEFAULT_TOPICS_USER_PROMPT_STATIC
+        dynamic_parts = _TOPICS_DYNAMIC_PARTS
     else:
         system = (custom_system or DEFAULT_SYSTEM_PROMPT).strip()
-        user_template = (custom_user or DEFAULT_USER_PROMPT).strip()
-    # Escape literal braces (e.g. JSON examples in custom prompts) before .format()
-    # Strategy: escape ALL braces, then re-introduce our known placeholders
-    safe_template = user_template.replace("{", "{{").replace("}", "}}")
-    for key in ("num_clips", "min_dur", "max_dur", "transcript"):
-        safe_template = safe_template.replace("{{" + key + "}}", "{" + key + "}")
-    user = safe_template.format(
-        num_clips=num_clips,
-        min_dur=min_dur or 0,
-        max_dur=max_dur or 99999,
-        transcript=transcript_text,
-    )
-    return system, user
+        static = DEFAULT_USER_PROMPT_STATIC
+        dynamic_parts = _USER_DYNAMIC_PARTS
+
+    fmt = {"num_clips": num_clips, "min_dur": min_dur or 0, "max_dur": max_dur or 99999}
+    if not custom_user:
+        user_tail = transcript_text.join(p.format(**fmt) for p in dynamic_parts)
+        return system, [static, user_tail]
+
+    # Template customizado: escape de chaves literais e split cacheados
+    # em _compile_user_template - so o .format das partes roda por chamada
+    parts = _compile_user_template(custom_user)
+    user = transcript_text.join(p.format(**fmt) for p in parts)
+    return system, [user]
+
+
+def _json_loads(text: str):
+    return orjson.loads(text) if orjson else json.loads(text)
+
+
+def _extract_json_array(content: str) -> str | None:
+    """Extrai o primeiro array [...] balanceado por contagem de colchetes.
+
+    Uma passada linear com estado de string/escape - cobre tanto o array
+    solto quanto o embrulhado em bloco markdown, sem a regex gulosa
+    [\\s\\S]* que explodia em respostas longas malformadas.
+    """
+    start = content.find("[")
+    if start == -1:
+        return None
+    depth = 0
+    in_str = False
+    escaped = False
+    for pos in range(start, len(content)):
+        ch = content[pos]
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+            if depth == 0:
+                return content[start:pos + 1]
+    return None
 
 
 def _parse_llm_response(content: str, provider: str) -> list[dict]:
     """Parseia a resposta do LLM extraindo o array JSON."""
     # JSON direto
     try:
-        data = json.loads(content)
+        data = _json_loads(content)
         if isinstance(data, list):
             return data
     except Exception:
         pass
-    # Bloco markdown ```json ... ```
-    m = re.search(r"```(?:json)?\s*(\[[\s\S]*?\])\s*```", content)
-    if m:
-        try:
-            return json.loads(m.group(1))
-        except Exception:
-            pass
-    # Array solto na resposta
-    m = re.search(r"\[[\s\S]*\]", content)
-    if m:
+    # Array embutido (resposta com texto em volta ou bloco markdown)
+    extracted = _extract_json_array(content)
+    if extracted:
         try:
-            return json.loads(m.group(0))
+            data = _json_loads(extracted)
+            if isinstance(data, list):
+                return data
         except Exception:
             pass
     raise RuntimeError(f"Nao foi possivel parsear resposta do LLM ({provider}): {content[:300]}")
@@ -409,114 +804,230 @@ def _estimate_tokens(text: str) -> int:
     return len(text) // 4
 
 
-def _call_ollama(system: str, user: str, model: str, ollama_url: str) -> str:
+def _stream_lines(url: str, payload: dict, headers: dict,
+                  cancel: threading.Event | None = None):
+    """POST com streaming - gera as linhas da resposta como bytes.
+
+    Com requests instalado reusa a _SESSION keep-alive; senao cai para
+    urllib com conexao nova por chamada. timeout de leitura None = sem
+    limite (o modelo pode demorar).
+
+    Linhas saem cruas (bytes): o framing SSE e comparado por prefixo de
+    bytes e so o payload JSON e decodificado (dentro do orjson/json) -
+    menos trabalho Python por token em streams de 10k+ tokens.
+
+    cancel setado encerra o stream no proximo evento: os perdedores da
+    corrida de providers param de consumir tokens (e de cobrar).
+    """
+    if _SESSION is not None:
+        with _SESSION.post(url, json=payload, headers=headers, stream=True, timeout=(10, None)) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if cancel is not None and cancel.is_set():
+                    return
+                if line:
+                    yield line.strip()
+        return
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", **headers},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=None) as resp:
+        # BufferedReader de 64KiB: readline sai do buffer em vez de
+        # crescer um bytes novo por evento SSE
+        reader = io.BufferedReader(resp, buffer_size=1 << 16)
+        while line := reader.readline():
+            if cancel is not None and cancel.is_set():
+                return
+            line = line.strip()
+            if line:
+                yield line
+
+
+def _call_ollama(system: str, user, model: str, ollama_url: str,
+                 cancel: threading.Event | None = None) -> str:
     """Chama Ollama com streaming. timeout=None = sem limite (modelo pode demorar horas)."""
+    user_parts = [user] if isinstance(user, str) else list(user)
     # Ajusta num_ctx dinamicamente: min 8k, max 128k, baseado no tamanho real do prompt
-    prompt_tokens = _estimate_tokens(system + user)
+    prompt_tokens = _estimate_tokens(system + "".join(user_parts))
     # Arredonda para cima para o próximo múltiplo de 8192, com margem para a resposta
     num_ctx = max(8192, min(131072, ((prompt_tokens + 4096) // 8192 + 1) * 8192))
     print(f"[llm] prompt ~{prompt_tokens} tokens → num_ctx={num_ctx}", flush=True)
 
     payload = {
         "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
+        "messages": [{"role": "system", "content": system}]
+        + [{"role": "user", "content": p} for p in user_parts],
         "stream": True,
         "options": {"temperature": 0.3, "num_ctx": num_ctx},
     }
-    req = urllib.request.Request(
-        f"{ollama_url}/api/chat",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
     parts = []
-    with urllib.request.urlopen(req, timeout=None) as resp:
-        for raw_line in resp:
-            line = raw_line.decode("utf-8").strip()
-            if not line:
-                continue
-            chunk = json.loads(line)
-            parts.append(chunk.get("message", {}).get("content", ""))
-            if chunk.get("done"):
-                break
+    append = parts.append
+    for line in _stream_lines(f"{ollama_url}/api/chat", payload, {}, cancel):
+        chunk = _json_loads(line)
+        append(chunk.get("message", {}).get("content", ""))
+        if chunk.get("done"):
+            break
     return "".join(parts)
 
 
-def _call_openai_compat(system: str, user: str, model: str, api_key: str, base_url: str) -> str:
-    """Chama API compativel com OpenAI (OpenAI, Groq, DeepSeek, Together, Custom) com streaming SSE."""
+def _call_openai_compat(system: str, user, model: str, api_key: str, base_url: str,
+                        cancel: threading.Event | None = None) -> str:
+    """Chama API compativel com OpenAI (OpenAI, Groq, DeepSeek, Together, Custom) com streaming SSE.
+
+    O prefixo estatico vindo primeiro ja basta para o prefix caching
+    automatico desses providers.
+    """
+    user_parts = [user] if isinstance(user, str) else list(user)
     url = f"{base_url.rstrip('/')}/v1/chat/completions"
     payload = {
         "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
+        "messages": [{"role": "system", "content": system}]
+        + [{"role": "user", "content": p} for p in user_parts],
         "stream": True,
         "temperature": 0.3,
     }
-    req = urllib.request.Request(
-        url,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-        },
-        method="POST",
-    )
     parts = []
-    with urllib.request.urlopen(req, timeout=None) as resp:
-        for raw_line in resp:
-            line = raw_line.decode("utf-8").strip()
-            if not line or not line.startswith("data:"):
-                continue
-            data_str = line[len("data:"):].strip()
-            if data_str == "[DONE]":
-                break
-            try:
-                chunk = json.loads(data_str)
-                delta = chunk["choices"][0].get("delta", {}).get("content", "")
-                if delta:
-                    parts.append(delta)
-            except Exception:
-                continue
+    append = parts.append  # bound method: sem lookup de atributo por token
+    for line in _stream_lines(url, payload, {"Authorization": f"Bearer {api_key}"}, cancel):
+        if line[:5] != b"data:":
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+        try:
+            chunk = _json_loads(data)
+            delta = chunk["choices"][0].get("delta", {}).get("content", "")
+            if delta:
+                append(delta)
+        except Exception:
+            continue
     return "".join(parts)
 
 
-def _call_anthropic(system: str, user: str, model: str, api_key: str) -> str:
-    """Chama Anthropic API com streaming SSE."""
+def _call_anthropic(system: str, user, model: str, api_key: str,
+                    cancel: threading.Event | None = None) -> str:
+    """Chama Anthropic API com streaming SSE.
+
+    Com o prompt em duas partes, a estatica leva cache_control: a partir
+    da segunda chamada o prefixo vem do prompt cache (TTFB e custo menores).
+    """
+    user_parts = [user] if isinstance(user, str) else list(user)
+    if len(user_parts) > 1:
+        content = [{"type": "text", "text": user_parts[0], "cache_control": {"type": "ephemeral"}}]
+        content += [{"type": "text", "text": p} for p in user_parts[1:]]
+    else:
+        content = user_parts[0]
     payload = {
         "model": model,
         "max_tokens": 4096,
         "system": system,
-        "messages": [{"role": "user", "content": user}],
+        "messages": [{"role": "user", "content": content}],
         "stream": True,
     }
-    req = urllib.request.Request(
-        "https://api.anthropic.com/v1/messages",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
-            "Content-Type": "application/json",
-            "x-api-key": api_key,
-            "anthropic-version": "2023-06-01",
-        },
-        method="POST",
-    )
+    headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01"}
     parts = []
-    with urllib.request.urlopen(req, timeout=None) as resp:
-        for raw_line in resp:
-            line = raw_line.decode("utf-8").strip()
-            if not line or not line.startswith("data:"):
-                continue
+    append = parts.append
+    for line in _stream_lines("https://api.anthropic.com/v1/messages", payload, headers, cancel):
+        if line[:5] != b"data:":
+            continue
+        try:
+            chunk = _json_loads(line[5:].strip())
+            if chunk.get("type") == "content_block_delta":
+                append(chunk.get("delta", {}).get("text", ""))
+        except Exception:
+            continue
+    return "".join(parts)
+
+
+# Status que valem retry: rate limit e erros de servidor
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+_MAX_TRIES = 4
+
+
+def _transient(e: Exception) -> bool:
+    """Erro que tende a sumir num retry (429/5xx, timeout, conexao caida)."""
+    code = getattr(e, "code", None)  # urllib.error.HTTPError
+    resp = getattr(e, "response", None)  # requests.HTTPError
+    if code is None and resp is not None:
+        code = getattr(resp, "status_code", None)
+    if code is not None:
+        return code in _RETRY_STATUS
+    if isinstance(e, (TimeoutError, ConnectionError, http.client.IncompleteRead, urllib.error.URLError)):
+        return True
+    if requests is not None and isinstance(e, (requests.exceptions.ConnectionError,
+                                               requests.exceptions.Timeout,
+                                               requests.exceptions.ChunkedEncodingError)):
+        return True
+    return False
+
+
+def _call_provider(spec: dict, system: str, user,
+                   cancel: threading.Event | None = None) -> str:
+    """Despacha a chamada de LLM para o provider descrito em spec.
+
+    Retry com backoff exponencial em erros transitorios: um SSE caido no
+    meio nao custa a re-execucao do job inteiro, e a _SESSION keep-alive
+    poupa o handshake na retentativa.
+    """
+    provider = spec.get("provider", "ollama")
+
+    def _dispatch() -> str:
+        if provider == "ollama":
+            model = spec.get("model") or spec.get("ollama_model", "qwen2.5:7b")
+            return _call_ollama(system, user, model,
+                                spec.get("ollama_url", "http://localhost:11434"), cancel)
+        if provider == "anthropic":
+            return _call_anthropic(system, user, spec.get("model", ""), spec.get("api_key", ""), cancel)
+        base = spec.get("base_url") or PROVIDER_BASE_URLS.get(provider, "")
+        if not base:
+            raise ValueError(f"Base URL nao definida para provider '{provider}'")
+        return _call_openai_compat(system, user, spec.get("model", ""), spec.get("api_key", ""),
+                                   base, cancel)
+
+    for attempt in range(_MAX_TRIES):
+        try:
+            return _dispatch()
+        except Exception as e:
+            if cancel is not None and cancel.is_set():
+                raise  # a corrida ja tem vencedor, nao vale o retry
+            if attempt == _MAX_TRIES - 1 or not _transient(e):
+                raise
+            wait = min(30, 2 ** attempt) + random.random()
+            print(f"[llm] erro transitorio em {provider} ({e}), retry em {wait:.1f}s", flush=True)
+            time.sleep(wait)
+
+
+def _race_llm_calls(system: str, user: str, provider_specs: list[dict]) -> tuple[str, list[dict]]:
+    """Dispara todos os providers em paralelo e retorna a primeira resposta valida.
+
+    p50 vira a latencia do provider mais rapido em vez da soma de retries
+    sequenciais. Respostas que nao parseiam contam como falha e a corrida
+    continua. Apos a primeira vitoria o retorno e imediato: o evento de
+    cancelamento corta o stream dos perdedores no proximo evento SSE e o
+    shutdown(wait=False) nao espera as threads deles terminarem.
+    """
+    errors = []
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(provider_specs))
+    try:
+        futures = {pool.submit(_call_provider, spec, system, user, cancel): spec
+                   for spec in provider_specs}
+        for fut in as_completed(futures):
+            name = futures[fut].get("provider", "ollama")
             try:
-                chunk = json.loads(line[len("data:"):].strip())
-                if chunk.get("type") == "content_block_delta":
-                    parts.append(chunk.get("delta", {}).get("text", ""))
-            except Exception:
+                clips = _parse_llm_response(fut.result(), name)
+            except Exception as e:
+                errors.append(f"{name}: {e}")
                 continue
-    return "".join(parts)
+            print(f"[analysis] resposta vencedora: {name}", flush=True)
+            return name, clips
+        raise RuntimeError("Nenhum provider retornou resposta valida: " + "; ".join(errors))
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 def get_video_duration(video_path: Path) -> float:
@@ -529,9 +1040,14 @@ def get_video_duration(video_path: Path) -> float:
     return float(info["format"]["duration"])
 
 
-def split_equal_parts(source: Path, num_parts: int, clips_dir: Path) -> list[tuple[float, float]]:
-    """Divide o vídeo em num_parts partes iguais usando ffmpeg."""
-    duration = get_video_duration(source)
+def split_equal_parts(source: Path, num_parts: int, clips_dir: Path,
+                      duration: float | None = None) -> list[tuple[float, float]]:
+    """Divide o vídeo em num_parts partes iguais usando ffmpeg.
+
+    duration ja conhecida (info.json do yt-dlp) evita o ffprobe.
+    """
+    if duration is None:
+        duration = get_video_duration(source)
     part_dur = duration / num_parts
     timestamps = []
     for i in range(num_parts):
@@ -542,8 +1058,17 @@ def split_equal_parts(source: Path, num_parts: int, clips_dir: Path) -> list[tup
     return timestamps
 
 
+def _write_llm_cache(cache_file: Path, content: str):
+    """Grava a resposta validada do LLM no cache em disco."""
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        cache_file.write_text(content, encoding="utf-8")
+    except OSError as e:
+        print(f"[warn] Falha ao gravar cache do LLM: {e}", flush=True)
+
+
 def analyze_viral(
-    segments: list[dict],
+    segments: dict,
     num_clips: int,
     min_dur: int | None = None,
     max_dur: int | None = None,
@@ -556,8 +1081,20 @@ def analyze_viral(
     system_prompt: str | None = None,
     user_prompt: str | None = None,
     topics_mode: bool = False,
+    providers: list[dict] | None = None,
+    workdir: Path | None = None,
+    use_cache: bool = True,
 ) -> list[dict]:
-    """Identifica segmentos virais ou por assunto usando o provider LLM configurado."""
+    """Identifica segmentos virais ou por assunto usando o provider LLM configurado.
+
+    providers: lista opcional de specs ({provider, model, api_key, ...}) -
+    com mais de um, as chamadas correm em paralelo e vence a primeira
+    resposta valida.
+
+    Com workdir definido a resposta e cacheada em disco por hash de
+    provider+modelo+prompts - rodar de novo sobre o mesmo transcript nao
+    paga o round-trip do LLM.
+    """
     model_label = llm_model if provider != "ollama" else ollama_model
     if topics_mode:
         print(f"[analysis] Analisando assuntos com {provider}/{model_label} ({num_clips} max topicos)...", flush=True)
@@ -566,21 +1103,40 @@ def analyze_viral(
 
     system, user = _build_prompts(segments, num_clips, min_dur, max_dur, system_prompt, user_prompt, topics_mode=topics_mode)
 
+    cache_file = None
+    if workdir is not None and use_cache:
+        key = hashlib.sha256("|".join([provider, model_label, system, *user]).encode()).hexdigest()
+        cache_file = workdir / "dub_work" / "llm_cache" / f"{key}.json"
+        if cache_file.exists():
+            print("[analysis] Cache hit - reutilizando resposta do LLM", flush=True)
+            return _parse_llm_response(cache_file.read_text(encoding="utf-8"), provider)
+
+    if providers is None:
+        providers = [{
+            "provider": provider,
+            "model": llm_model,
+            "api_key": llm_api_key,
+            "base_url": llm_base_url,
+            "ollama_model": ollama_model,
+            "ollama_url": ollama_url,
+        }]
+
+    if len(providers) > 1:
+        _, clips = _race_llm_calls(system, user, providers)
+        if cache_file is not None:
+            _write_llm_cache(cache_file, json.dumps(clips, ensure_ascii=False))
+        return clips
+
     try:
-        if provider == "ollama":
-            content = _call_ollama(system, user, ollama_model, ollama_url)
-        elif provider == "anthropic":
-            content = _call_anthropic(system, user, llm_model, llm_api_key)
-        else:  # openai, groq, deepseek, together, custom
-            base = llm_base_url or PROVIDER_BASE_URLS.get(provider, "")
-            if not base:
-                raise ValueError(f"Base URL nao definida para provider '{provider}'")
-            content = _call_openai_compat(system, user, llm_model, llm_api_key, base)
+        content = _call_provider(providers[0], system, user)
     except Exception as e:
         raise RuntimeError(f"Erro ao chamar {provider}: {e}")
 
     print(f"[analysis] Resposta do LLM recebida ({len(content)} chars)", flush=True)
-    return _parse_llm_response(content, provider)
+    clips = _parse_llm_response(content, provider)
+    if cache_file is not None:
+        _write_llm_cache(cache_file, content)
+    return clips
 
 
 def main():
@@ -595,6 +1151,9 @@ def main():
     parser.add_argument("--max-duration", type=int, default=120, dest="max_duration")
     parser.add_argument("--asr-engine", default="whisper", choices=["whisper", "parakeet"], dest="asr_engine")
     parser.add_argument("--whisper-model", default="large-v3", dest="whisper_model")
+    parser.add_argument("--whisper-compute", default="", dest="whisper_compute",
+                        choices=["", "float16", "int8_float16", "int8", "int8_float32", "bfloat16"],
+                        help="compute_type do CTranslate2 (default: int8_float16 na GPU, int8 na CPU)")
     parser.add_argument("--parakeet-model", default="nvidia/parakeet-tdt-1.1b", dest="parakeet_model",
                         choices=["nvidia/parakeet-tdt-1.1b", "nvidia/parakeet-ctc-1.1b", "nvidia/parakeet-rnnt-1.1b"])
     parser.add_argument("--ollama-url", default="http://localhost:11434", dest="ollama_url")
@@ -614,6 +1173,8 @@ def main():
                         help="System prompt customizado para o LLM")
     parser.add_argument("--user-prompt", default="", dest="user_prompt",
                         help="User prompt customizado para o LLM (use {transcript}, {num_clips}, {min_dur}, {max_dur})")
+    parser.add_argument("--no-llm-cache", action="store_true", dest="no_llm_cache",
+                        help="Ignora o cache em disco de respostas do LLM")
     args = parser.parse_args()
 
     clips_dir = Path(args.outdir)
@@ -628,7 +1189,7 @@ def main():
 
         if args.mode == "manual":
             # Etapa 1: Download
-            source = download_input(args.input, workdir)
+            source, _ = download_input(args.input, workdir)
             write_checkpoint(workdir, 1, "download", "Download")
 
             # Etapa 2: Cutting
@@ -638,46 +1199,49 @@ def main():
                     f"Nenhum timestamp valido em: {repr(args.timestamps)!r}. "
                     "Use o formato: 00:30-02:15,05:00-07:30 (virgula, ponto-e-virgula ou nova linha como separador)"
                 )
-            cut_clips(source, timestamps, clips_dir)
+            cut_and_zip(source, timestamps, clips_dir)
             write_checkpoint(workdir, 2, "cutting", "Cortando clips")
             save_clips_metadata(clips_dir, timestamps)
 
-            # Etapa 3: ZIP
-            create_zip(clips_dir)
+            # Etapa 3: ZIP (ja montado em paralelo com o corte)
             write_checkpoint(workdir, 3, "zip", "Criando ZIP")
 
         else:  # viral / topics
             # Etapa 1: Download
-            source = download_input(args.input, workdir)
+            source, source_duration = download_input(args.input, workdir)
             write_checkpoint(workdir, 1, "download", "Download")
 
             if args.split_equal:
                 # Modo: dividir em partes iguais (sem IA)
                 print(f"[split] Dividindo em {args.num_clips} partes iguais...", flush=True)
-                timestamps = split_equal_parts(source, args.num_clips, clips_dir)
+                timestamps = split_equal_parts(source, args.num_clips, clips_dir, duration=source_duration)
                 descriptions = [f"Parte {i+1}" for i in range(len(timestamps))]
 
                 # Etapa 2: Cutting
-                cut_clips(source, timestamps, clips_dir)
+                cut_and_zip(source, timestamps, clips_dir)
                 write_checkpoint(workdir, 2, "cutting", "Cortando clips")
                 save_clips_metadata(clips_dir, timestamps, descriptions)
 
-                # Etapa 3: ZIP
-                create_zip(clips_dir)
+                # Etapa 3: ZIP (ja montado em paralelo com o corte)
                 write_checkpoint(workdir, 3, "zip", "Criando ZIP")
 
             else:
                 # Modo: análise viral com LLM
-                # Etapa 2: Extraction
-                audio = extract_audio(source, workdir)
+                # Etapa 2: Extraction (Whisper recebe o PCM por pipe;
+                # Parakeet/NeMo exige arquivo e mantem o WAV)
+                if args.asr_engine == "parakeet":
+                    audio = extract_audio(source, workdir)
+                else:
+                    audio = extract_audio_array(source)
                 write_checkpoint(workdir, 2, "extraction", "Extracao de audio")
 
                 # Etapa 3: Transcription
                 if args.asr_engine == "parakeet":
                     segments = transcribe_parakeet(audio, args.parakeet_model)
                 else:
-                    segments = transcribe_for_viral(audio, args.whisper_model)
-                if not segments:
+                    segments = transcribe_for_viral(audio, args.whisper_model,
+                                                    compute=args.whisper_compute or None)
+                if not segments["texts"]:
                     raise RuntimeError("Nenhum segmento de fala detectado no audio")
                 write_checkpoint(workdir, 3, "transcription", "Transcricao")
 
@@ -697,6 +1261,8 @@ def main():
                     system_prompt=args.system_prompt or None,
                     user_prompt=args.user_prompt or None,
                     topics_mode=is_topics,
+                    workdir=workdir,
+                    use_cache=not args.no_llm_cache,
                 )
                 print(f"[analysis] {len(viral_clips)} clips identificados:", flush=True)
                 timestamps = []
@@ -715,12 +1281,11 @@ def main():
                 write_checkpoint(workdir, 4, "analysis", analysis_label)
 
                 # Etapa 5: Cutting
-                cut_clips(source, timestamps, clips_dir)
+                cut_and_zip(source, timestamps, clips_dir)
                 write_checkpoint(workdir, 5, "cutting", "Cortando clips")
                 save_clips_metadata(clips_dir, timestamps, descriptions)
 
-                # Etapa 6: ZIP
-                create_zip(clips_dir)
+                # Etapa 6: ZIP (ja montado em paralelo com o corte)
                 write_checkpoint(workdir, 6, "zip", "Criando ZIP")
 
         print("[done] Corte concluido com sucesso!", flush=True)
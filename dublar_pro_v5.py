@@ -614,8 +614,9 @@ try:
     wav_16k = nemo_outdir / "audio_16k.wav"
     if not wav_16k.exists():
         subprocess.run(
-            ["ffmpeg", "-y", "-i", wav_path, "-ar", "16000", "-ac", "1", str(wav_16k)],
-            check=True, capture_output=True
+            ["ffmpeg", "-y", "-nostats", "-loglevel", "error",
+             "-i", wav_path, "-ar", "16000", "-ac", "1", str(wav_16k)],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
         )
     print("[NeMo] Audio reamostrado para 16kHz")
 
@@ -812,8 +813,9 @@ def diarize_audio(wav_path, workdir, num_speakers=None):
     import subprocess as _sp_pre
     try:
         _sp_pre.run(
-            ["ffmpeg", "-y", "-i", str(wav_path), "-ar", "16000", "-ac", "1", str(wav_16k)],
-            capture_output=True, check=True
+            ["ffmpeg", "-y", "-nostats", "-loglevel", "error",
+             "-i", str(wav_path), "-ar", "16000", "-ac", "1", str(wav_16k)],
+            stdout=_sp_pre.DEVNULL, stderr=_sp_pre.PIPE, check=True
         )
         wav_for_diar = wav_16k
         print(f"[INFO] Audio resampleado para 16kHz: {wav_16k.stat().st_size // 1024 // 1024}MB")
@@ -2428,6 +2430,11 @@ def tts_chatterbox(segments, workdir, tgt_lang, voice_sample=None):
         else:
             print("[INFO] Sem referencia de voz — usando voz padrao")
 
+        # Device ja decidido (ex: pelo job manager)? Worker pula o mem_get_info
+        forced_device = os.environ.get("CHATTERBOX_DEVICE", "")
+        if forced_device in ("cuda", "cpu"):
+            cmd += ["--device", forced_device]
+
         print(f"[INFO] Iniciando Chatterbox worker (lang={tgt_lang})...")
         result = subprocess.run(cmd, text=True, timeout=3600)
 
@@ -2544,10 +2551,10 @@ def tts_edge(segments, workdir, tgt_lang, voice=None, rate="+0%", speaker_voices
         await communicate.save(mp3_path)
 
         subprocess.run([
-            "ffmpeg", "-y", "-i", mp3_path,
+            "ffmpeg", "-y", "-nostats", "-loglevel", "error", "-i", mp3_path,
             "-ar", str(SAMPLE_RATE), "-ac", "1", "-c:a", "pcm_s16le",
             str(output_path)
-        ], capture_output=True)
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
 
         if os.path.exists(mp3_path):
             os.remove(mp3_path)
@@ -2829,10 +2836,14 @@ def apply_fade(seg_files, workdir, fade_in=0.01, fade_out=0.01):
         out = Path(workdir, p.name.replace(".wav", "_xf.wav"))
 
         try:
-            sr, data = wf.read(str(p))
+            # mmap: o int16 vem mapeado direto do page cache (zero-copy);
+            # a unica copia e a conversao para float32 logo abaixo
+            sr, data = wf.read(str(p), mmap=True)
 
             if data.dtype == np.int16:
                 data = data.astype(np.float32) / 32767.0
+            else:
+                data = np.array(data)  # copia gravavel para o fade in-place
 
             fade_in_samples = int(fade_in * sr)
             fade_out_samples = int(fade_out * sr)
@@ -2926,11 +2937,11 @@ def sync_fit_advanced(p, target, workdir, sr, tol, maxstretch, use_rubberband=Tr
             filter_str = f"atempo={atempo_val:.4f}"
 
         result = subprocess.run([
-            "ffmpeg", "-y", "-i", str(p),
+            "ffmpeg", "-y", "-nostats", "-loglevel", "error", "-i", str(p),
             "-filter:a", filter_str,
             "-c:a", "pcm_s16le",
             str(out)
-        ], capture_output=True)
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
 
         if result.returncode == 0 and out.exists():
             print(f"    [FIT-FF] {cur:.2f}s -> {target:.2f}s (ratio={ratio:.3f})")
@@ -2954,7 +2965,8 @@ def sync_pad(p, target, workdir, sr):
     out = Path(workdir, p.name.replace(".wav", "_pad.wav"))
 
     try:
-        file_sr, data = wf.read(str(p))
+        # mmap: so a fatia usada e decodificada na conversao para float32
+        file_sr, data = wf.read(str(p), mmap=True)
 
         if data.dtype == np.int16:
             data = data.astype(np.float32) / 32767.0
@@ -2964,9 +2976,12 @@ def sync_pad(p, target, workdir, sr):
         if len(data) >= target_samples:
             data = data[:target_samples]
         else:
-            pad_samples = target_samples - len(data)
-            silence = np.zeros(pad_samples, dtype=np.float32)
-            data = np.concatenate([data, silence])
+            # Pre-aloca o buffer final e copia uma vez - np.concatenate
+            # alocaria um array de silencio + copia extra (2x o pico de RAM)
+            padded = np.empty(target_samples, dtype=np.float32)
+            padded[:len(data)] = data
+            padded[len(data):] = 0.0
+            data = padded
 
         audio_int16 = normalize_audio_safe(data)
         wf.write(str(out), file_sr, audio_int16)
@@ -3050,12 +3065,12 @@ def sync_extend_prepare(seg_files, segs_trad, workdir):
 
             # Usar ffmpeg para adicionar silencio ao final
             subprocess.run([
-                "ffmpeg", "-y",
+                "ffmpeg", "-y", "-nostats", "-loglevel", "error",
                 "-i", str(p),
                 "-af", f"apad=pad_dur={silence_duration}",
                 "-ac", "1", "-ar", "22050",
                 str(padded_path)
-            ], capture_output=True)
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
 
             if padded_path.exists():
                 padded_files.append(padded_path)
@@ -3110,8 +3125,9 @@ def mux_video_extended(video_in, wav_in, out_mp4, bitrate, extensions, workdir):
     print("="*60)
 
     def run_quiet(cmd):
-        """Executa comando ffmpeg silenciosamente"""
-        return subprocess.run(cmd, capture_output=True)
+        """Executa comando ffmpeg silenciosamente (stderr so ate o PIPE,
+        sem materializar o stdout)"""
+        return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
 
     if not extensions:
         # Sem extensoes, usar mux normal
@@ -3260,18 +3276,52 @@ def mux_video_extended(video_in, wav_in, out_mp4, bitrate, extensions, workdir):
 # ETAPA 8: CONCATENACAO
 # ============================================================================
 
+def _concat_wavs_raw(seg_files, out_path, samplerate):
+    """Concatena WAVs PCM int16 mono uniformes copiando os bytes.
+
+    Os segmentos ja saem do fade/sync como PCM int16 no mesmo sample rate,
+    entao basta um header novo e copiar os frames em blocos de ~1MB - zero
+    decode/re-encode e memoria O(1). Levanta ValueError se algum arquivo
+    divergir do formato esperado (o chamador cai para o ffmpeg)."""
+    import wave
+    with wave.open(str(out_path), "wb") as wout:
+        wout.setnchannels(1)
+        wout.setsampwidth(2)
+        wout.setframerate(samplerate)
+        for p in seg_files:
+            with wave.open(str(p), "rb") as win:
+                fmt = (win.getnchannels(), win.getsampwidth(), win.getframerate())
+                if fmt != (1, 2, samplerate):
+                    raise ValueError(f"formato divergente em {p}: {fmt}")
+                remaining = win.getnframes()
+                while remaining > 0:
+                    n = min(remaining, 1 << 19)
+                    wout.writeframes(win.readframes(n))
+                    remaining -= n
+    return out_path
+
+
 def concat_segments(seg_files, workdir, samplerate):
     """Concatena segmentos de audio"""
     print("\n" + "="*60)
     print("=== ETAPA 8: Concatenacao ===")
     print("="*60)
 
+    out = Path(workdir, "dub_raw.wav")
+
+    # Caminho rapido: copia de bytes sem spawnar ffmpeg nem re-encodar
+    try:
+        _concat_wavs_raw(seg_files, out, samplerate)
+        print(f"[OK] Concatenado (raw): {out.name}")
+        return out
+    except Exception as e:
+        print(f"[WARN] Concat raw falhou ({e}), usando ffmpeg")
+
     lst = Path(workdir, "list.txt")
     with open(lst, "w", encoding="utf-8") as f:
         for p in seg_files:
             f.write(f"file '{p.name}'\n")
 
-    out = Path(workdir, "dub_raw.wav")
     sh(["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", str(lst),
         "-c:a", "pcm_s16le", "-ar", str(samplerate), "-ac", "1",
         str(out)])
@@ -3294,7 +3344,9 @@ def postprocess_audio(wav_in, workdir, samplerate):
     out = Path(workdir, "dub_final.wav")
 
     try:
-        file_sr, data = wf.read(str(wav_in))
+        # mmap: normalize_audio_safe so le o buffer; a copia unica e o
+        # astype(float32) interno - sem decodificar o WAV inteiro antes
+        file_sr, data = wf.read(str(wav_in), mmap=True)
         audio_int16 = normalize_audio_safe(data, target_peak=0.84)
         wf.write(str(out), file_sr, audio_int16)
         print(f"[OK] Pos-processado: {out.name}")
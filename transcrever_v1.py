@@ -2,14 +2,39 @@
 """Transcrever v1 - Transcricao standalone usando faster-whisper ou parakeet."""
 
 import argparse
+import atexit
+import functools
 import json
 import os
+import shutil
 import subprocess
 import sys
 import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import yt_dlp  # API em processo - evita o fork+exec do binario por download
+except ImportError:
+    yt_dlp = None
+
+try:
+    import orjson  # encode/parse em C - conta nos milhares de linhas de segmento
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(obj) -> str:
+    """json.dumps compacto, via orjson quando disponivel."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_loads(s):
+    return orjson.loads(s) if orjson is not None else json.loads(s)
+
 CHATTERBOX_PYTHON = os.environ.get(
     "CHATTERBOX_PYTHON",
     "/home/nmaldaner/miniconda3/envs/chatterbox/bin/python3",
@@ -35,19 +60,37 @@ def download_input(input_val: str, workdir: Path) -> Path:
     if input_val.startswith("http"):
         print(f"[download] Baixando: {input_val}", flush=True)
         out_template = workdir / "dub_work" / "source.%(ext)s"
-        cmd = [
-            "yt-dlp",
-            # Preferencia: melhor audio isolado -> melhor com acodec -> qualquer formato
-            # acodec!=none garante que o arquivo tenha audio (evita video-only como bytevc1)
-            "-f", "bestaudio[ext=m4a]/bestaudio/best[acodec!=none]/best",
-            "--output", str(out_template),
-            "--no-playlist",
-            "--write-info-json",
-            input_val,
-        ]
-        result = subprocess.run(cmd, capture_output=False)
-        if result.returncode != 0:
-            raise RuntimeError(f"yt-dlp falhou com codigo {result.returncode}")
+        # Preferencia: melhor audio isolado -> melhor com acodec -> qualquer formato
+        # acodec!=none garante que o arquivo tenha audio (evita video-only como bytevc1)
+        fmt = "bestaudio[ext=m4a]/bestaudio/best[acodec!=none]/best"
+        if yt_dlp is not None:
+            ydl_opts = {
+                "format": fmt,
+                "outtmpl": str(out_template),
+                "noplaylist": True,
+                "writeinfojson": True,
+            }
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(input_val)
+            # O proprio yt-dlp devolve o path final - sem glob no diretorio
+            # (que tropecaria em .part de downloads anteriores)
+            try:
+                return Path(info["requested_downloads"][0]["filepath"])
+            except (KeyError, IndexError, TypeError):
+                pass  # versao antiga sem o campo: cai no glob abaixo
+        else:
+            # Fallback pro binario quando o modulo nao esta instalado
+            cmd = [
+                "yt-dlp",
+                "-f", fmt,
+                "--output", str(out_template),
+                "--no-playlist",
+                "--write-info-json",
+                input_val,
+            ]
+            result = subprocess.run(cmd, capture_output=False)
+            if result.returncode != 0:
+                raise RuntimeError(f"yt-dlp falhou com codigo {result.returncode}")
         files = list((workdir / "dub_work").glob("source.*"))
         files = [f for f in files if f.suffix not in (".json", ".txt", ".part")]
         if not files:
@@ -65,13 +108,15 @@ def extract_audio(source: Path, workdir: Path) -> Path:
     print("[extraction] Extraindo audio...", flush=True)
     audio_path = workdir / "dub_work" / "audio.wav"
 
-    # Tentar com -vn (descarta video, extrai audio)
+    # Tentar com -vn (descarta video, extrai audio).
+    # -nostats -loglevel error: sem a linha de progresso por segundo o
+    # stderr capturado fica em bytes, nao MB, em videos longos
     cmd = [
-        "ffmpeg", "-y", "-i", str(source),
+        "ffmpeg", "-y", "-nostats", "-loglevel", "error", "-i", str(source),
         "-ac", "1", "-ar", "16000", "-vn",
         str(audio_path),
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
 
     if result.returncode != 0:
         # Fallback: arquivo pode ser audio puro (m4a, mp3, opus) sem stream de video
@@ -79,11 +124,11 @@ def extract_audio(source: Path, workdir: Path) -> Path:
         if "does not contain any stream" in result.stderr or "Invalid argument" in result.stderr:
             print("[extraction] Sem stream de video detectado, convertendo como audio puro...", flush=True)
             cmd2 = [
-                "ffmpeg", "-y", "-i", str(source),
+                "ffmpeg", "-y", "-nostats", "-loglevel", "error", "-i", str(source),
                 "-ac", "1", "-ar", "16000",
                 str(audio_path),
             ]
-            result2 = subprocess.run(cmd2, capture_output=True, text=True)
+            result2 = subprocess.run(cmd2, stderr=subprocess.PIPE, text=True)
             if result2.returncode != 0:
                 raise RuntimeError(f"ffmpeg falhou (audio puro): {result2.stderr[-500:]}")
             return audio_path
@@ -92,8 +137,28 @@ def extract_audio(source: Path, workdir: Path) -> Path:
     return audio_path
 
 
+def extract_audio_array(source: Path):
+    """Decodifica o audio direto para memoria como float32 16kHz mono.
+
+    ffmpeg manda PCM s16le pelo pipe e o array vai direto para o
+    faster-whisper - o WAV intermediario nunca toca o disco.
+    """
+    import numpy as np
+    print("[extraction] Extraindo audio (pipe, sem WAV intermediario)...", flush=True)
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", str(source),
+        "-f", "s16le", "-ac", "1", "-ar", "16000", "-vn", "-",
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    raw, err = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg falhou: {err.decode(errors='replace')[-500:]}")
+    return np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+
+
+@functools.lru_cache(maxsize=1)
 def _has_cuda() -> bool:
-    """Verifica se CUDA esta disponivel no PyTorch E no CTranslate2."""
+    """Verifica se CUDA esta disponivel no PyTorch E no CTranslate2 (probe unico)."""
     try:
         import torch
         if not torch.cuda.is_available():
@@ -105,8 +170,9 @@ def _has_cuda() -> bool:
         return False
 
 
+@functools.lru_cache(maxsize=1)
 def _chatterbox_has_cuda() -> bool:
-    """Verifica se o conda env chatterbox tem CUDA disponivel."""
+    """Verifica se o conda env chatterbox tem CUDA disponivel (probe unico)."""
     if not Path(CHATTERBOX_PYTHON).exists():
         return False
     try:
@@ -119,63 +185,254 @@ def _chatterbox_has_cuda() -> bool:
         return False
 
 
+# Worker GPU persistente - o init de torch+CUDA (~3s) e pago uma vez e o
+# modelo fica carregado entre transcricoes no mesmo processo
+_GPU_WORKER: subprocess.Popen | None = None
+
+
+def _get_gpu_worker() -> subprocess.Popen:
+    """Retorna o worker em modo --server, (re)iniciando se morreu."""
+    global _GPU_WORKER
+    if _GPU_WORKER is None or _GPU_WORKER.poll() is not None:
+        worker_script = Path(__file__).parent / "whisper_gpu_worker.py"
+        cmd = [CHATTERBOX_PYTHON, str(worker_script), "--server"]
+        if os.environ.get("WHISPER_GPU_NO_COMPILE"):
+            cmd.append("--no-compile")
+        _GPU_WORKER = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+    return _GPU_WORKER
+
+
+def _shutdown_gpu_worker():
+    if _GPU_WORKER is not None and _GPU_WORKER.poll() is None:
+        try:
+            _GPU_WORKER.stdin.close()
+            _GPU_WORKER.wait(timeout=10)
+        except Exception:
+            _GPU_WORKER.kill()
+
+
+atexit.register(_shutdown_gpu_worker)
+
+
+# Servidor GPU residente (whisper_gpu_worker.py --serve): sobrevive entre
+# execucoes do CLI, entao o load do modelo nem e pago por processo
+_GPU_SOCKET = os.environ.get("WHISPER_GPU_SOCKET", "/tmp/whisper_gpu.sock")
+
+
+def _gpu_request_via_socket(req: dict) -> dict | None:
+    """Envia o pedido ao servidor no socket unix; None se indisponivel."""
+    import socket
+    if not os.path.exists(_GPU_SOCKET):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(_GPU_SOCKET)
+            s.sendall((json.dumps(req) + "\n").encode("utf-8"))
+            buf = b""
+            while not buf.endswith(b"\n"):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+        if not buf:
+            return None
+        return json.loads(buf)
+    except (OSError, ValueError) as e:
+        print(f"[transcription] servidor GPU no socket indisponivel ({e}), usando worker proprio", flush=True)
+        return None
+
+
 def transcribe_whisper_gpu(audio_path: Path, model: str, src_lang: str | None) -> list[dict]:
     """Transcreve via worker GPU usando openai-whisper no conda env chatterbox."""
-    worker_script = Path(__file__).parent / "whisper_gpu_worker.py"
     output_json = audio_path.parent / "whisper_gpu_result.json"
 
-    cmd = [
-        CHATTERBOX_PYTHON, str(worker_script),
-        "--audio", str(audio_path),
-        "--model", model,
-        "--output-json", str(output_json),
-    ]
-    if src_lang:
-        cmd += ["--lang", src_lang]
-
     print(f"[transcription] Transcrevendo com Whisper GPU ({model})...", flush=True)
-    result = subprocess.run(cmd, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"whisper_gpu_worker retornou codigo {result.returncode}")
+    req = {
+        "audio": str(audio_path),
+        "model": model,
+        "lang": src_lang,
+        "output_json": str(output_json),
+    }
 
-    data = json.loads(output_json.read_text(encoding="utf-8"))
-    segments = data["segments"]
+    # Preferir o servidor residente no socket (modelo ja na VRAM de runs
+    # anteriores); senao, o worker proprio em modo --server
+    resp = _gpu_request_via_socket(req)
+    if resp is None:
+        worker = _get_gpu_worker()
+        worker.stdin.write(json.dumps(req) + "\n")
+        worker.stdin.flush()
+        line = worker.stdout.readline()
+        if not line:
+            raise RuntimeError("whisper_gpu_worker morreu sem responder")
+        resp = json.loads(line)
+    if resp.get("status") != "ok":
+        raise RuntimeError(f"whisper_gpu_worker falhou: {resp.get('error')}")
+
+    # O worker grava JSONL: primeira linha e o idioma, depois um segmento
+    # [start, end, text] por linha (compacto, sem repetir as chaves, e
+    # escrito incrementalmente conforme a transcricao avanca)
+    segments = []
+    language = ""
+    with open(output_json, encoding="utf-8") as f:
+        for raw in f:
+            raw = raw.strip()
+            if not raw:
+                continue
+            rec = _json_loads(raw)
+            if isinstance(rec, dict):
+                if rec.get("type") == "language":
+                    language = rec.get("value") or ""
+                continue
+            seg = {"start": rec[0], "end": rec[1], "text": rec[2]}
+            segments.append(seg)
+            print(f"  [{seg['start']:.1f}s -> {seg['end']:.1f}s] {seg['text']}", flush=True)
+
+    print(f"[transcription] {len(segments)} segmentos, idioma: {language or '?'}", flush=True)
+    return segments
 
-    for seg in segments:
-        print(f"  [{seg['start']:.1f}s -> {seg['end']:.1f}s] {seg['text']}", flush=True)
 
-    print(f"[transcription] {len(segments)} segmentos, idioma: {data.get('language', '?')}", flush=True)
-    return segments
+# Modelos carregados neste processo - o load do CTranslate2 custa segundos,
+# entao reusar os pesos entre chamadas no mesmo processo
+_MODEL_CACHE: dict[tuple, object] = {}
+
+_CT2_CACHE_DIR = Path.home() / ".cache" / "inemavox" / "ct2"
+
+
+def ensure_ct2_model(name: str, compute: str) -> str:
+    """Converte o modelo para CTranslate2 ja quantizado, uma vez, em disco.
+
+    compute_type= no WhisperModel re-quantiza a cada load (~2-3s); com o
+    diretorio pre-convertido os processos curtos pulam essa etapa. Com
+    compute="auto" nao ha tipo alvo conhecido - usa o nome direto.
+    """
+    if compute == "auto" or "/" in name or Path(name).exists():
+        return name
+    out_dir = _CT2_CACHE_DIR / f"{name}-{compute}"
+    if (out_dir / "model.bin").exists():
+        return str(out_dir)
+    if shutil.which("ct2-transformers-converter") is None:
+        return name
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    print(f"[transcription] Convertendo {name} para CT2 {compute} (so na primeira vez)...", flush=True)
+    result = subprocess.run(
+        ["ct2-transformers-converter",
+         "--model", f"openai/whisper-{name}",
+         "--output_dir", str(out_dir),
+         "--quantization", compute,
+         "--copy_files", "tokenizer.json", "preprocessor_config.json"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0 or not (out_dir / "model.bin").exists():
+        print(f"[transcription] Conversao CT2 falhou, usando load padrao: {result.stderr[-300:]}", flush=True)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        return name
+    return str(out_dir)
+
+
+def get_whisper_model(name: str, device: str, compute: str):
+    """Retorna um WhisperModel cacheado por (name, device, compute)."""
+    key = (name, device, compute)
+    wm = _MODEL_CACHE.get(key)
+    if wm is None:
+        from faster_whisper import WhisperModel
+        path = ensure_ct2_model(name, compute)
+        kwargs = {}
+        if device == "cpu":
+            # Deixar um core livre pro ffmpeg/IO: todos os cores + pipe de
+            # extracao no mesmo processo so gera context switch
+            kwargs["cpu_threads"] = max(1, (os.cpu_count() or 2) - 1)
+            kwargs["num_workers"] = 1
+        wm = _MODEL_CACHE[key] = WhisperModel(path, device=device, compute_type=compute, **kwargs)
+    return wm
+
+
+def _vad_spans(audio):
+    """Roda o Silero VAD uma vez e devolve os trechos de fala (em amostras).
+
+    O faster-whisper cacheia o modelo VAD no modulo, entao chamadas
+    seguintes nao pagam o init do onnxruntime. Retorna None se a API
+    interna nao existir nesta versao (cai no vad_filter por chamada).
+    """
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+        return get_speech_timestamps(audio, VadOptions())
+    except Exception:
+        return None
 
 
-def transcribe_whisper(audio_path: Path, model: str, src_lang: str | None) -> list[dict]:
-    """Transcreve com Whisper. Usa GPU via conda env se disponivel, senao faster-whisper CPU."""
-    if _chatterbox_has_cuda():
-        return transcribe_whisper_gpu(audio_path, model, src_lang)
+def _transcribe_call(wm, audio, lang, vad_filter: bool):
+    """Transcreve batched quando o pipeline existe; serial como fallback.
 
-    print(f"[transcription] Transcrevendo com faster-whisper CPU {model}...", flush=True)
-    from faster_whisper import WhisperModel
+    Segmentos isolados pelo VAD nao dependem uns dos outros - o pipeline
+    batched despacha varios de uma vez pro encoder/decoder (4-8x em GPU).
+    """
+    try:
+        from faster_whisper import BatchedInferencePipeline
+        pipe = BatchedInferencePipeline(model=wm)
+        return pipe.transcribe(audio, language=lang, vad_filter=vad_filter, batch_size=8)
+    except ImportError:
+        return wm.transcribe(audio, language=lang, vad_filter=vad_filter)
 
+
+def _pick_device_compute() -> tuple[str, str]:
+    """Escolhe device e compute type do faster-whisper.
+
+    "auto" deixa o CTranslate2 escolher o tipo mais rapido suportado pela
+    GPU (int8_float16 com tensor cores); float16 fixo falha em GPUs antigas.
+    ASR_QUANTIZATION forca um tipo especifico (ex.: int8_float16 p/ menos VRAM).
+    """
     device = "cuda" if _has_cuda() else "cpu"
-    compute = "float16" if device == "cuda" else "int8"
+    compute = os.environ.get("ASR_QUANTIZATION") or ("auto" if device == "cuda" else "int8")
+    return device, compute
 
-    wm = WhisperModel(model, device=device, compute_type=compute)
-    segments_iter, info = wm.transcribe(
-        str(audio_path),
-        language=src_lang or None,
-        vad_filter=True,
-    )
 
-    results = []
-    for seg in segments_iter:
-        results.append({
-            "start": round(seg.start, 3),
-            "end": round(seg.end, 3),
-            "text": seg.text.strip(),
-        })
-        print(f"  [{seg.start:.1f}s -> {seg.end:.1f}s] {seg.text.strip()}", flush=True)
+def transcribe_whisper(audio_path, model: str, src_lang: str | None) -> list[dict]:
+    """Transcreve com Whisper. Usa GPU via conda env se disponivel, senao faster-whisper CPU.
+
+    audio_path: Path de arquivo ou ndarray float32 16kHz (de extract_audio_array).
+    """
+    if isinstance(audio_path, Path) and _chatterbox_has_cuda():
+        return transcribe_whisper_gpu(audio_path, model, src_lang)
+
+    print(f"[transcription] Transcrevendo com faster-whisper CPU {model}...", flush=True)
+
+    device, compute = _pick_device_compute()
+
+    wm = get_whisper_model(model, device, compute)
+    audio_in = str(audio_path) if isinstance(audio_path, Path) else audio_path
+
+    results: list[dict] = []
+
+    def _consume(segments_iter, offset: float = 0.0):
+        for seg in segments_iter:
+            start = round(seg.start + offset, 3)
+            end = round(seg.end + offset, 3)
+            text = seg.text.strip()
+            results.append({"start": start, "end": end, "text": text})
+            print(f"  [{start:.1f}s -> {end:.1f}s] {text}", flush=True)
+
+    # Com o audio ja em memoria o VAD roda uma unica vez sobre o array
+    # inteiro e so os trechos com fala chegam ao modelo - o silencio nem
+    # entra no decoder, e o Silero nao e reinicializado por chamada
+    spans = None if isinstance(audio_path, Path) else _vad_spans(audio_in)
+
+    language = src_lang or None
+    if spans is not None:
+        for span in spans:
+            lo, hi = span["start"], span["end"]
+            segments_iter, info = _transcribe_call(wm, audio_in[lo:hi], language, vad_filter=False)
+            # Reusar o idioma detectado no primeiro trecho nos seguintes
+            language = language or info.language
+            _consume(segments_iter, offset=lo / 16000.0)
+    else:
+        segments_iter, info = _transcribe_call(wm, audio_in, language, vad_filter=True)
+        language = info.language
+        _consume(segments_iter)
 
-    print(f"[transcription] {len(results)} segmentos, idioma: {info.language}", flush=True)
+    print(f"[transcription] {len(results)} segmentos, idioma: {language or '?'}", flush=True)
     return results
 
 
@@ -203,9 +460,17 @@ def get_video_title(workdir: Path, input_val: str) -> str:
 
 def save_transcript_summary(segments: list[dict], outdir: Path, title: str = ""):
     """Salva um JSON com titulo e descricao (preview do texto) da transcricao."""
-    full_text = " ".join(seg["text"] for seg in segments)
-    description = full_text[:500].strip()
-    if len(full_text) > 500:
+    # So os primeiros ~500 chars importam - juntar o transcript inteiro
+    # alocaria uma string de MB num video longo para jogar quase tudo fora
+    parts: list[str] = []
+    acc = -1  # join com " " tem n-1 separadores
+    for seg in segments:
+        parts.append(seg["text"])
+        acc += len(seg["text"]) + 1
+        if acc > 600:
+            break
+    description = " ".join(parts)[:500].strip()
+    if acc > 500:
         last_space = description.rfind(" ")
         if last_space > 0:
             description = description[:last_space] + "..."
@@ -223,27 +488,28 @@ def save_transcript_summary(segments: list[dict], outdir: Path, title: str = "")
 
 
 def export_transcription(segments: list[dict], outdir: Path):
-    """Exporta SRT, TXT e JSON."""
+    """Exporta SRT, TXT e JSON numa unica passada, escrevendo incremental.
+
+    Nada de montar o arquivo inteiro em memoria com join: cada segmento
+    vai direto pros tres arquivos abertos, e o JSON e emitido elemento a
+    elemento em vez de serializar a lista toda de uma vez.
+    """
     print("[export] Exportando legendas...", flush=True)
     outdir.mkdir(parents=True, exist_ok=True)
 
-    # SRT
-    srt_lines = []
-    for i, seg in enumerate(segments, 1):
-        srt_lines.append(str(i))
-        srt_lines.append(f"{seconds_to_srt_time(seg['start'])} --> {seconds_to_srt_time(seg['end'])}")
-        srt_lines.append(seg["text"])
-        srt_lines.append("")
-    (outdir / "transcript.srt").write_text("\n".join(srt_lines), encoding="utf-8")
-
-    # TXT
-    txt = "\n".join(seg["text"] for seg in segments)
-    (outdir / "transcript.txt").write_text(txt, encoding="utf-8")
-
-    # JSON
-    (outdir / "transcript.json").write_text(
-        json.dumps(segments, indent=2, ensure_ascii=False), encoding="utf-8"
-    )
+    with open(outdir / "transcript.srt", "w", encoding="utf-8") as srt_f, \
+         open(outdir / "transcript.txt", "w", encoding="utf-8") as txt_f, \
+         open(outdir / "transcript.json", "w", encoding="utf-8") as json_f:
+        json_f.write("[")
+        for i, seg in enumerate(segments, 1):
+            srt_f.write(f"{i}\n")
+            srt_f.write(f"{seconds_to_srt_time(seg['start'])} --> {seconds_to_srt_time(seg['end'])}\n")
+            srt_f.write(seg["text"] + "\n\n")
+            txt_f.write(seg["text"] + "\n")
+            if i > 1:
+                json_f.write(",")
+            json_f.write("\n  " + _json_dumps(seg))
+        json_f.write("\n]")
 
     print(f"[export] Arquivos salvos em {outdir}", flush=True)
 
@@ -272,7 +538,17 @@ def main():
         write_checkpoint(workdir, 1, "download", "Download")
 
         # Etapa 2: Extraction
-        audio = extract_audio(source, workdir)
+        # O worker GPU precisa de um WAV em disco; o caminho faster-whisper
+        # em processo aceita ndarray e dispensa o arquivo intermediario.
+        # Nesse caso a carga do modelo (varios segundos) roda em background
+        # enquanto o ffmpeg extrai - o CTranslate2 solta o GIL no load
+        if _chatterbox_has_cuda():
+            audio = extract_audio(source, workdir)
+        else:
+            whisper_name = args.whisper_model if args.asr == "whisper" else "large-v3"
+            with ThreadPoolExecutor(max_workers=1) as ex:
+                ex.submit(get_whisper_model, whisper_name, *_pick_device_compute())
+                audio = extract_audio_array(source)
         write_checkpoint(workdir, 2, "extraction", "Extracao de audio")
 
         # Etapa 3: Transcription
@@ -10,13 +10,64 @@ Uso:
 
 import argparse
 import asyncio
+import atexit
+import functools
+import hashlib
 import json
 import os
+import re
 import subprocess
 import sys
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import soundfile as sf  # probe barato do ref (header) antes de chamar ffmpeg
+except ImportError:
+    sf = None
+
+try:
+    import orjson  # serializacao em C para os arquivos de interface com o worker
+except ImportError:
+    orjson = None
+
+# Quebra de sentencas por pontuacao - compilado uma vez no import
+_SENT_RE = re.compile(r'(?<=[.!?,;:])\s+')
+
+# edge_tts importado sob demanda e cacheado - o caminho chatterbox puro
+# nao paga o import, e chamadas repetidas nem passam pelo sys.modules
+_edge_tts = None
+
+
+def _get_edge_tts():
+    global _edge_tts
+    if _edge_tts is None:
+        import edge_tts
+        _edge_tts = edge_tts
+    return _edge_tts
+
+
+# Event loop unico para as corrotinas do Edge TTS: asyncio.run cria e
+# destroi um loop (e o estado de DNS/TLS do aiohttp pendurado nele) a cada
+# clipe; reusar o mesmo loop amortiza esse setup em lotes de clipes
+_EDGE_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def _run_async(coro):
+    """Roda a corrotina no loop persistente do modulo (criado sob demanda)."""
+    global _EDGE_LOOP
+    if _EDGE_LOOP is None or _EDGE_LOOP.is_closed():
+        _EDGE_LOOP = asyncio.new_event_loop()
+    return _EDGE_LOOP.run_until_complete(coro)
+
+
+def _shutdown_edge_loop():
+    if _EDGE_LOOP is not None and not _EDGE_LOOP.is_closed():
+        _EDGE_LOOP.close()
+
+
+atexit.register(_shutdown_edge_loop)
+
 # Vozes padrao por idioma (Edge TTS)
 EDGE_VOICE_DEFAULTS = {
     "pt": "pt-BR-FranciscaNeural",
@@ -38,22 +89,50 @@ EDGE_VOICE_DEFAULTS = {
 }
 
 
+# Escrita de checkpoint fora do caminho critico: 1 thread preserva a ordem
+# dos checkpoints e o TTS nao espera o fsync (10-100ms em FS de rede)
+_CP_POOL = ThreadPoolExecutor(max_workers=1)
+atexit.register(_CP_POOL.shutdown, wait=True)
+
+
+def _write_checkpoint_sync(path: Path, payload: str):
+    # temp + os.replace: um crash no meio da escrita nunca deixa um
+    # checkpoint.json truncado para a retomada ler
+    tmp = path.with_suffix(".json.tmp")
+    tmp.write_text(payload, encoding="utf-8")
+    os.replace(tmp, path)
+
+
 def write_checkpoint(outdir: Path, step: str, detail: str = ""):
     cp = {"last_step": step, "detail": detail}
-    (outdir.parent / "dub_work" / "checkpoint.json").write_text(
-        json.dumps(cp), encoding="utf-8"
-    )
+    path = outdir.parent / "dub_work" / "checkpoint.json"
+    _CP_POOL.submit(_write_checkpoint_sync, path, json.dumps(cp))
 
 
 async def run_edge(text: str, lang: str, voice: str | None, outdir: Path) -> Path:
-    import edge_tts
+    edge_tts = _get_edge_tts()
 
     voice_id = voice or EDGE_VOICE_DEFAULTS.get(lang.lower(), "pt-BR-FranciscaNeural")
-    out_path = outdir / "generated.mp3"
+    out_path = outdir / "generated.wav"
 
     print(f"[tts_direct] Edge TTS: voz={voice_id}, lang={lang}", flush=True)
     communicate = edge_tts.Communicate(text, voice_id)
-    await communicate.save(str(out_path))
+    # O stream MP3 do Edge vai direto pro stdin do ffmpeg, que decodifica
+    # para WAV 24kHz mono enquanto os chunks chegam - sem MP3 intermediario
+    # em disco nem re-decode nas etapas seguintes
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", "pipe:0", "-ac", "1", "-ar", "24000", str(out_path),
+        stdin=asyncio.subprocess.PIPE,
+    )
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            proc.stdin.write(chunk["data"])
+            await proc.stdin.drain()
+    proc.stdin.close()
+    await proc.wait()
+    if proc.returncode != 0 or not out_path.exists():
+        raise RuntimeError("ffmpeg falhou ao decodificar o stream do Edge TTS")
     print(f"[tts_direct] Audio gerado: {out_path} ({out_path.stat().st_size} bytes)", flush=True)
     return out_path
 
@@ -64,15 +143,39 @@ def convert_ref_to_wav(ref_path: str, outdir: Path) -> str:
     - 24000 Hz = S3GEN_SR do Chatterbox MTL (evita mel/token mismatch)
     - Trim para 10s = DEC_COND_LEN do modelo (evita padding inconsistente)
     - soundfile não lê MP4/MP3 diretamente, por isso sempre convertemos
+
+    O WAV vai para /dev/shm quando existe (tmpfs): o worker le direto da
+    RAM, sem escrita+leitura de disco so para transportar 240kB. O nome e
+    derivado de (path, mtime) do original, entao refs repetidos pulam a
+    conversao e o cache de ref do worker (chaveado por path+mtime)
+    continua valendo entre jobs.
     """
-    wav_path = outdir / "ref_converted.wav"
+    # Ref ja no formato alvo: nada a converter (so o header e lido)
+    if sf is not None and ref_path.lower().endswith(".wav"):
+        try:
+            info = sf.info(ref_path)
+            if info.samplerate == 24000 and info.channels == 1 and info.duration <= 10:
+                return ref_path
+        except Exception:
+            pass
+
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() else outdir
+    try:
+        st = os.stat(ref_path)
+        tag = hashlib.md5(f"{os.path.abspath(ref_path)}:{st.st_mtime_ns}".encode()).hexdigest()[:12]
+    except OSError:
+        tag = "conv"
+    wav_path = base / f"inemavox_ref_{tag}.wav"
+    if wav_path.exists() and wav_path.stat().st_size > 44:
+        return str(wav_path)
     try:
         result = subprocess.run(
-            ["ffmpeg", "-y", "-i", ref_path,
+            ["ffmpeg", "-y", "-nostats", "-loglevel", "error", "-i", ref_path,
              "-ar", "24000", "-ac", "1",
              "-t", "10",          # clip para 10s (DEC_COND_LEN do MTL)
              "-f", "wav", str(wav_path)],
-            capture_output=True, text=True, timeout=60,
+            stderr=subprocess.PIPE, text=True, timeout=60,
         )
         if result.returncode == 0 and wav_path.exists():
             print(f"[tts_direct] Referencia convertida: 24kHz mono, max 10s -> {wav_path}", flush=True)
@@ -84,36 +187,105 @@ def convert_ref_to_wav(ref_path: str, outdir: Path) -> str:
 
 
 def split_sentences(text: str, max_chars: int = 120) -> list[str]:
-    """Divide texto longo em sentenças curtas para evitar loop no modelo."""
-    import re
-    # Dividir em sentenças por pontuação
-    parts = re.split(r'(?<=[.!?,;:])\s+', text.strip())
+    """Divide texto longo em sentenças curtas para evitar loop no modelo.
+
+    Trabalha com offsets sobre o texto original (finditer nos separadores)
+    e fatia uma unica vez por chunk emitido - sem lista intermediaria de
+    partes nem concatenacao no loop.
+    """
+    text = text.strip()
+    if not text:
+        return []
     sentences: list[str] = []
-    current = ""
-    for part in parts:
-        if len(current) + len(part) + 1 <= max_chars:
-            current = (current + " " + part).strip() if current else part
+
+    def _partes():
+        # Limites [inicio, fim) das partes entre separadores de pontuacao,
+        # gerados sob demanda - transcricoes de varios KB nao materializam
+        # uma lista de milhares de tuplas
+        pos = 0
+        for m in _SENT_RE.finditer(text):
+            yield pos, m.start()
+            pos = m.end()
+        yield pos, len(text)
+
+    chunk_lo = None  # inicio do chunk corrente (None = vazio)
+    chunk_hi = 0
+    for lo, hi in _partes():
+        if chunk_lo is not None and hi - chunk_lo <= max_chars:
+            chunk_hi = hi
+            continue
+        if chunk_lo is not None:
+            s = text[chunk_lo:chunk_hi].strip()
+            if s:
+                sentences.append(s)
+            chunk_lo = None
+        # Parte muito longa: dividir por palavras ou forçar
+        if hi - lo > max_chars:
+            chunk: list[str] = []
+            chunk_len = 0
+            for w in text[lo:hi].split():
+                extra = len(w) + (1 if chunk else 0)
+                if chunk_len + extra <= max_chars:
+                    chunk.append(w)
+                    chunk_len += extra
+                else:
+                    if chunk:
+                        sentences.append(" ".join(chunk))
+                    chunk = [w]
+                    chunk_len = len(w)
+            if chunk:
+                sentences.append(" ".join(chunk))
         else:
-            if current:
-                sentences.append(current)
-            # Parte muito longa: dividir por vírgulas ou forçar
-            if len(part) > max_chars:
-                words = part.split()
-                chunk = ""
-                for w in words:
-                    if len(chunk) + len(w) + 1 <= max_chars:
-                        chunk = (chunk + " " + w).strip() if chunk else w
-                    else:
-                        if chunk:
-                            sentences.append(chunk)
-                        chunk = w
-                if chunk:
-                    sentences.append(chunk)
-            else:
-                current = part
-    if current:
-        sentences.append(current)
-    return [s for s in sentences if s.strip()]
+            chunk_lo, chunk_hi = lo, hi
+    if chunk_lo is not None:
+        s = text[chunk_lo:chunk_hi].strip()
+        if s:
+            sentences.append(s)
+    return sentences
+
+
+# Worker VC persistente (modo --server do chatterbox_vc_worker): o modelo
+# fica residente na GPU entre conversoes no mesmo processo
+_VC_WORKER: subprocess.Popen | None = None
+
+
+def _get_vc_worker(chatterbox_python: str) -> subprocess.Popen:
+    """Retorna o worker VC em modo --server, (re)iniciando se morreu."""
+    global _VC_WORKER
+    if _VC_WORKER is None or _VC_WORKER.poll() is not None:
+        worker_script = Path(__file__).parent / "chatterbox_vc_worker.py"
+        _VC_WORKER = subprocess.Popen(
+            [chatterbox_python, str(worker_script), "--server"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+    return _VC_WORKER
+
+
+def _shutdown_vc_worker():
+    if _VC_WORKER is not None and _VC_WORKER.poll() is None:
+        try:
+            _VC_WORKER.stdin.close()
+            _VC_WORKER.wait(timeout=10)
+        except Exception:
+            _VC_WORKER.kill()
+
+
+atexit.register(_shutdown_vc_worker)
+
+
+@functools.lru_cache(maxsize=1)
+def _chatterbox_python() -> str:
+    """Resolve (e valida com um stat unico) o python do conda env chatterbox."""
+    python = os.environ.get(
+        "CHATTERBOX_PYTHON",
+        "/home/nmaldaner/miniconda3/envs/chatterbox/bin/python3"
+    )
+    if not Path(python).exists():
+        raise RuntimeError(
+            f"Python Chatterbox nao encontrado: {python}\n"
+            "Defina CHATTERBOX_PYTHON=/path/python3 do conda env chatterbox"
+        )
+    return python
 
 
 def run_chatterbox_vc(text: str, lang: str, ref: str | None, outdir: Path) -> Path:
@@ -129,48 +301,56 @@ def run_chatterbox_vc(text: str, lang: str, ref: str | None, outdir: Path) -> Pa
             "Engine chatterbox-vc requer --ref (audio de referencia) obrigatorio."
         )
 
-    chatterbox_python = os.environ.get(
-        "CHATTERBOX_PYTHON",
-        "/home/nmaldaner/miniconda3/envs/chatterbox/bin/python3"
-    )
-    if not Path(chatterbox_python).exists():
-        raise RuntimeError(
-            f"Python Chatterbox nao encontrado: {chatterbox_python}\n"
-            "Defina CHATTERBOX_PYTHON=/path/python3 do conda env chatterbox"
-        )
+    chatterbox_python = _chatterbox_python()
 
-    worker_script = Path(__file__).parent / "chatterbox_vc_worker.py"
+    # Warmup pipelined: o pedido vai agora mas a resposta so e lida depois
+    # do Edge TTS + ffmpeg - o load do modelo VC (varios segundos na
+    # primeira chamada) roda em paralelo com a geracao da fala neutra
+    worker = _get_vc_worker(chatterbox_python)
+    worker.stdin.write(json.dumps({"warmup": True}) + "\n")
+    worker.stdin.flush()
 
-    # Converter referência para WAV 24kHz mono (necessário para ChatterboxVC.set_target_voice)
-    ref_wav = convert_ref_to_wav(ref, outdir)
+    warm_line = None
+    try:
+        # Converter referência para WAV 24kHz mono (necessário para ChatterboxVC.set_target_voice)
+        ref_wav = convert_ref_to_wav(ref, outdir)
 
-    # Passo 1: gerar fala neutra com Edge TTS
-    print(f"[tts_direct] VC pipeline — passo 1: gerando fala Edge TTS...", flush=True)
-    edge_out = outdir / "edge_source.mp3"
-    voice_id = EDGE_VOICE_DEFAULTS.get(lang.lower(), "pt-BR-FranciscaNeural")
+        # Passo 1: gerar fala neutra com Edge TTS
+        print(f"[tts_direct] VC pipeline — passo 1: gerando fala Edge TTS...", flush=True)
+        edge_out = outdir / "edge_source.mp3"
+        voice_id = EDGE_VOICE_DEFAULTS.get(lang.lower(), "pt-BR-FranciscaNeural")
 
-    async def _edge():
-        import edge_tts
-        communicate = edge_tts.Communicate(text, voice_id)
-        await communicate.save(str(edge_out))
+        async def _edge():
+            edge_tts = _get_edge_tts()
+            communicate = edge_tts.Communicate(text, voice_id)
+            await communicate.save(str(edge_out))
 
-    asyncio.run(_edge())
-    print(f"[tts_direct] Edge TTS gerado: {edge_out} ({edge_out.stat().st_size} bytes)", flush=True)
+        _run_async(_edge())
+        print(f"[tts_direct] Edge TTS gerado: {edge_out} ({edge_out.stat().st_size} bytes)", flush=True)
+    finally:
+        # Sempre consumir a resposta do warmup - uma linha orfa no pipe
+        # dessincronizaria o protocolo pedido/resposta da proxima chamada
+        warm_line = worker.stdout.readline()
+
+    if not warm_line:
+        raise RuntimeError("VC worker morreu durante o warmup")
+    warm_resp = json.loads(warm_line)
+    if warm_resp.get("status") != "ok":
+        raise RuntimeError(f"VC worker falhou no warmup: {warm_resp.get('error')}")
 
     # Passo 2: converter timbre com ChatterboxVC
     print(f"[tts_direct] VC pipeline — passo 2: convertendo para voz do ref...", flush=True)
     vc_out = outdir / "generated.wav"
 
-    cmd = [
-        chatterbox_python, str(worker_script),
-        "--source", str(edge_out),
-        "--ref",    ref_wav,
-        "--output", str(vc_out),
-    ]
-
-    result = subprocess.run(cmd, text=True, timeout=600)
-    if result.returncode != 0:
-        raise RuntimeError(f"VC worker retornou codigo {result.returncode}")
+    req = {"source": str(edge_out), "ref": ref_wav, "output": str(vc_out)}
+    worker.stdin.write(json.dumps(req) + "\n")
+    worker.stdin.flush()
+    line = worker.stdout.readline()
+    if not line:
+        raise RuntimeError("VC worker morreu sem responder")
+    resp = json.loads(line)
+    if resp.get("status") != "ok":
+        raise RuntimeError(f"VC worker falhou: {resp.get('error')}")
 
     if not vc_out.exists():
         raise RuntimeError("VC worker nao gerou o arquivo de saida")
@@ -179,20 +359,39 @@ def run_chatterbox_vc(text: str, lang: str, ref: str | None, outdir: Path) -> Pa
     return vc_out
 
 
+# Worker Chatterbox persistente (modo --server do chatterbox_tts_worker):
+# o load do modelo e pago uma vez e reusado entre chamadas no processo
+_CB_WORKER: subprocess.Popen | None = None
+
+
+def _get_chatterbox_worker(chatterbox_python: str) -> subprocess.Popen:
+    """Retorna o worker em modo --server, (re)iniciando se morreu."""
+    global _CB_WORKER
+    if _CB_WORKER is None or _CB_WORKER.poll() is not None:
+        worker_script = Path(__file__).parent / "chatterbox_tts_worker.py"
+        _CB_WORKER = subprocess.Popen(
+            [chatterbox_python, str(worker_script), "--server"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+    return _CB_WORKER
+
+
+def _shutdown_chatterbox_worker():
+    if _CB_WORKER is not None and _CB_WORKER.poll() is None:
+        try:
+            _CB_WORKER.stdin.close()
+            _CB_WORKER.wait(timeout=10)
+        except Exception:
+            _CB_WORKER.kill()
+
+
+atexit.register(_shutdown_chatterbox_worker)
+
+
 def run_chatterbox(text: str, lang: str, ref: str | None, outdir: Path,
                    cfg_weight: float = 0.65, exaggeration: float = 0.5,
                    temperature: float = 0.75) -> Path:
-    chatterbox_python = os.environ.get(
-        "CHATTERBOX_PYTHON",
-        "/home/nmaldaner/miniconda3/envs/chatterbox/bin/python3"
-    )
-    worker_script = Path(__file__).parent / "chatterbox_tts_worker.py"
-
-    if not Path(chatterbox_python).exists():
-        raise RuntimeError(
-            f"Python Chatterbox nao encontrado: {chatterbox_python}\n"
-            "Defina CHATTERBOX_PYTHON=/path/python3 do conda env chatterbox"
-        )
+    chatterbox_python = _chatterbox_python()
 
     # Converter referência para WAV se necessário (soundfile não lê MP4/MP3)
     ref_wav = None
@@ -211,62 +410,47 @@ def run_chatterbox(text: str, lang: str, ref: str | None, outdir: Path,
         for i, s in enumerate(sentences)
     ]
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".json",
-                                     delete=False, encoding="utf-8") as f:
-        json.dump(segments, f, ensure_ascii=False)
-        segs_json = f.name
-
     output_json = outdir / "chatterbox_result.json"
 
-    try:
-        cmd = [
-            chatterbox_python, str(worker_script),
-            "--segments-json", segs_json,
-            "--workdir", str(outdir),
-            "--lang", lang,
-            "--output-json", str(output_json),
-            "--cfg-weight",   str(cfg_weight),
-            "--exaggeration", str(exaggeration),
-            "--temperature",  str(temperature),
-        ]
-        if ref_wav:
-            cmd += ["--ref", ref_wav]
-
-        result = subprocess.run(cmd, text=True, timeout=600)
-        if result.returncode != 0:
-            raise RuntimeError(f"Chatterbox worker retornou codigo {result.returncode}")
-
-        data = json.loads(output_json.read_text(encoding="utf-8"))
-        sr = data.get("sr", 24000)
-        seg_files = [Path(s["file"]) for s in data["segments"] if Path(s["file"]).exists()]
-
-        if not seg_files:
-            raise RuntimeError("Nenhum segmento de audio gerado")
-
-        out_path = outdir / "generated.wav"
-
-        if len(seg_files) == 1:
-            seg_files[0].rename(out_path)
-        else:
-            # Concatenar todos os segmentos em um único WAV
-            import soundfile as sf
-            import numpy as np
-            chunks = []
-            silence = np.zeros(int(sr * 0.25), dtype=np.float32)  # 250ms entre frases
-            for i, seg_file in enumerate(seg_files):
-                audio, _ = sf.read(str(seg_file))
-                chunks.append(audio.astype(np.float32))
-                if i < len(seg_files) - 1:
-                    chunks.append(silence)
-            combined = np.concatenate(chunks)
-            sf.write(str(out_path), combined, sr)
-            print(f"[tts_direct] {len(seg_files)} segmentos concatenados", flush=True)
-
-        print(f"[tts_direct] Audio gerado: {out_path} ({out_path.stat().st_size} bytes)", flush=True)
-        return out_path
-
-    finally:
-        Path(segs_json).unlink(missing_ok=True)
+    out_path = outdir / "generated.wav"
+
+    worker = _get_chatterbox_worker(chatterbox_python)
+    # segments inline: o pedido JSONL ja e um pipe, entao os segmentos vao
+    # direto nele - sem tempfile de ida e volta pelo disco nem unlink.
+    # output_wav + gap_s: o worker grava o WAV final ja concatenado com
+    # a pausa entre frases - sem re-ler e copiar os segmentos aqui
+    req = {
+        "segments": segments,
+        "workdir": str(outdir),
+        "lang": lang,
+        "output_json": str(output_json),
+        "output_wav": str(out_path),
+        "gap_s": 0.25,
+        "cfg_weight": cfg_weight,
+        "exaggeration": exaggeration,
+        "temperature": temperature,
+    }
+    if ref_wav:
+        req["ref"] = ref_wav
+
+    worker.stdin.write(json.dumps(req, ensure_ascii=False) + "\n")
+    worker.stdin.flush()
+    line = worker.stdout.readline()
+    if not line:
+        raise RuntimeError("Chatterbox worker morreu sem responder")
+    resp = json.loads(line)
+    if resp.get("status") != "ok":
+        raise RuntimeError(f"Chatterbox worker falhou: {resp.get('error')}")
+
+    raw = output_json.read_bytes()
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+    if not data.get("segments") or not out_path.exists():
+        raise RuntimeError("Nenhum segmento de audio gerado")
+
+    print(f"[tts_direct] {len(data['segments'])} segmentos concatenados pelo worker", flush=True)
+    print(f"[tts_direct] Audio gerado: {out_path} ({out_path.stat().st_size} bytes)", flush=True)
+    return out_path
 
 
 def main():
@@ -300,7 +484,7 @@ def main():
     write_checkpoint(outdir, "1", "Iniciando geracao de audio")
 
     if args.engine == "edge":
-        out = asyncio.run(run_edge(args.text, args.lang, args.voice, outdir))
+        out = _run_async(run_edge(args.text, args.lang, args.voice, outdir))
     elif args.engine == "chatterbox":
         out = run_chatterbox(args.text, args.lang, args.ref, outdir,
                              cfg_weight=args.cfg_weight,
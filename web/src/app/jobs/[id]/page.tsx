@@ -165,8 +165,11 @@ export default function JobDetail() {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          if (data.job) setJob(data.job);
-          if (data.type === "log") setLogs((prev) => [...prev.slice(-500), data]);
+          const events = data.event === "batch" && Array.isArray(data.items) ? data.items : [data];
+          for (const item of events) {
+            if (item.job) setJob(item.job);
+            if (item.type === "log") setLogs((prev) => [...prev.slice(-500), item]);
+          }
         } catch { /* ignore */ }
       };
       return () => { ws.close(); };
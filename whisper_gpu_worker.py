@@ -9,66 +9,284 @@ Uso:
         --model large-v3 \
         [--lang pt] \
         --output-json /path/result.json
+
+    python3 whisper_gpu_worker.py --server
+        Mantem o modelo carregado e atende pedidos JSONL via stdin/stdout.
+
+    python3 whisper_gpu_worker.py --serve [--socket /tmp/whisper_gpu.sock]
+        Servidor residente num socket unix: o modelo sobrevive entre
+        execucoes do CLI (o --server morre junto com o parent).
 """
 
 import argparse
 import json
+import os
 import sys
 import time
 from pathlib import Path
 
-import torch
-import whisper
+try:
+    import orjson  # encode em C para as milhares de linhas de segmento
+except ImportError:
+    orjson = None
+
+
+def _dumps(obj) -> str:
+    """json.dumps compacto, via orjson quando disponivel no env do worker."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+# torch/whisper sao importados dentro das funcoes: ~1-2s de import que
+# nao deve ser pago por --help, erro de argparse ou startup do --server
+# antes do primeiro pedido chegar
+
+# Modelos ja carregados neste processo - no modo --server o load (~segundos
+# de torch+CUDA) e pago uma vez e reusado entre pedidos
+_MODEL_CACHE = {}
+
+_compile_enabled = True
 
 
 def get_device():
+    import torch
     if torch.cuda.is_available():
         return "cuda"
     return "cpu"
 
 
+def _torch_21() -> bool:
+    import torch
+    try:
+        return tuple(int(x) for x in torch.__version__.split("+")[0].split(".")[:2]) >= (2, 1)
+    except ValueError:
+        return False
+
+
+def _get_model(name: str, device: str):
+    """Carrega o modelo e devolve (backend, model).
+
+    backend "ct2" = faster-whisper (CTranslate2): 2-4x mais rapido que o
+    openai-whisper na mesma acuracia (atencao fundida + fp16/int8). Cai
+    para o openai-whisper ("torch") se faster-whisper nao estiver
+    instalado no env do worker.
+    """
+    key = (name, device)
+    cached = _MODEL_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    t0 = time.time()
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        WhisperModel = None
+
+    if WhisperModel is not None:
+        compute = os.environ.get(
+            "ASR_QUANTIZATION", "float16" if device == "cuda" else "int8")
+        model = WhisperModel(name, device=device, compute_type=compute)
+        backend = "ct2"
+        print(f"[whisper_gpu] faster-whisper carregado em {time.time()-t0:.1f}s (compute={compute})", flush=True)
+    else:
+        import torch
+        import whisper
+        if device == "cuda":
+            # TF32 nos matmuls (Ampere+) e autotune do cudnn: os shapes de
+            # mel de 30s se repetem, entao o benchmark compensa ja no
+            # segundo chunk
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
+        model = whisper.load_model(name, device=device)
+        # torch.compile funde os kernels do encoder/decoder (o SDPA ja e o
+        # caminho default do openai-whisper em torch >= 2.0); eager se falhar
+        if _compile_enabled and device == "cuda" and hasattr(torch, "compile") and _torch_21():
+            try:
+                model = torch.compile(model, mode="reduce-overhead")
+                print("[whisper_gpu] torch.compile ativo", flush=True)
+            except Exception as e:
+                print(f"[whisper_gpu] torch.compile falhou, usando eager: {e}", flush=True)
+        backend = "torch"
+        print(f"[whisper_gpu] openai-whisper carregado em {time.time()-t0:.1f}s", flush=True)
+
+    _MODEL_CACHE[key] = (backend, model)
+    return _MODEL_CACHE[key]
+
+
+def _executar_pedido(req: dict):
+    """Executa um pedido (dict com os mesmos campos da CLI) e grava o output JSON."""
+    device = get_device()
+    fp16 = device == "cuda"
+    model_name = req.get("model", "large-v3")
+    lang = req.get("lang")
+
+    print(f"[whisper_gpu] device={device}, model={model_name}, lang={lang or 'auto'}", flush=True)
+
+    backend, model = _get_model(model_name, device)
+
+    # Saida em JSONL: primeira linha {"type": "language", ...}, depois um
+    # segmento por linha escrito conforme o gerador do CT2 produz - a
+    # memoria fica O(1) em vez de acumular milhares de dicts em audio longo
+    n = 0
+    with open(req["output_json"], "w", encoding="utf-8") as out:
+        if backend == "ct2":
+            # Batch de chunks fatiados por VAD num forward so: amortiza o
+            # launch overhead e sobe a utilizacao da GPU em audio longo.
+            # Serial se a versao do faster-whisper nao tiver o pipeline.
+            try:
+                from faster_whisper import BatchedInferencePipeline
+                segments_iter, info = BatchedInferencePipeline(model=model).transcribe(
+                    req["audio"],
+                    language=lang or None,
+                    vad_filter=True,
+                    beam_size=5,
+                    batch_size=16,
+                )
+            except ImportError:
+                segments_iter, info = model.transcribe(
+                    req["audio"],
+                    language=lang or None,
+                    vad_filter=True,
+                    beam_size=5,
+                )
+            language = info.language or ""
+            out.write(_dumps({"type": "language", "value": language}) + "\n")
+            # Cada segmento vira [start, end, text]: sem repetir as chaves
+            # "start"/"end"/"text" em cada uma das milhares de linhas
+            for seg in segments_iter:
+                rec = [round(seg.start, 3), round(seg.end, 3), seg.text.strip()]
+                out.write(_dumps(rec) + "\n")
+                out.flush()
+                n += 1
+        else:
+            import torch
+            # inference_mode: sem buffers de autograd nos forwards; a
+            # captura de CUDA graphs do encoder ja vem do torch.compile
+            # reduce-overhead aplicado no load
+            with torch.inference_mode():
+                result = model.transcribe(
+                    req["audio"],
+                    language=lang or None,
+                    fp16=fp16,
+                    verbose=False,
+                )
+            language = result.get("language", "")
+            out.write(_dumps({"type": "language", "value": language}) + "\n")
+            for seg in result["segments"]:
+                rec = [round(seg["start"], 3), round(seg["end"], 3), seg["text"].strip()]
+                out.write(_dumps(rec) + "\n")
+                n += 1
+
+    print(f"[whisper_gpu] {n} segmentos, idioma: {language or '?'}", flush=True)
+    print(f"[whisper_gpu] concluido", flush=True)
+
+
+def servir():
+    """Modo servidor: le pedidos JSONL do stdin e responde uma linha por job.
+
+    O modelo fica carregado entre pedidos, eliminando o init de
+    torch+CUDA+load por invocacao. Logs de progresso vao para stderr; o
+    stdout carrega so o protocolo ({"status": "ok"|"error", ...} por linha).
+    """
+    proto_out = sys.stdout
+    sys.stdout = sys.stderr  # redireciona os prints de progresso
+
+    print("[whisper_gpu] modo servidor - aguardando pedidos", flush=True)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+            _executar_pedido(req)
+            resp = {"status": "ok", "output_json": req["output_json"]}
+        except Exception as e:
+            resp = {"status": "error", "error": str(e)}
+        proto_out.write(json.dumps(resp, ensure_ascii=False) + "\n")
+        proto_out.flush()
+
+
+def servir_socket(sock_path: str):
+    """Servidor residente num socket unix: atende varios CLIs em sequencia.
+
+    Mesmo protocolo JSONL do --server, mas o processo (e o modelo de GB
+    na VRAM) sobrevive entre execucoes do transcrever_v1 - o load de
+    5-15s e pago uma vez por boot, nao por arquivo.
+    """
+    import atexit
+    import signal
+    import socket
+
+    Path(sock_path).unlink(missing_ok=True)
+    srv = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    srv.bind(sock_path)
+    srv.listen(1)
+
+    def _limpar(*_args):
+        Path(sock_path).unlink(missing_ok=True)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, _limpar)
+    atexit.register(lambda: Path(sock_path).unlink(missing_ok=True))
+
+    print(f"[whisper_gpu] servindo em {sock_path}", flush=True)
+    while True:
+        conn, _ = srv.accept()
+        with conn:
+            rf = conn.makefile("r", encoding="utf-8")
+            wf = conn.makefile("w", encoding="utf-8")
+            for line in rf:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    req = json.loads(line)
+                    _executar_pedido(req)
+                    resp = {"status": "ok", "output_json": req["output_json"]}
+                except Exception as e:
+                    resp = {"status": "error", "error": str(e)}
+                wf.write(json.dumps(resp, ensure_ascii=False) + "\n")
+                wf.flush()
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--audio", required=True, help="Caminho do arquivo de audio")
+    parser.add_argument("--audio", help="Caminho do arquivo de audio")
     parser.add_argument("--model", default="large-v3", help="Modelo Whisper")
     parser.add_argument("--lang", default=None, help="Idioma de origem (auto se vazio)")
-    parser.add_argument("--output-json", required=True, help="Caminho do JSON de saida")
+    parser.add_argument("--output-json",
+                        help="Caminho do JSONL de saida (1a linha: idioma; depois um segmento por linha)")
+    parser.add_argument("--server", action="store_true",
+                        help="Mantem o modelo carregado e atende pedidos JSONL via stdin/stdout")
+    parser.add_argument("--serve", action="store_true",
+                        help="Servidor residente num socket unix (sobrevive entre execucoes do CLI)")
+    parser.add_argument("--socket", default="/tmp/whisper_gpu.sock",
+                        help="Caminho do socket unix do modo --serve")
+    parser.add_argument("--no-compile", action="store_true",
+                        help="Desativa torch.compile (util para runs curtos ou debug)")
     args = parser.parse_args()
 
-    device = get_device()
-    fp16 = device == "cuda"
+    global _compile_enabled
+    _compile_enabled = not args.no_compile
 
-    print(f"[whisper_gpu] device={device}, model={args.model}, lang={args.lang or 'auto'}", flush=True)
+    if args.serve:
+        servir_socket(args.socket)
+        return
 
-    t0 = time.time()
-    model = whisper.load_model(args.model, device=device)
-    print(f"[whisper_gpu] modelo carregado em {time.time()-t0:.1f}s", flush=True)
-
-    result = model.transcribe(
-        args.audio,
-        language=args.lang or None,
-        fp16=fp16,
-        verbose=False,
-    )
-
-    segments = [
-        {
-            "start": round(seg["start"], 3),
-            "end": round(seg["end"], 3),
-            "text": seg["text"].strip(),
-        }
-        for seg in result["segments"]
-    ]
-
-    print(f"[whisper_gpu] {len(segments)} segmentos, idioma: {result.get('language', '?')}", flush=True)
-
-    output = {
-        "language": result.get("language", ""),
-        "segments": segments,
-    }
-    Path(args.output_json).write_text(json.dumps(output, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.server:
+        servir()
+        return
 
-    print(f"[whisper_gpu] concluido", flush=True)
+    for name in ("audio", "output_json"):
+        if not getattr(args, name):
+            parser.error(f"--{name.replace('_', '-')} e obrigatorio fora dos modos --server/--serve")
+
+    _executar_pedido({
+        "audio": args.audio,
+        "model": args.model,
+        "lang": args.lang,
+        "output_json": args.output_json,
+    })
 
 
 if __name__ == "__main__":